@@ -0,0 +1,197 @@
+# admission.py
+"""
+무거운 엔드포인트 입장 제어 (load shedding).
+
+    admission.route("/v1/outpaint", "outpaint", max_files=1)     # 라우터 모듈에서 등록
+
+- 게이트(엔드포인트 묶음)마다 동시 처리 상한 + 대기열 길이 상한 — ADMISSION_LIMITS
+- 대기열이 가득 차면 즉시 429, ADMISSION_QUEUE_TIMEOUT 안에 차례가 안 오면 503 (둘 다 Retry-After)
+- 순수 ASGI 미들웨어라 요청 본문(업로드)을 읽기 전에 거절한다 → 거절 비용은 헤더 파싱뿐
+- Content-Length 가 max_files × UPLOAD_MAX_BYTES(+폼 여유)를 넘으면 본문을 받기 전에 413
+- 등록하지 않은 경로(/health, /ready, /metrics, 조회 API)는 그대로 통과
+
+ADMISSION_LIMITS = "게이트:동시처리:대기열,..."
+    기본 "outpaint:2:4,outpaint_submit:4:16,promo:8:32,promo_batch:2:2,ad_image:4:8,ad_image_compose:8:32,upload:4:16"
+ad_image 의 동시처리는 INPAINT_BATCH_MAX 이상이어야 인페인팅 마이크로 배치가 찰 수 있다 (작으면 기동 시 경고)
+Retry-After 는 게이트의 최근 평균 처리 시간 × (대기 수 / 동시처리) 로 추정 (1~60초)
+"""
+import asyncio, json, math, os, time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import metrics
+from upload_decode import UPLOAD_MAX_BYTES
+
+ADMISSION_ENABLED       = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_LIMITS        = os.getenv("ADMISSION_LIMITS", "outpaint:2:4,outpaint_submit:4:16,promo:8:32,promo_batch:2:2,ad_image:4:8,ad_image_compose:8:32,upload:4:16")
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_FORM_SLACK    = int(os.getenv("ADMISSION_FORM_SLACK", str(1024 * 1024)))
+
+_EWMA_ALPHA = 0.2
+
+
+class Gate:
+    """동시 처리 슬롯 + 길이 제한 FIFO 대기열 (이벤트 루프 전용)"""
+
+    def __init__(self, name: str, concurrency: int, queue_max: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_max = max(0, queue_max)
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_sec = 1.0
+        metrics.ADMISSION_ACTIVE.labels(name).set_function(lambda: self._active)
+        metrics.ADMISSION_WAITING.labels(name).set_function(lambda: self.waiting)
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for f in self._waiters if not f.done())
+
+    def retry_after(self) -> int:
+        est = self._avg_sec * (self.waiting + 1) / self.concurrency
+        return max(1, min(60, math.ceil(est)))
+
+    def try_enter(self) -> Optional[asyncio.Future]:
+        """
+        바로 들어가면 None, 대기해야 하면 기다릴 Future.
+        대기열도 가득 차면 GateFull.
+        """
+        if self._active < self.concurrency and not self.waiting:
+            self._active += 1
+            return None
+        if self.waiting >= self.queue_max:
+            raise GateFull(self)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        return fut
+
+    def leave(self, elapsed: float) -> None:
+        self._avg_sec += _EWMA_ALPHA * (elapsed - self._avg_sec)
+        self._active -= 1
+        while self._waiters and self._active < self.concurrency:
+            fut = self._waiters.popleft()
+            if fut.done():                  # 타임아웃/연결 끊김으로 빠진 대기자
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    async def wait(self, fut: asyncio.Future, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.leave(self._avg_sec)   # 슬롯을 받은 직후 취소됨 → 다음 대기자에게 넘김
+            else:
+                fut.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency, "queue_max": self.queue_max,
+            "active": self._active, "waiting": self.waiting,
+            "avg_sec": round(self._avg_sec, 3), "retry_after": self.retry_after(),
+        }
+
+
+class GateFull(Exception):
+    def __init__(self, gate: Gate):
+        super().__init__(gate.name)
+        self.gate = gate
+
+
+def _parse_limits(spec: str) -> Dict[str, Gate]:
+    out: Dict[str, Gate] = {}
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) < 2 or not parts[0]:
+            continue
+        try:
+            queue_max = int(parts[2]) if len(parts) > 2 else 0
+            out[parts[0]] = Gate(parts[0], int(parts[1]), queue_max)
+        except ValueError:
+            print(f"⚠️ ADMISSION_LIMITS 항목 무시: {item!r}")
+    return out
+
+
+_gates = _parse_limits(ADMISSION_LIMITS)
+_routes: Dict[Tuple[str, str], Tuple[str, Optional[int]]] = {}
+
+
+def route(path: str, gate: str, max_files: Optional[int] = None, method: str = "POST") -> None:
+    """
+    path 를 gate 로 제한. max_files 를 주면 Content-Length 상한 = max_files × UPLOAD_MAX_BYTES + 폼 여유.
+    ADMISSION_LIMITS 에 없는 gate 는 동시처리 제한 없이 크기 검사만 한다.
+    """
+    _routes[(method, path)] = (gate, max_files)
+
+
+def concurrency(gate: str) -> Optional[int]:
+    """gate 의 동시 처리 상한 (ADMISSION_LIMITS 에 없거나 꺼져 있으면 None)"""
+    g = _gates.get(gate) if ADMISSION_ENABLED else None
+    return g.concurrency if g else None
+
+
+def stats() -> dict:
+    return {name: g.stats() for name, g in _gates.items()}
+
+
+async def _reject(send, status: int, detail: str, retry_after: Optional[int] = None) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+               (b"connection", b"close")]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """등록된 경로만 게이트를 거친다. 슬롯은 응답(스트리밍 포함)이 끝날 때까지 잡고 있다"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        entry = _routes.get((scope.get("method", ""), scope.get("path", ""))) if scope["type"] == "http" else None
+        if entry is None or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        name, max_files = entry
+
+        if max_files:
+            limit = max_files * UPLOAD_MAX_BYTES + ADMISSION_FORM_SLACK
+            try:
+                length = int(dict(scope.get("headers") or []).get(b"content-length", b"0") or 0)
+            except ValueError:
+                length = 0
+            if length > limit:
+                metrics.ADMISSION_REJECTED.labels(name, "too_large").inc()
+                await _reject(send, 413, f"요청 본문이 너무 큽니다: {length} > {limit} bytes")
+                return
+
+        gate = _gates.get(name)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        try:
+            fut = gate.try_enter()
+            if fut is not None:
+                await gate.wait(fut, ADMISSION_QUEUE_TIMEOUT)
+        except GateFull:
+            metrics.ADMISSION_REJECTED.labels(name, "queue_full").inc()
+            await _reject(send, 429, "요청이 많아 대기열이 가득 찼습니다. 잠시 후 다시 시도해 주세요.", gate.retry_after())
+            return
+        except asyncio.TimeoutError:
+            metrics.ADMISSION_REJECTED.labels(name, "timeout").inc()
+            await _reject(send, 503, "처리 대기 시간이 초과되었습니다. 잠시 후 다시 시도해 주세요.", gate.retry_after())
+            return
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.labels(name).observe(time.perf_counter() - t0)
+
+        t1 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.leave(time.perf_counter() - t1)
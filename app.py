@@ -1,13 +1,38 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routes_promo import router as promo_router
 from openai_seojae import router as outpaint_router
 from routes_upload_store import router as upload_store_router  # ✅ 신규 업로드 라우터
+from routes_ad_image import router as ad_image_router
+from jobs import outpaint_jobs
+from group_catalog import catalog
+import admission
+import http_client
+import renditions
+import metrics
+import warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # promo 의 최신 그룹 조회용 카탈로그를 한 번만 만들어 둔다
+    await run_in_threadpool(catalog.load)
+    # HTTP 풀 / openai SDK / rembg 세션 / 인코딩 프로세스 풀 / SD Inpaint 파이프라인 워밍업 (진행 상태는 /ready)
+    await warmup.start()
+    yield
+    await warmup.stop()
+    await outpaint_jobs.shutdown()
+    await http_client.shutdown()
+    renditions.shutdown()
 
 app = FastAPI(
     title="Promo & Ad Image Generator (FastAPI)",
     version="1.0.0",
     description="Gemini REST/SDK + SD Inpaint + rembg 조합 백엔드",
+    lifespan=lifespan,
 )
 
 # app.add_middleware(
@@ -18,12 +43,28 @@ app = FastAPI(
 #     allow_credentials=True,
 # )
 
+# 무거운 엔드포인트 동시 처리/대기열 상한 (본문을 읽기 전에 429/503/413). 지표 미들웨어 안쪽이라 거절도 기록된다
+app.add_middleware(admission.AdmissionMiddleware)
+
+# trace id(X-Request-ID) + HTTP 지표. 순수 ASGI 라 SSE 응답도 버퍼링하지 않는다
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
 @app.get("/health")
 def health():
+    """liveness: 프로세스가 응답하면 200 (무거운 import/외부 호출 없음)"""
     from config import MODEL_ID
-    import torch
-    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-    return {"ok": True, "model": MODEL_ID, "device": DEVICE}
+    return {"ok": True, "model": MODEL_ID, "uptime_sec": warmup.status()["uptime_sec"]}
+
+@app.get("/ready")
+def ready():
+    """readiness: 워밍업이 끝나면 200, 진행 중이면 503 (구성요소별 상태 포함)"""
+    st = warmup.status()
+    return JSONResponse(st, status_code=200 if st["ready"] else 503)
 
 @app.get("/")
 def index():
@@ -31,13 +72,21 @@ def index():
         "message": "Promo & Ad Image backend is running.",
         "endpoints": [
             "/health",
+            "/ready",
+            "/metrics (Prometheus)",
             "/v1/generate-promo (POST form-data)",
+            "/v1/generate-promo/batch (POST JSON: stores[{group, store_name, mood, ...}] → NDJSON)",
             "/v1/upload-store-images (POST form-data, multiple files)",
             "/v1/outpaint (POST form-data)",
+            "/v1/outpaint/jobs (POST form-data → job_id, GET /v1/outpaint/jobs/{job_id}[/result])",
+            "/v1/outpaint/batch (POST form-data: input_images[], ratios → job_id)",
+            "/v1/ad-image (POST form-data, quality=preview|standard|high)",
+            "/v1/ad-image/compose (POST form-data: input_image, elements_json, logos[] → 오버레이만 적용)",
         ],
         "docs": "/docs",
     }
 
 app.include_router(promo_router)
 app.include_router(outpaint_router)
-app.include_router(upload_store_router)  # ✅ 추가
\ No newline at end of file
+app.include_router(upload_store_router)  # ✅ 추가
+app.include_router(ad_image_router)
\ No newline at end of file
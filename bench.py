@@ -0,0 +1,349 @@
+# bench.py
+"""
+엔드투엔드 부하/지연 벤치마크.
+
+bench_stubs 의 Gemini/OpenAI 대역 서버를 띄우고, 앱(uvicorn app:app)을 그 대역을 바라보게 실행한 뒤
+엔드포인트별로 동시성 C 로 요청 N 개를 보내 처리량과 p50/p95/p99 를 잰다.
+
+    python bench.py --endpoints promo,upload,outpaint --concurrency 8 --requests 40
+    python bench.py --target http://127.0.0.1:8000 --endpoints promo      # 이미 떠 있는 앱 (대역 설정은 직접)
+    python bench.py --compare bench_results/a.json bench_results/b.json   # 두 결과 비교
+
+단계별 시간
+    promo / upload : 응답의 Server-Timing 헤더
+    outpaint       : /v1/outpaint/jobs 로 제출 후 작업 상태의 stages(elapsed_ms)
+결과는 --out (기본 bench_results/<시각>-<커밋>.json) 에 JSON 으로 저장된다.
+outpaint 는 rembg 모델 파일이 로컬에 있어야 한다.
+"""
+import argparse, asyncio, json, os, platform, re, shutil, subprocess, sys, tempfile, threading, time
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import httpx
+from PIL import Image
+
+import bench_stubs
+
+ENDPOINTS = ("promo", "upload", "outpaint")
+_TIMING_PAT = re.compile(r"\s*([^;,\s]+)\s*;\s*dur=([\d.]+)")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """선형 보간 백분위 (q: 0~100)"""
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return round(s[lo] + (s[hi] - s[lo]) * (k - lo), 1)
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 1) if values else None,
+    }
+
+
+def parse_server_timing(value: Optional[str]) -> Dict[str, float]:
+    return {m.group(1): float(m.group(2)) for m in _TIMING_PAT.finditer(value or "")}
+
+
+def _jpeg(size: str, seed: int) -> bytes:
+    w, h = map(int, size.lower().split("x"))
+    img = Image.effect_noise((w, h), 20 + seed % 10).convert("RGB")
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+class Recorder:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self.wall_sec = 0.0
+
+    def add(self, ms: float, status: int, stages: Dict[str, float], ok: bool, err: str = "") -> None:
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if ok:
+            self.latencies.append(ms)
+            for k, v in stages.items():
+                self.stages.setdefault(k, []).append(v)
+        elif err and len(self.errors) < 10:
+            self.errors.append(err[:300])
+
+    def report(self) -> dict:
+        ok = len(self.latencies)
+        return {
+            "requests": sum(self.statuses.values()),
+            "ok": ok,
+            "statuses": self.statuses,
+            "wall_sec": round(self.wall_sec, 2),
+            "throughput_rps": round(ok / self.wall_sec, 3) if self.wall_sec else None,
+            "latency_ms": summarize(self.latencies),
+            "stages_ms": {k: summarize(v) for k, v in self.stages.items()},
+            "sample_errors": self.errors,
+        }
+
+
+# ---- 시나리오 ----
+
+async def _promo(c: httpx.AsyncClient, args, i: int, rec: Recorder) -> None:
+    t0 = time.perf_counter()
+    r = await c.post(
+        "/v1/generate-promo", params={"cache": args.promo_cache},
+        data={"store_name": f"벤치 가게 {i % args.promo_distinct}", "mood": "따뜻한", "variants": "3"},
+    )
+    ms = (time.perf_counter() - t0) * 1000
+    stages = parse_server_timing(r.headers.get("server-timing"))
+    stages.pop("total", None)
+    rec.add(ms, r.status_code, stages, r.status_code == 200, r.text)
+
+
+async def _upload(c: httpx.AsyncClient, args, i: int, rec: Recorder) -> None:
+    files = [("images", (f"s{k}.jpg", args._images[(i + k) % len(args._images)], "image/jpeg"))
+             for k in range(args.upload_files)]
+    t0 = time.perf_counter()
+    r = await c.post("/v1/upload-store-images", files=files)
+    ms = (time.perf_counter() - t0) * 1000
+    stages = parse_server_timing(r.headers.get("server-timing"))
+    stages.pop("total", None)
+    rec.add(ms, r.status_code, stages, r.status_code == 200, r.text)
+
+
+async def _outpaint(c: httpx.AsyncClient, args, i: int, rec: Recorder) -> None:
+    img = args._images[i % len(args._images)]
+    t0 = time.perf_counter()
+    r = await c.post(
+        "/v1/outpaint/jobs", data={"user_prompt": "밝은 나무 테이블 위, 자연광", "ratio": args.outpaint_ratio},
+        files={"input_image": ("food.jpg", img, "image/jpeg")},
+    )
+    if r.status_code != 202:
+        rec.add((time.perf_counter() - t0) * 1000, r.status_code, {}, False, r.text)
+        return
+    status_path = httpx.URL(r.json()["status_url"]).path
+    while True:
+        await asyncio.sleep(args.poll_interval)
+        s = await c.get(status_path)
+        job = s.json()
+        if job.get("status") in ("done", "failed"):
+            break
+    ms = (time.perf_counter() - t0) * 1000
+    stages = {k: v["elapsed_ms"] for k, v in job.get("stages", {}).items() if v.get("elapsed_ms") is not None}
+    ok = job["status"] == "done"
+    rec.add(ms, 200 if ok else 502, stages, ok, job.get("error") or "")
+
+
+SCENARIOS = {"promo": _promo, "upload": _upload, "outpaint": _outpaint}
+
+
+async def run_endpoint(base_url: str, name: str, args) -> dict:
+    rec = Recorder(name)
+    fn = SCENARIOS[name]
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as c:
+        # 워밍업 (집계 제외)
+        warm = Recorder(name)
+        for i in range(args.warmup):
+            await fn(c, args, i, warm)
+
+        counter = iter(range(args.requests))
+        lock = asyncio.Lock()
+
+        async def worker():
+            while True:
+                async with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                try:
+                    await fn(c, args, i, rec)
+                except Exception as e:
+                    rec.add(0, 0, {}, False, repr(e))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        rec.wall_sec = time.perf_counter() - t0
+    return rec.report()
+
+
+# ---- 서버 기동 ----
+
+def _start_stubs(args) -> None:
+    import uvicorn
+    config = uvicorn.Config(bench_stubs.app_from_args(args), host="127.0.0.1", port=args.stub_port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    _wait_http(f"http://127.0.0.1:{args.stub_port}/stats", 15)
+
+
+def _wait_http(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"❌ 서버 응답 없음: {url}")
+
+
+def _start_app(args, image_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": env.get("GEMINI_API_KEY", "bench"),
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "bench"),
+        "GEMINI_API_BASE": f"http://127.0.0.1:{args.stub_port}",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        "IMAGE_DIR": image_dir,
+    })
+    if "outpaint" not in args.endpoints:
+        env.setdefault("MATTING_PRELOAD", "0")
+    cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+           "--port", str(args.app_port), "--workers", str(args.app_workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    _wait_http(f"http://127.0.0.1:{args.app_port}/ready", args.startup_timeout)
+    return proc
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+# ---- 출력 ----
+
+def print_report(results: dict) -> None:
+    for name, r in results["endpoints"].items():
+        lat = r["latency_ms"]
+        print(f"\n■ {name}: ok {r['ok']}/{r['requests']}  {r['throughput_rps']} req/s  statuses={r['statuses']}")
+        print(f"  {'stage':<22}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        print(f"  {'(end-to-end)':<22}{lat['p50']!s:>10}{lat['p95']!s:>10}{lat['p99']!s:>10}{lat['max']!s:>10}")
+        for st, s in r["stages_ms"].items():
+            print(f"  {st:<22}{s['p50']!s:>10}{s['p95']!s:>10}{s['p99']!s:>10}{s['max']!s:>10}")
+        for e in r["sample_errors"][:3]:
+            print(f"  ⚠️ {e}")
+
+
+def compare(a_path: str, b_path: str) -> None:
+    with open(a_path) as f:
+        a = json.load(f)
+    with open(b_path) as f:
+        b = json.load(f)
+    print(f"A={a['meta'].get('git_rev')} ({a_path})  B={b['meta'].get('git_rev')} ({b_path})")
+
+    def _row(label, x, y):
+        for q in ("p50", "p95", "p99"):
+            xv, yv = (x or {}).get(q), (y or {}).get(q)
+            if xv is None or yv is None:
+                continue
+            pct = f"{(yv - xv) / xv * 100:+.1f}%" if xv else "n/a"
+            print(f"  {label:<26}{q:>5}{xv:>10}{yv:>10}{pct:>10}")
+
+    for name in sorted(set(a["endpoints"]) | set(b["endpoints"])):
+        ea, eb = a["endpoints"].get(name, {}), b["endpoints"].get(name, {})
+        print(f"\n■ {name}: rps {ea.get('throughput_rps')} → {eb.get('throughput_rps')}")
+        _row("(end-to-end)", ea.get("latency_ms"), eb.get("latency_ms"))
+        for st in sorted(set(ea.get("stages_ms", {})) | set(eb.get("stages_ms", {}))):
+            _row(st, ea.get("stages_ms", {}).get(st), eb.get("stages_ms", {}).get(st))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="promo / upload / outpaint 부하·지연 벤치마크")
+    ap.add_argument("--endpoints", default="promo,upload", help=f"쉼표 구분: {','.join(ENDPOINTS)}")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=20, help="엔드포인트별 측정 요청 수")
+    ap.add_argument("--warmup", type=int, default=1, help="엔드포인트별 워밍업 요청 수(집계 제외)")
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--target", help="이미 떠 있는 앱 주소 (지정 시 대역/앱을 띄우지 않음)")
+    ap.add_argument("--app-port", type=int, default=8765)
+    ap.add_argument("--app-workers", type=int, default=1)
+    ap.add_argument("--startup-timeout", type=float, default=120)
+    ap.add_argument("--image-size", default="3000x2000", help="업로드 이미지 크기 WxH")
+    ap.add_argument("--image-variants", type=int, default=4, help="서로 다른 업로드 이미지 수")
+    ap.add_argument("--upload-files", type=int, default=3, help="upload 요청당 파일 수")
+    ap.add_argument("--outpaint-ratio", default="1:1")
+    ap.add_argument("--poll-interval", type=float, default=0.2)
+    ap.add_argument("--promo-cache", default="no-store", help="promo ?cache= 값 (기본 no-store: 매번 모델 호출)")
+    ap.add_argument("--promo-distinct", type=int, default=1000, help="서로 다른 promo 입력 수")
+    ap.add_argument("--out", help="결과 JSON 경로")
+    ap.add_argument("--compare", nargs=2, metavar=("A.json", "B.json"))
+    bench_stubs.add_stub_args(ap)
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"알 수 없는 엔드포인트: {', '.join(sorted(unknown))}")
+    args._images = [_jpeg(args.image_size, i) for i in range(max(1, args.image_variants))]
+
+    proc = None
+    image_dir = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        image_dir = tempfile.mkdtemp(prefix="bench_img_")
+        _start_stubs(args)
+        proc = _start_app(args, image_dir)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        # promo 가 이미지를 붙이도록 store 그룹 하나를 먼저 만든다
+        httpx.post(f"{base_url}/v1/upload-store-images", timeout=args.timeout,
+                   files=[("images", ("seed.jpg", args._images[0], "image/jpeg"))])
+
+    try:
+        results = {
+            "meta": {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "target": args.target,
+                "args": {k: v for k, v in vars(args).items() if not k.startswith("_")},
+            },
+            "endpoints": {},
+        }
+        for name in args.endpoints:
+            print(f"▶ {name}: concurrency={args.concurrency} requests={args.requests}")
+            results["endpoints"][name] = asyncio.run(run_endpoint(base_url, name, args))
+        if not args.target:
+            results["meta"]["stubs"] = httpx.get(f"http://127.0.0.1:{args.stub_port}/stats").json()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if image_dir:
+            shutil.rmtree(image_dir, ignore_errors=True)
+
+    print_report(results)
+    out = args.out or os.path.join(
+        "bench_results", f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['git_rev'] or 'nogit'}.json",
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 결과 저장 → {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bench_stubs.py
+"""
+벤치마크용 Gemini / OpenAI 대역(stub) 서버.
+
+실제 API 대신 지연 시간과 실패를 흉내 내는 로컬 서버. 앱은 아래 환경변수로 여기를 바라본다.
+    GEMINI_API_BASE=http://127.0.0.1:9009
+    OPENAI_BASE_URL=http://127.0.0.1:9009/v1
+
+흉내 내는 엔드포인트
+    POST /v1beta/models/{model}:generateContent
+    POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+    POST /v1/images/edits            (response_format=b64_json 이면 본문에 이미지, 아니면 url)
+    GET  /files/{name}.png           (edits 가 돌려준 url)
+    GET  /stats                      (엔드포인트별 호출/실패 수)
+
+지연은 로그정규분포(중앙값, p95 지정), 실패는 비율로 500 또는 429(Retry-After) 를 돌려준다.
+단독 실행:
+    python bench_stubs.py --port 9009 --gemini-latency 800:2000 --openai-latency 5000:9000 --fail-rate 0.02
+"""
+import argparse, asyncio, base64, json, math, random
+from io import BytesIO
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
+
+
+class Upstream:
+    """
+    한 업스트림의 지연/실패 모델.
+    latency "800:2000" → 중앙값 800ms, p95 2000ms 인 로그정규분포 ("800" 이면 고정 800ms)
+    """
+
+    def __init__(self, latency: str = "0", fail_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0):
+        median, _, p95 = latency.partition(":")
+        self.median_ms = float(median)
+        self.p95_ms = float(p95) if p95 else self.median_ms
+        self.fail_rate = fail_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def sample_ms(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        if self.p95_ms <= self.median_ms:
+            return self.median_ms
+        sigma = math.log(self.p95_ms / self.median_ms) / 1.645
+        return random.lognormvariate(math.log(self.median_ms), sigma)
+
+    async def call(self) -> Optional[Response]:
+        """지연을 적용하고, 실패로 뽑히면 오류 응답(아니면 None)"""
+        self.calls += 1
+        await asyncio.sleep(self.sample_ms() / 1000)
+        r = random.random()
+        if r < self.rate_limit_rate:
+            self.rate_limited += 1
+            return JSONResponse(
+                {"error": {"code": 429, "message": "stub rate limit"}}, status_code=429,
+                headers={"Retry-After": f"{self.retry_after:g}"},
+            )
+        if r < self.rate_limit_rate + self.fail_rate:
+            self.failures += 1
+            return JSONResponse({"error": {"code": 500, "message": "stub failure"}}, status_code=500)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "median_ms": self.median_ms, "p95_ms": self.p95_ms,
+            "fail_rate": self.fail_rate, "rate_limit_rate": self.rate_limit_rate,
+            "calls": self.calls, "failures": self.failures, "rate_limited": self.rate_limited,
+        }
+
+
+def _promo_text(n: int) -> str:
+    return json.dumps({"variants": [
+        {
+            "headline": f"벤치마크 헤드라인 {i + 1}",
+            "body": "따뜻한 분위기의 매장입니다. 대표 메뉴를 소개합니다. 오늘도 정성껏 준비했습니다. "
+                    "가까운 곳에서 만나보세요. 예약도 가능합니다. 많은 방문 바랍니다.",
+            "tags": ["#벤치마크", "#맛집", "#오늘의메뉴"],
+            "cta": "지금 바로 방문해 보세요",
+        }
+        for i in range(n)
+    ]}, ensure_ascii=False)
+
+
+def _result_png(size: int) -> bytes:
+    """edits 결과 이미지: 실제 결과처럼 압축이 덜 되는 노이즈 + 그라디언트 PNG"""
+    img = Image.effect_noise((size, size), 24).convert("RGB")
+    grad = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    buf = BytesIO()
+    Image.blend(img, grad, 0.6).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def create_app(gemini: Upstream, openai_edit: Upstream, download: Upstream,
+               image_size: int = 1024, stream_chunk: int = 48) -> FastAPI:
+    app = FastAPI(title="bench stubs")
+    png = _result_png(image_size)
+    png_b64 = base64.b64encode(png).decode("ascii")
+
+    @app.post("/v1beta/models/{model_method}")
+    async def gemini_generate(model_method: str, request: Request):
+        body = await request.json()
+        err = await gemini.call()
+        if err is not None:
+            return err
+        texts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+        prompt = "\n".join(texts)
+        if "DALL-E" in prompt:
+            out = "Minimalist food photo on a plain light wooden table, no other objects, soft daylight."
+        else:
+            out = _promo_text(3)
+
+        if model_method.endswith(":streamGenerateContent"):
+            async def _chunks():
+                for i in range(0, len(out), stream_chunk):
+                    chunk = {"candidates": [{"content": {"parts": [{"text": out[i:i + stream_chunk]}]}}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+                    await asyncio.sleep(0.01)
+            return StreamingResponse(_chunks(), media_type="text/event-stream")
+        return {"candidates": [{"content": {"parts": [{"text": out}]}}]}
+
+    @app.post("/v1/images/edits")
+    async def openai_edits(request: Request):
+        form = await request.form()
+        err = await openai_edit.call()
+        if err is not None:
+            return err
+        if form.get("response_format") == "b64_json":
+            return {"created": 0, "data": [{"b64_json": png_b64}]}
+        base = str(request.base_url).rstrip("/")
+        return {"created": 0, "data": [{"url": f"{base}/files/result.png"}]}
+
+    @app.get("/files/{name}")
+    async def files(name: str):
+        err = await download.call()
+        if err is not None:
+            return err
+        return Response(png, media_type="image/png")
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, dict]:
+        return {"gemini": gemini.stats(), "openai_edit": openai_edit.stats(), "download": download.stats()}
+
+    return app
+
+
+def add_stub_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--stub-port", type=int, default=9009)
+    ap.add_argument("--gemini-latency", default="800:2000", help="중앙값:p95 (ms)")
+    ap.add_argument("--openai-latency", default="5000:9000", help="중앙값:p95 (ms)")
+    ap.add_argument("--download-latency", default="150:400", help="중앙값:p95 (ms)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="업스트림 500 비율")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="업스트림 429 비율")
+    ap.add_argument("--stub-image-size", type=int, default=1024)
+
+
+def app_from_args(args: argparse.Namespace) -> FastAPI:
+    return create_app(
+        Upstream(args.gemini_latency, args.fail_rate, args.rate_limit_rate),
+        Upstream(args.openai_latency, args.fail_rate, args.rate_limit_rate),
+        Upstream(args.download_latency),
+        image_size=args.stub_image_size,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Gemini/OpenAI 벤치마크 대역 서버")
+    add_stub_args(ap)
+    args = ap.parse_args()
+    uvicorn.run(app_from_args(args), host="127.0.0.1", port=args.stub_port, log_level="warning")
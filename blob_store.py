@@ -0,0 +1,162 @@
+# blob_store.py
+"""
+내용 주소(content-addressed) 이미지 저장소.
+
+    IMAGE_DIR/blobs/ab/abcdef….jpg     실제 바이트 (sha256 = 파일명)
+    IMAGE_DIR/store/N_store_1.jpg      → 같은 blob 의 하드링크 (이름은 참조일 뿐)
+    IMAGE_DIR/store/web/N_store_1.jpg  → 파생본도 각각 blob 의 하드링크
+
+- 같은 내용은 디스크에 한 번만 저장된다. nginx(/images/) 는 기존 이름 그대로 서빙
+- group_index.blob_index 에 "입력 내용 기반 키 → 저장된 blob 들" 을 기록해 두고,
+  같은 입력이 다시 오면 디코딩/인코딩/outpaint 를 건너뛰고 새 이름으로 링크만 건다
+- 하드링크가 안 되는 파일시스템(다른 디바이스 등)이면 복사로 대체
+- 어떤 이름도 가리키지 않는 blob(링크 수 1)은 정리 대상 (하드링크 환경 전용, 복사 대체 중이면 실행 금지):
+    python blob_store.py --gc [--dry-run]
+"""
+import hashlib, os, shutil, threading
+from typing import Dict, Optional
+
+import group_index
+from cache import make_key
+from renditions import rendition_relpath
+
+IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
+BLOB_DIR   = os.path.join(IMAGE_ROOT, "blobs")
+BLOB_DEDUP = os.getenv("BLOB_DEDUP", "1") == "1"
+
+SIZES = ("full", "web", "webp", "thumb")
+# ingest_image 출력 규칙이 바뀌면 올린다 → 예전 규칙으로 만든 blob(EXIF 포함 full 등)을 다시 링크하지 않음
+INGEST_VERSION = "2"
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_path(digest: str, ext: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], f"{digest}{ext}")
+
+
+def _link(src: str, dst: str) -> None:
+    """dst 를 src 의 하드링크로 (원자적으로 교체, 실패하면 복사)"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def adopt(path: str) -> str:
+    """
+    방금 쓴 파일을 저장소에 편입하고 내용 해시를 반환.
+    같은 내용의 blob 이 이미 있으면 path 를 그 blob 의 링크로 바꿔 중복 바이트를 없앤다.
+    """
+    digest = digest_file(path)
+    bp = blob_path(digest, os.path.splitext(path)[1])
+    if os.path.exists(bp):
+        if not os.path.samefile(bp, path):
+            _link(bp, path)
+        return digest
+    os.makedirs(os.path.dirname(bp), exist_ok=True)
+    try:
+        os.link(path, bp)
+    except FileExistsError:
+        _link(bp, path)
+    except OSError:
+        shutil.copyfile(path, bp)
+    return digest
+
+
+def adopt_renditions(directory: str, filename: str) -> Dict[str, str]:
+    """filename 과 존재하는 파생본(web/webp/thumb)을 편입 → {size: digest}"""
+    out: Dict[str, str] = {}
+    for size in SIZES:
+        path = os.path.join(directory, rendition_relpath(size, filename))
+        if os.path.exists(path):
+            out[size] = adopt(path)
+    return out
+
+
+def link_renditions(blobs: Dict[str, str], directory: str, filename: str) -> Optional[Dict[str, dict]]:
+    """
+    저장된 blob 들을 새 이름(filename + 파생본)으로 링크.
+    blob 이 하나라도 없으면(정리됨) 아무것도 만들지 않고 None → 호출자가 새로 생성한다.
+    반환: {size: {"relpath", "bytes"}} (ingest_image 결과와 같은 모양)
+    """
+    if "full" not in blobs:
+        return None
+    plan = []
+    for size, digest in blobs.items():
+        rel = rendition_relpath(size, filename)
+        src = blob_path(digest, os.path.splitext(rel)[1])
+        if not os.path.exists(src):
+            return None
+        plan.append((size, rel, src))
+    out: Dict[str, dict] = {}
+    for size, rel, src in plan:
+        _link(src, os.path.join(directory, rel))
+        out[size] = {"relpath": rel, "bytes": os.path.getsize(src)}
+    return out
+
+
+def lookup_and_link(key: str, directory: str, filename: str) -> Optional[Dict[str, dict]]:
+    """blob_index[key] 가 있으면 filename 으로 링크해 파생본 정보 반환, 없으면 None"""
+    if not BLOB_DEDUP:
+        return None
+    blobs = group_index.get_blobs(key)
+    if not blobs:
+        return None
+    return link_renditions(blobs, directory, filename)
+
+
+def remember(key: str, directory: str, filename: str) -> Dict[str, str]:
+    """새로 만든 filename(+파생본)을 편입하고 blob_index[key] 로 기록"""
+    blobs = adopt_renditions(directory, filename)
+    if blobs:
+        group_index.put_blobs(key, blobs)
+    return blobs
+
+
+def ingest_key(digest: str) -> str:
+    """업로드 원본 내용 → 저장본/파생본 (가게 이미지)"""
+    return make_key("ingest", INGEST_VERSION, digest)
+
+
+def gc(dry_run: bool = False) -> Dict[str, int]:
+    """어떤 이름도 링크하지 않는 blob 삭제 (인덱스가 가리켜도 다음 요청에서 다시 생성됨)"""
+    removed = kept = freed = 0
+    if not os.path.isdir(BLOB_DIR):
+        return {"removed": 0, "kept": 0, "freed_bytes": 0}
+    for root, _, files in os.walk(BLOB_DIR):
+        for fn in files:
+            p = os.path.join(root, fn)
+            try:
+                st = os.stat(p)
+                if st.st_nlink <= 1:
+                    if not dry_run:
+                        os.remove(p)
+                    removed += 1
+                    freed += st.st_size
+                else:
+                    kept += 1
+            except OSError:
+                pass
+    return {"removed": removed, "kept": kept, "freed_bytes": freed}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--gc" in sys.argv:
+        print(gc(dry_run="--dry-run" in sys.argv))
+    else:
+        print(__doc__)
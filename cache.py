@@ -0,0 +1,201 @@
+# cache.py
+"""
+크기 제한(LRU) + TTL 메모리 캐시, 선택적으로 디스크 2차 캐시.
+
+    c = TTLCache("prompt", max_items=1024, ttl_sec=86400,
+                 disk_dir="/.../cache/prompt", dumps=str.encode, loads=bytes.decode)
+    v = c.get(key)      # 없거나 만료면 None
+    c.set(key, v)
+    v = await c.aget(key); await c.aset(key, v)   # 이벤트 루프에서: 디스크 단계만 스레드로
+    c.stats()           # {"hits", "misses", "disk_hits", "size", ...}
+
+키는 파일명으로도 쓰이므로 make_key() 로 만든 해시 문자열을 권장.
+
+SingleFlight: 같은 키로 동시에 들어온 비동기 호출을 한 번의 실행으로 합친다.
+"""
+import asyncio, hashlib, os, threading, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def make_key(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, (bytes, bytearray, memoryview)):
+            h.update(bytes(p))
+        else:
+            h.update(str(p).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class TTLCache:
+    def __init__(self, name: str, max_items: int, ttl_sec: float,
+                 disk_dir: Optional[str] = None,
+                 dumps: Optional[Callable[[Any], bytes]] = None,
+                 loads: Optional[Callable[[bytes], Any]] = None):
+        self.name = name
+        self.max_items = max(1, max_items)
+        self.ttl_sec = ttl_sec
+        self.disk_dir = disk_dir if (disk_dir and dumps and loads) else None
+        self._dumps = dumps
+        self._loads = loads
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._sets = 0
+
+    # ---- 디스크 ----
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_sec:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return self._loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            return None
+
+    def _disk_set(self, key: str, value: Any) -> None:
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(self._dumps(value))
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ 캐시({self.name}) 디스크 저장 실패: {e}")
+
+    def _disk_prune(self) -> None:
+        """만료된 디스크 항목 정리 (set 이 max_items 번 일어날 때마다 한 번)"""
+        now = time.time()
+        for root, _, files in os.walk(self.disk_dir):
+            for fn in files:
+                p = os.path.join(root, fn)
+                try:
+                    if now - os.path.getmtime(p) > self.ttl_sec:
+                        os.remove(p)
+                except OSError:
+                    pass
+
+    # ---- 메모리 ----
+    def _get_memory(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._data[key]
+        return None
+
+    def _get_disk(self, key: str) -> Optional[Any]:
+        """메모리에 없을 때: 디스크 2차 캐시 조회 (없으면 miss 로 센다)"""
+        if self.disk_dir:
+            value = self._disk_get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._put(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    # ---- 공개 API ----
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """이벤트 루프용 get: 메모리 조회는 바로, 디스크 조회(파일 I/O + loads)는 스레드에서"""
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        if not self.disk_dir:
+            return self._get_disk(key)      # miss 만 센다
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_store(self, key: str, value: Any) -> None:
+        self._disk_set(key, value)
+        with self._lock:
+            self._sets += 1
+            prune = self._sets % self.max_items == 0
+        if prune:
+            self._disk_prune()
+
+    def set(self, key: str, value: Any) -> None:
+        self._put(key, value)
+        if self.disk_dir:
+            self._disk_store(key, value)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """이벤트 루프용 set: 메모리는 바로, 디스크 저장(dumps + 파일 I/O + 정리)은 스레드에서"""
+        self._put(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_store, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_items": self.max_items,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "disk": bool(self.disk_dir),
+            }
+
+
+class SingleFlight:
+    """
+    value, shared = await sf.do(key, lambda: coro())
+    - 같은 key 가 실행 중이면 새로 호출하지 않고 그 결과(또는 예외)를 함께 받는다 (shared=True)
+    - 실행은 별도 태스크라서 먼저 온 요청이 끊겨도 뒤따르는 요청은 결과를 받는다
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def inflight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,152 @@
+# compositor.py
+"""
+텍스트/로고 오버레이 합성기 (ad-image 생성 결과, /v1/ad-image/compose 공용).
+
+elements 예)
+    [{"type": "text",    "text": "오픈 기념", "font": "/fonts/a.ttf", "size": 64, "color": "white", "position": "top-center"},
+     {"type": "bg_text", "text": "20% 할인", "size": 48, "color": "white", "bg_color": "red", "position": "bottom-left"},
+     {"type": "logo", "logo_index": 0, "scale": 0.2, "position": "bottom-right"}]
+
+- 폰트는 (경로, 크기) 로 캐시 (TrueType 파일을 요소마다 다시 읽지 않음)
+- 텍스트 요소는 글자 영역만 한 번 RGBA 레이어로 그려 (요소 내용, 캔버스 크기) 로 캐시
+- 로고는 (내용 해시, 목표 폭) 으로 리사이즈 결과를 캐시
+- 모든 레이어는 RGBA 캔버스에 alpha_composite → 같은 배치를 반복 적용하면 합성 비용만 남는다
+"""
+import io, json, os
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from cache import TTLCache, make_key
+from metrics import log
+from utils import get_position_coords
+
+FONT_CACHE_MAX_ITEMS  = int(os.getenv("FONT_CACHE_MAX_ITEMS", "64"))
+LAYER_CACHE_MAX_ITEMS = int(os.getenv("LAYER_CACHE_MAX_ITEMS", "256"))
+LAYER_CACHE_TTL_SEC   = float(os.getenv("LAYER_CACHE_TTL_SEC", str(3600)))
+
+TEXT_PADDING = 15
+TEXT_RADIUS  = 20
+
+font_cache = TTLCache("font", FONT_CACHE_MAX_ITEMS, float("inf"))
+text_layer_cache = TTLCache("text_layer", LAYER_CACHE_MAX_ITEMS, LAYER_CACHE_TTL_SEC)
+logo_layer_cache = TTLCache("logo_layer", LAYER_CACHE_MAX_ITEMS, LAYER_CACHE_TTL_SEC)
+
+_MEASURE = ImageDraw.Draw(Image.new("L", (1, 1)))   # textbbox 계산 전용
+
+
+def load_font(path: str, size: int):
+    """(경로, 크기) 캐시. 경로가 없거나 읽기 실패면 기본 폰트"""
+    key = f"{path}\x1f{size}"
+    font = font_cache.get(key)
+    if font is None:
+        font = None
+        if path:
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception as e:
+                log(f"[요소 경고] 폰트 로드 실패({path}): {e}")
+        if font is None:
+            font = ImageFont.load_default(size)
+        font_cache.set(key, font)
+    return font
+
+
+def _rgba(color, default: str) -> Tuple[int, int, int, int]:
+    try:
+        c = ImageColor.getrgb(color or default)
+    except ValueError:
+        c = ImageColor.getrgb(default)
+    return c if len(c) == 4 else (*c, 255)
+
+
+def _render_text(el: dict, W: int, H: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """텍스트(+배경 박스) 영역만 담은 RGBA 레이어와 캔버스 내 좌상단 좌표"""
+    font = load_font(el.get("font") or "", int(el.get("size", 48)))
+    text = str(el.get("text", ""))
+    with_bg = el.get("type") == "bg_text"
+    x, y = get_position_coords(el.get("position", "center-center"), W, H)
+    x0, y0, x1, y1 = (int(v) for v in _MEASURE.textbbox((x, y), text, font=font, anchor="mm"))
+    pad = TEXT_PADDING if with_bg else 0
+    ox, oy = x0 - pad, y0 - pad
+    size = (max(1, x1 - x0 + 2 * pad), max(1, y1 - y0 + 2 * pad))
+
+    # 글자 커버리지를 L 마스크로 그린 뒤 알파로 사용 (투명 배경에 직접 그리면 가장자리가 어두워짐)
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text((x - ox, y - oy), text, font=font, fill=255, anchor="mm")
+    color = _rgba(el.get("color"), "white")
+    glyphs = Image.new("RGBA", size, color[:3] + (0,))
+    glyphs.putalpha(mask if color[3] == 255 else mask.point(lambda v: v * color[3] // 255))
+    if not with_bg:
+        return glyphs, (ox, oy)
+
+    layer = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(layer).rounded_rectangle(
+        [0, 0, size[0] - 1, size[1] - 1], radius=TEXT_RADIUS, fill=_rgba(el.get("bg_color"), "red"),
+    )
+    layer.alpha_composite(glyphs)
+    return layer, (ox, oy)
+
+
+def text_layer(el: dict, W: int, H: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    fields = {k: el.get(k) for k in ("type", "text", "font", "size", "color", "bg_color", "position")}
+    key = make_key("text", json.dumps(fields, sort_keys=True, ensure_ascii=False), W, H)
+    cached = text_layer_cache.get(key)
+    if cached is None:
+        cached = _render_text(el, W, H)
+        text_layer_cache.set(key, cached)
+    return cached
+
+
+def logo_layer(data: bytes, logo_hash: str, target_w: int) -> Image.Image:
+    key = make_key("logo", logo_hash, target_w)
+    cached = logo_layer_cache.get(key)
+    if cached is None:
+        logo = Image.open(io.BytesIO(data)).convert("RGBA")
+        target_h = max(1, int(target_w / logo.width * logo.height))
+        cached = logo.resize((target_w, target_h), Image.Resampling.LANCZOS)
+        logo_layer_cache.set(key, cached)
+    return cached
+
+
+def _paste(canvas: Image.Image, layer: Image.Image, x: int, y: int) -> None:
+    """캔버스 밖으로 나가는 부분은 잘라서 alpha_composite (음수 좌표 허용)"""
+    sx, sy = max(0, -x), max(0, -y)
+    dx, dy = max(0, x), max(0, y)
+    w = min(layer.width - sx, canvas.width - dx)
+    h = min(layer.height - sy, canvas.height - dy)
+    if w <= 0 or h <= 0:
+        return
+    canvas.alpha_composite(layer, (dx, dy), (sx, sy, sx + w, sy + h))
+
+
+def compose(img: Image.Image, elements: List[dict], logos: Optional[List[Optional[bytes]]] = None) -> Image.Image:
+    """
+    elements 를 순서대로 합성한 새 RGB 이미지.
+    logos: 업로드 순서대로의 로고 원본 바이트 (읽기 실패는 None) — logo_index 로 참조
+    """
+    canvas = img.convert("RGBA")
+    W, H = canvas.size
+    logos = logos or []
+    logo_hashes = [make_key("logo", d) if d else None for d in logos]
+    for el in elements:
+        try:
+            etype = el.get("type")
+            if etype in ("text", "bg_text"):
+                layer, (x, y) = text_layer(el, W, H)
+                _paste(canvas, layer, x, y)
+            elif etype == "logo":
+                idx = int(el.get("logo_index", 0))
+                if 0 <= idx < len(logos) and logos[idx]:
+                    scale = float(el.get("scale", 0.2))
+                    logo_w = max(1, int(W * max(0.05, min(0.8, scale))))
+                    layer = logo_layer(logos[idx], logo_hashes[idx], logo_w)
+                    x, y = get_position_coords(el.get("position", "bottom-right"), W, H)
+                    _paste(canvas, layer, int(x - layer.width / 2), int(y - layer.height / 2))
+        except Exception as e:
+            log(f"[요소 경고] 요소 적용 실패: {e}")
+    return canvas.convert("RGB")
+
+
+def stats() -> dict:
+    return {"font": font_cache.stats(), "text_layer": text_layer_cache.stats(), "logo_layer": logo_layer_cache.stats()}
@@ -5,7 +5,9 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 _raw_model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 MODEL_ID = _raw_model.split("/")[-1]
-GEMINI_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_ID}:generateContent"
+# 로컬 스텁 서버로 돌릴 때 GEMINI_API_BASE=http://127.0.0.1:9001 처럼 지정
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_ENDPOINT = f"{GEMINI_API_BASE}/v1beta/models/{MODEL_ID}:generateContent"
 
 if not GEMINI_API_KEY:
     raise RuntimeError("GEMINI_API_KEY가 없습니다. 프로젝트 루트의 .env를 확인하세요.")
\ No newline at end of file
@@ -0,0 +1,70 @@
+# deadline.py
+"""
+요청 단위 시간 예산.
+
+    dl = Deadline(OUTPAINT_DEADLINE_SEC)
+    prompt = await dl.run(translate(), dl.share(0.15))   # 번역은 예산의 15% 까지만 → 넘기면 asyncio.TimeoutError
+    img = await dl.run(generate())                       # 남은 예산 전부
+    async for chunk in dl.iterate(stream()): ...         # 스트림 전체가 남은 예산 안에서
+
+단계마다 고정 타임아웃(90초)을 따로 두면 느린 단계 하나가 요청 전체 지연을 정한다.
+예산을 파이프라인에 넘겨 주면 앞 단계가 늦을수록 뒤 단계의 허용 시간이 줄고,
+보조 단계(번역)는 자기 몫을 넘기는 즉시 대체 경로로 빠진다.
+"""
+import asyncio, time
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """예산이 이미 소진됨 (호출하기 전에 판단)"""
+
+
+class Deadline:
+    def __init__(self, budget_sec: float):
+        self.budget = max(0.0, budget_sec)
+        self._end = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self._end - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def share(self, fraction: float) -> float:
+        """전체 예산의 fraction 몫 (남은 예산보다 길 수 없음)"""
+        return min(self.remaining(), self.budget * fraction)
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """남은 예산과 단계 자체 상한(cap) 중 짧은 쪽"""
+        rem = self.remaining()
+        return rem if cap is None else min(rem, cap)
+
+    async def run(self, aw: Awaitable[T], seconds: Optional[float] = None) -> T:
+        """aw 를 seconds(기본: 남은 예산) 안에 끝내지 못하면 asyncio.TimeoutError"""
+        seconds = self.remaining() if seconds is None else seconds
+        if seconds <= 0:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise DeadlineExceeded("시간 예산을 모두 썼습니다.")
+        return await asyncio.wait_for(aw, seconds)
+
+    async def iterate(self, ait: AsyncIterator[T]) -> AsyncIterator[T]:
+        """ait 의 조각을 남은 예산 안에서만 기다린다. 넘기면 asyncio.TimeoutError, 스트림은 닫는다"""
+        it = ait.__aiter__()
+        try:
+            while True:
+                try:
+                    item = await self.run(it.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            aclose = getattr(it, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def to_dict(self) -> dict:
+        return {"budget_sec": self.budget, "remaining_sec": round(self.remaining(), 3)}
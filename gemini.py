@@ -0,0 +1,133 @@
+# gemini.py
+"""
+Gemini REST generateContent 호출 (공유 http_client 사용).
+호출은 upstream 스케줄러("gemini" 슬롯/토큰, 우선순위, 429/5xx 재시도)를 거친다.
+generateContent 는 멱등이라 모델별 지연 p{UPSTREAM_HEDGE_PERCENTILE} 를 넘기면 헤지 요청을 보낸다 (스트림은 제외).
+재시도 후에도 남은 HTTP/타임아웃 오류는 app_upstream_errors_total{provider="gemini"} 로 센 뒤 그대로 전파한다.
+"""
+import asyncio, json
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+import http_client
+import metrics
+import upstream
+from cache import make_key
+from config import GEMINI_API_KEY, GEMINI_API_BASE, MODEL_ID
+
+
+def endpoint(model: str = MODEL_ID, method: str = "generateContent") -> str:
+    return f"{GEMINI_API_BASE}/v1beta/models/{model}:{method}"
+
+
+def _body_key(model: str, body: dict) -> str:
+    return make_key("gemini", model, "body", json.dumps(body, sort_keys=True, ensure_ascii=False))
+
+
+async def generate_content(parts: List[dict], model: str = MODEL_ID,
+                           timeout: Optional[httpx.Timeout] = None,
+                           priority: int = upstream.INTERACTIVE, coalesce: bool = True,
+                           hedge: bool = True, key: Optional[str] = None) -> dict:
+    """
+    contents=[{parts}] 로 호출하고 응답 JSON 반환 (HTTP 오류는 httpx 예외로 전파).
+    coalesce=True 면 본문이 같은 동시 호출은 한 번만 보낸다.
+      key: 호출자가 이미 가진 입력 식별자(프롬프트 + 이미지 해시 등). 없으면 본문을 해시하는데,
+      이미지(base64)가 들어 있으면 직렬화/해시를 스레드에서 한다.
+    hedge=True 면 느린 호출에 같은 요청을 하나 더 보내 먼저 온 응답을 쓴다.
+    """
+    client = http_client.get_client()
+    body = {"contents": [{"parts": parts}]}
+
+    async def _post() -> dict:
+        r = await client.post(
+            endpoint(model),
+            params={"key": GEMINI_API_KEY},
+            json=body,
+            timeout=timeout or http_client.DEFAULT_TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+
+    if not coalesce:
+        key = None
+    elif key is not None:
+        key = make_key("gemini", model, key)
+    elif any("inline_data" in p for p in parts):
+        key = await asyncio.to_thread(_body_key, model, body)
+    else:
+        key = _body_key(model, body)
+    try:
+        return await upstream.call(
+            "gemini", _post, priority=priority, key=key, hedge=f"gemini:{model}" if hedge else None,
+        )
+    except httpx.HTTPError as e:
+        metrics.upstream_error("gemini", e)
+        raise
+
+
+async def stream_generate_content(parts: List[dict], model: str = MODEL_ID,
+                                  timeout: Optional[httpx.Timeout] = None,
+                                  priority: int = upstream.INTERACTIVE) -> AsyncIterator[str]:
+    """
+    streamGenerateContent(alt=sse) 로 호출하고 텍스트 조각을 도착하는 대로 yield.
+    스트림 동안 슬롯을 잡고, 첫 조각을 내보내기 전의 오류만 재시도한다.
+    HTTP 오류는 본문을 읽은 뒤 httpx.HTTPStatusError 로 전파.
+    """
+    client = http_client.get_client()
+    attempt = 0
+    while True:
+        started = False
+        try:
+            async with upstream.slot("gemini", priority):
+                async for text in _stream_text(client, parts, model, timeout):
+                    started = True
+                    yield text
+            return
+        except httpx.HTTPError as e:
+            delay = None if started else upstream.retry_delay("gemini", attempt, e)
+            if delay is None:
+                metrics.upstream_error("gemini", e)
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def _stream_text(client: httpx.AsyncClient, parts: List[dict], model: str,
+                       timeout: Optional[httpx.Timeout]) -> AsyncIterator[str]:
+    async with client.stream(
+        "POST",
+        endpoint(model, "streamGenerateContent"),
+        params={"key": GEMINI_API_KEY, "alt": "sse"},
+        json={"contents": [{"parts": parts}]},
+        timeout=timeout or http_client.DEFAULT_TIMEOUT,
+    ) as r:
+        if r.status_code >= 400:
+            await r.aread()
+            r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if not data:
+                continue
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            text = response_text(chunk, strip=False)
+            if text:
+                yield text
+
+
+def response_text(resp_json: dict, strip: bool = True) -> str:
+    """candidates[0].content.parts[*].text 를 이어 붙인 문자열 (없으면 "")"""
+    try:
+        cands = resp_json.get("candidates", [])
+        if cands:
+            parts_out = cands[0].get("content", {}).get("parts", [])
+            text = "".join(p.get("text", "") for p in parts_out)
+            return text.strip() if strip else text
+    except Exception:
+        pass
+    return ""
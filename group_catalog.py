@@ -0,0 +1,139 @@
+# group_catalog.py
+"""
+그룹별 파일 목록의 메모리 카탈로그 (generate-promo 조회용).
+
+- 기동 시 group_index(SQLite)에서 한 번 전체 로드
+- 같은 프로세스의 쓰기는 group_index.record_file 훅으로 즉시 반영
+- 다른 uvicorn 워커의 쓰기는 CATALOG_SYNC_SEC 간격으로 id > 마지막 id 행만 읽어 증분 반영
+- CATALOG_RESCAN_SEC 간격으로 인덱스 전체를 다시 읽어 그룹별 목록을 통째로 교체
+  → 디스크에서 지워진 파일(수동 삭제, blob_store.gc 등)이 목록에서 빠진다 (인덱스는 추가만 하므로)
+  (둘 다 백그라운드 스레드에서 — 조회하는 요청 핸들러는 메모리만 읽고 SQLite/디스크를 기다리지 않는다)
+→ 조회 시 디렉터리 listdir/glob 을 하지 않는다
+"""
+import os, threading, time
+from typing import Dict, List, Optional, Set, Tuple
+
+import group_index
+
+CATALOG_SYNC_SEC   = float(os.getenv("CATALOG_SYNC_SEC", "1.0"))
+CATALOG_RESCAN_SEC = float(os.getenv("CATALOG_RESCAN_SEC", "60"))
+
+Groups = Dict[int, Dict[str, Set[str]]]
+
+
+def _add(groups: Groups, group: int, kind: str, filename: str) -> None:
+    groups.setdefault(group, {k: set() for k in group_index.KINDS}).setdefault(kind, set()).add(filename)
+
+
+def _exists(kind: str, filename: str) -> bool:
+    directory = group_index.STORE_DIR if kind == "store" else group_index.FOOD_DIR
+    return os.path.exists(os.path.join(directory, filename))
+
+
+class GroupCatalog:
+    def __init__(self, sync_sec: float, rescan_sec: float):
+        self._sync_sec = sync_sec
+        self._rescan_sec = rescan_sec
+        self._groups: Groups = {}
+        self._latest_food_ai: Optional[int] = None
+        self._last_id = 0
+        self._last_sync = 0.0
+        self._last_rescan = 0.0
+        self._scan_adds: Optional[List[Tuple[int, str, str]]] = None   # 재검사 중 훅으로 들어온 파일
+        self._loaded = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _apply(self, group: int, kind: str, filename: str) -> None:
+        _add(self._groups, group, kind, filename)
+        if kind == "food_ai" and (self._latest_food_ai is None or group > self._latest_food_ai):
+            self._latest_food_ai = group
+
+    def _pull(self) -> None:
+        rows = group_index.rows_since(self._last_id)   # SQLite 조회는 잠금 밖에서
+        with self._lock:
+            for row_id, group, kind, filename in rows:
+                self._apply(group, kind, filename)
+                self._last_id = max(self._last_id, row_id)
+            self._last_sync = time.monotonic()
+
+    def _rescan(self) -> None:
+        """
+        인덱스 전체 → 디스크에 있는 파일만 남긴 새 목록으로 교체 (SQLite/stat 은 잠금 밖에서).
+        그동안 같은 프로세스 훅으로 들어온 파일은 교체할 때 다시 넣고,
+        다른 워커가 기록한 행은 id 가 _last_id 보다 커서 다음 _pull 이 반영한다.
+        """
+        with self._lock:
+            self._scan_adds = []
+        rows = group_index.rows_since(0)
+        groups: Groups = {}
+        last_id = 0
+        for row_id, group, kind, filename in rows:
+            last_id = max(last_id, row_id)
+            if _exists(kind, filename):
+                _add(groups, group, kind, filename)
+        with self._lock:
+            for added in self._scan_adds or ():
+                _add(groups, *added)
+            self._scan_adds = None
+            latest = max((g for g, files in groups.items() if files.get("food_ai")), default=None)
+            self._groups = groups
+            self._latest_food_ai = latest
+            self._last_id = last_id
+            self._last_sync = self._last_rescan = time.monotonic()
+
+    def _refresh(self) -> None:
+        try:
+            if time.monotonic() - self._last_rescan >= self._rescan_sec:
+                self._rescan()
+            else:
+                self._pull()
+        except Exception as e:
+            print(f"⚠️ 카탈로그 동기화 실패: {e}")
+        finally:
+            self._refreshing = False
+
+    def load(self) -> None:
+        """전체 재로드 (기동 시 1회, lifespan 에서 run_in_threadpool 로)"""
+        self._rescan()
+        self._loaded = True
+
+    def sync(self, force: bool = False) -> None:
+        """
+        force=True 면 지금 바로 전체 재검사(호출 스레드에서). 아니면 CATALOG_SYNC_SEC 이 지났을 때
+        백그라운드 스레드로 증분 반영(CATALOG_RESCAN_SEC 마다는 전체 재검사)을 시작만 하고 돌아간다
+        → 이번 조회는 직전 상태를 읽는다.
+        """
+        if not self._loaded:
+            self.load()
+            return
+        if force:
+            self._rescan()
+            return
+        if time.monotonic() - self._last_sync < self._sync_sec:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="catalog-sync", daemon=True).start()
+
+    def add(self, group: int, kind: str, filename: str) -> None:
+        """쓰기 경로 훅: 저장 직후 호출"""
+        with self._lock:
+            self._apply(group, kind, filename)
+            if self._scan_adds is not None:
+                self._scan_adds.append((group, kind, filename))
+
+    def latest_group_with_food_ai(self) -> Optional[int]:
+        self.sync()
+        return self._latest_food_ai
+
+    def files(self, group: int, kind: str) -> List[str]:
+        self.sync()
+        with self._lock:
+            return sorted(self._groups.get(group, {}).get(kind, ()))
+
+
+catalog = GroupCatalog(CATALOG_SYNC_SEC, CATALOG_RESCAN_SEC)
+group_index.add_listener(catalog.add)
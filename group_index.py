@@ -0,0 +1,219 @@
+# group_index.py
+"""
+그룹 번호(N) 할당 + 그룹별 파일 목록 인덱스 (SQLite WAL, IMAGE_DIR 아래).
+
+- 번호 할당은 BEGIN IMMEDIATE 트랜잭션 안에서 카운터만 증가 → 디렉터리 크기와 무관한 O(1),
+  여러 스레드/uvicorn 워커가 동시에 호출해도 같은 N 이 나오지 않는다
+- 카운터는 기존 규칙을 그대로 따른다
+    * store 업로드: food/store 전체 최대 + 1 (새 그룹)
+    * outpaint    : food 최대 + 1 (직전에 업로드한 store 그룹과 같은 N 이 됨)
+- 인덱스가 비어 있으면 기존 파일명(N_food.jpg, N_food_AI.jpg, N_store_i.jpg)으로 한 번 재구성
+- blob_index: 입력 내용 기반 키 → 저장된 blob 해시들 (blob_store 참고, 중복 업로드/재생성 생략용)
+
+    python group_index.py --rebuild   # 수동 재구성 (실행 중인 서버는 재시작해야 카탈로그에 반영)
+"""
+import json, os, re, sqlite3, threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
+FOOD_DIR   = os.path.join(IMAGE_ROOT, "food")
+STORE_DIR  = os.path.join(IMAGE_ROOT, "store")
+GROUP_INDEX_PATH = os.getenv("GROUP_INDEX_PATH", os.path.join(IMAGE_ROOT, "group_index.sqlite3"))
+
+# N_food.jpg / N_food_AI.jpg / N_food_AI_{w}x{h}.jpg (배치 outpaint 의 추가 비율)
+FOOD_PAT  = re.compile(r"^(\d+)_food(_AI(_\d+x\d+)?)?\.jpg$", re.IGNORECASE)
+STORE_PAT = re.compile(r"^(\d+)_store_(\d+)\.jpg$", re.IGNORECASE)
+
+KINDS = ("food", "food_ai", "food_ai_variant", "store")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_files (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    grp        INTEGER NOT NULL,
+    kind       TEXT    NOT NULL,
+    filename   TEXT    NOT NULL,
+    created_at REAL    NOT NULL,
+    UNIQUE (kind, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_group_files_grp ON group_files (grp);
+CREATE TABLE IF NOT EXISTS blob_index (
+    key        TEXT PRIMARY KEY,
+    blobs      TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+_listeners: List[Callable[[int, str, str], None]] = []
+_init_lock = threading.Lock()
+_initialized_path: Optional[str] = None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(GROUP_INDEX_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(GROUP_INDEX_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    _ensure_schema(conn)
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    global _initialized_path
+    if _initialized_path == GROUP_INDEX_PATH:
+        return
+    with _init_lock:
+        if _initialized_path == GROUP_INDEX_PATH:
+            return
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM counters WHERE name = 'last_group'").fetchone()
+            if row is None:
+                _rebuild(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _initialized_path = GROUP_INDEX_PATH
+
+
+def _scan(dir_path: str, pat: "re.Pattern") -> List[tuple]:
+    if not os.path.isdir(dir_path):
+        return []
+    out = []
+    for name in os.listdir(dir_path):
+        m = pat.match(name)
+        if m:
+            out.append((int(m.group(1)), m, name))
+    return out
+
+
+def _rebuild(conn: sqlite3.Connection) -> Dict[str, int]:
+    """트랜잭션 안에서 호출: 파일명으로 인덱스/카운터를 다시 만든다"""
+    conn.execute("DELETE FROM group_files")
+    now = time.time()
+    rows = []
+    for n, m, name in _scan(FOOD_DIR, FOOD_PAT):
+        kind = "food_ai_variant" if m.group(3) else ("food_ai" if m.group(2) else "food")
+        rows.append((n, kind, name, now))
+    for n, _, name in _scan(STORE_DIR, STORE_PAT):
+        rows.append((n, "store", name, now))
+    conn.executemany(
+        "INSERT OR IGNORE INTO group_files (grp, kind, filename, created_at) VALUES (?, ?, ?, ?)", rows
+    )
+    last_food  = max((r[0] for r in rows if r[1] != "store"), default=0)
+    last_group = max((r[0] for r in rows), default=0)
+    conn.executemany(
+        "INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)",
+        [("last_food", last_food), ("last_group", last_group)],
+    )
+    return {"files": len(rows), "last_food": last_food, "last_group": last_group}
+
+
+def rebuild_from_disk() -> Dict[str, int]:
+    """기존 파일명 기준 1회성 재구성(마이그레이션용)"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stats = _rebuild(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return stats
+
+
+def _counter(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+
+def allocate_group() -> int:
+    """새 그룹 번호: food/store 전체 최대 + 1 (store 업로드용)"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        n = _counter(conn, "last_group") + 1
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'last_group'", (n,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n
+
+
+def allocate_food_group() -> int:
+    """음식 번호: food 최대 + 1 (outpaint 용, 직전 store 그룹과 짝을 이룸)"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        n = _counter(conn, "last_food") + 1
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'last_food'", (n,))
+        conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'last_group'", (n,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n
+
+
+def add_listener(fn: Callable[[int, str, str], None]) -> None:
+    """record_file 직후 fn(group, kind, filename) 호출 (같은 프로세스 내 캐시 갱신용)"""
+    _listeners.append(fn)
+
+
+def record_file(group: int, kind: str, filename: str) -> None:
+    """그룹에 저장된 파일 기록 (kind: food | food_ai | food_ai_variant | store)"""
+    if kind not in KINDS:
+        raise ValueError(f"알 수 없는 kind: {kind}")
+    _connect().execute(
+        "INSERT OR REPLACE INTO group_files (grp, kind, filename, created_at) VALUES (?, ?, ?, ?)",
+        (group, kind, filename, time.time()),
+    )
+    for fn in _listeners:
+        fn(group, kind, filename)
+
+
+def rows_since(last_id: int) -> List[Tuple[int, int, str, str]]:
+    """id > last_id 인 (id, grp, kind, filename) 행 (증분 동기화용)"""
+    return _connect().execute(
+        "SELECT id, grp, kind, filename FROM group_files WHERE id > ? ORDER BY id", (last_id,)
+    ).fetchall()
+
+
+def group_files(group: int) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {k: [] for k in KINDS}
+    rows = _connect().execute(
+        "SELECT kind, filename FROM group_files WHERE grp = ? ORDER BY filename", (group,)
+    ).fetchall()
+    for kind, filename in rows:
+        out.setdefault(kind, []).append(filename)
+    return out
+
+
+def get_blobs(key: str) -> Optional[Dict[str, str]]:
+    """blob_index 조회: {"full": digest, "web": digest, ...} 또는 None"""
+    row = _connect().execute("SELECT blobs FROM blob_index WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def put_blobs(key: str, blobs: Dict[str, str]) -> None:
+    _connect().execute(
+        "INSERT OR REPLACE INTO blob_index (key, blobs, created_at) VALUES (?, ?, ?)",
+        (key, json.dumps(blobs, sort_keys=True), time.time()),
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    if "--rebuild" in sys.argv:
+        print(rebuild_from_disk())
+    else:
+        print(__doc__)
@@ -0,0 +1,109 @@
+# http_client.py
+"""
+앱 전체가 공유하는 비동기 HTTP 클라이언트 (Gemini / OpenAI / 결과 이미지 다운로드).
+
+- keep-alive 커넥션 풀 재사용 (요청마다 TCP+TLS 핸드셰이크 X)
+- h2 패키지가 있으면 HTTP/2
+- 호스트별 동시 연결 상한(HTTP_MAX_PER_HOST), connect/read 타임아웃 명시
+- app lifespan 에서 startup()/shutdown(), 그 외에는 get_client()
+"""
+import asyncio, os
+from typing import Dict, Optional
+
+import httpx
+
+HTTP_CONNECT_TIMEOUT  = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT     = float(os.getenv("HTTP_READ_TIMEOUT", "90"))
+HTTP_MAX_CONNECTIONS  = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE    = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_PER_HOST     = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+DEFAULT_TIMEOUT = httpx.Timeout(
+    connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT, write=HTTP_READ_TIMEOUT, pool=HTTP_CONNECT_TIMEOUT,
+)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """응답 본문을 다 읽거나 닫을 때 호스트 슬롯을 반납"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release:
+                release()
+
+
+class _PerHostLimitTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, per_host: int):
+        self._inner = inner
+        self._per_host = max(1, per_host)
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sem = self._sems.setdefault(request.url.host, asyncio.Semaphore(self._per_host))
+        await sem.acquire()
+        try:
+            resp = await self._inner.handle_async_request(request)
+        except BaseException:
+            sem.release()
+            raise
+        return httpx.Response(
+            status_code=resp.status_code,
+            headers=resp.headers,
+            stream=_ReleasingStream(resp.stream, sem.release),
+            extensions=resp.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = _PerHostLimitTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=HTTP2), HTTP_MAX_PER_HOST,
+    )
+    return httpx.AsyncClient(transport=transport, timeout=DEFAULT_TIMEOUT, follow_redirects=True)
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def startup() -> None:
+    get_client()
+
+
+async def shutdown() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
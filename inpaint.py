@@ -0,0 +1,259 @@
+# inpaint.py
+"""
+Stable Diffusion Inpainting 엔진 (ad-image 용).
+
+- 파이프라인(INPAINT_MODEL)은 start() 시 한 번만 로드 (기동 워밍업 "inpaint" 또는 첫 요청)
+- 품질 단계(INPAINT_TIERS): 이름:짧은변:스텝[:guidance] — 예) preview 는 512px × 20 스텝
+- 동시에 들어온 요청 중 같은 (단계, 크기) 는 INPAINT_BATCH_WAIT_MS 동안 모아 파이프라인 1회 호출로 처리
+- 스케줄러는 INPAINT_SCHEDULER 로 교체 (기본 dpm++ : 20 스텝 안팎에서 50 스텝 PNDM 과 비슷한 품질)
+- CPU 에서는 torch.set_num_threads(INPAINT_THREADS) + UNet channels_last
+
+INPAINT_MODEL 은 허브 id 또는 로컬 경로. 개발/확인용으로는 작은 체크포인트를 쓰면 된다.
+    INPAINT_MODEL=hf-internal-testing/tiny-stable-diffusion-pipe python inpaint.py
+"""
+import os, queue, threading, time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+import metrics
+
+INPAINT_MODEL         = os.getenv("INPAINT_MODEL", "runwayml/stable-diffusion-inpainting")
+INPAINT_DEVICE        = os.getenv("INPAINT_DEVICE", "auto")            # auto|cpu|cuda
+INPAINT_SCHEDULER     = os.getenv("INPAINT_SCHEDULER", "dpm++")       # dpm++|euler_a|euler|unipc|ddim|default
+INPAINT_THREADS       = int(os.getenv("INPAINT_THREADS", "0")) or (os.cpu_count() or 1)
+INPAINT_BATCH_MAX     = int(os.getenv("INPAINT_BATCH_MAX", "4"))
+INPAINT_BATCH_WAIT_MS = float(os.getenv("INPAINT_BATCH_WAIT_MS", "50"))
+INPAINT_QUEUE_MAX     = int(os.getenv("INPAINT_QUEUE_MAX", "32"))
+INPAINT_TIERS         = os.getenv("INPAINT_TIERS", "preview:512:20,standard:512:30,high:768:50")
+INPAINT_DEFAULT_TIER  = os.getenv("INPAINT_DEFAULT_TIER", "standard")
+
+NEGATIVE_PROMPT = (
+    "text, logo, watermark, blurry, low quality, distorted, bad quality, "
+    "clutter, extra objects, repeated patterns, overexposed, artifacts"
+)
+
+
+class Tier(NamedTuple):
+    name: str
+    size: int          # 짧은 변 (8의 배수)
+    steps: int
+    guidance: float
+
+
+def _parse_tiers(spec: str) -> Dict[str, Tier]:
+    tiers: Dict[str, Tier] = {}
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) < 3 or not parts[0]:
+            continue
+        try:
+            size = max(64, int(parts[1]) - int(parts[1]) % 8)
+            guidance = float(parts[3]) if len(parts) > 3 else 7.5
+            tiers[parts[0]] = Tier(parts[0], size, max(1, int(parts[2])), guidance)
+        except ValueError:
+            print(f"⚠️ INPAINT_TIERS 항목 무시: {item!r}")
+    return tiers or {"standard": Tier("standard", 512, 30, 7.5)}
+
+
+TIERS = _parse_tiers(INPAINT_TIERS)
+
+
+class InpaintBusy(RuntimeError):
+    """대기열이 가득 참 (INPAINT_QUEUE_MAX)"""
+
+
+class _Request(NamedTuple):
+    key: Tuple[str, int, int]       # (tier, width, height) — 같은 키끼리만 한 번에 실행
+    image: Image.Image
+    mask: Image.Image
+    prompt: str
+    seed: Optional[int]
+    future: Future
+
+
+def _make_scheduler(name: str, config):
+    from diffusers import (
+        DDIMScheduler, DPMSolverMultistepScheduler, EulerAncestralDiscreteScheduler,
+        EulerDiscreteScheduler, UniPCMultistepScheduler,
+    )
+    if name == "dpm++":
+        return DPMSolverMultistepScheduler.from_config(config, use_karras_sigmas=True)
+    table = {
+        "euler_a": EulerAncestralDiscreteScheduler,
+        "euler": EulerDiscreteScheduler,
+        "unipc": UniPCMultistepScheduler,
+        "ddim": DDIMScheduler,
+    }
+    cls = table.get(name)
+    return cls.from_config(config) if cls else None
+
+
+class InpaintEngine:
+    def __init__(self, model: str, batch_max: int, batch_wait_ms: float, queue_max: int):
+        self.model = model
+        self.batch_max = max(1, batch_max)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000.0
+        self.queue_max = max(1, queue_max)
+        self._requests: "queue.Queue[_Request]" = queue.Queue()
+        self._pipe = None
+        self._torch = None
+        self.device = "cpu"
+        self._lock = threading.Lock()
+        self._started = False
+        # 제출됐지만 아직 파이프라인에 들어가지 않은 요청 수 (큐 + 디스패처의 pending 모두)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._started
+
+    def start(self) -> None:
+        """파이프라인 로드 + 디스패처 시작 (여러 번 호출해도 한 번만 수행)"""
+        with self._lock:
+            if self._started:
+                return
+            t0 = time.perf_counter()
+            import torch
+            from diffusers import StableDiffusionInpaintPipeline
+
+            torch.set_num_threads(INPAINT_THREADS)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass   # 이미 병렬 작업이 돌았으면 바꿀 수 없음
+
+            device = INPAINT_DEVICE
+            if device == "auto":
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+            dtype = torch.float16 if device == "cuda" else torch.float32
+
+            pipe = StableDiffusionInpaintPipeline.from_pretrained(
+                self.model, torch_dtype=dtype, safety_checker=None, requires_safety_checker=False,
+            )
+            scheduler = _make_scheduler(INPAINT_SCHEDULER, pipe.scheduler.config)
+            if scheduler is not None:
+                pipe.scheduler = scheduler
+            pipe = pipe.to(device)
+            if device == "cpu":
+                pipe.unet.to(memory_format=torch.channels_last)
+            pipe.set_progress_bar_config(disable=True)
+
+            self._torch, self._pipe, self.device = torch, pipe, device
+            threading.Thread(target=self._dispatch, name="inpaint-dispatch", daemon=True).start()
+            self._started = True
+            print(
+                f"✅ Inpaint 파이프라인 준비 완료: model={self.model}, device={device}, "
+                f"scheduler={type(pipe.scheduler).__name__}, threads={INPAINT_THREADS}, "
+                f"{time.perf_counter() - t0:.1f}s"
+            )
+
+    def _dispatch(self) -> None:
+        pending: deque = deque()   # 다른 키라서 이번 배치에 못 탄 요청
+        while True:
+            first = pending.popleft() if pending else self._requests.get()
+            batch = [first]
+            for req in list(pending):
+                if len(batch) >= self.batch_max:
+                    break
+                if req.key == first.key:
+                    pending.remove(req)
+                    batch.append(req)
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                (batch if req.key == first.key else pending).append(req)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        torch = self._torch
+        tier_name, width, height = batch[0].key
+        tier = TIERS[tier_name]
+        with self._waiting_lock:
+            self._waiting -= len(batch)
+        t0 = time.perf_counter()
+        try:
+            generators = [
+                torch.Generator(device="cpu").manual_seed(r.seed if r.seed is not None else int.from_bytes(os.urandom(4), "little"))
+                for r in batch
+            ]
+            with torch.inference_mode():
+                out = self._pipe(
+                    prompt=[r.prompt for r in batch],
+                    negative_prompt=[NEGATIVE_PROMPT] * len(batch),
+                    image=[r.image for r in batch],
+                    mask_image=[r.mask for r in batch],
+                    width=width,
+                    height=height,
+                    num_inference_steps=tier.steps,
+                    guidance_scale=tier.guidance,
+                    generator=generators,
+                )
+            elapsed = time.perf_counter() - t0
+            metrics.observe_stage("ad_image", f"inpaint_{tier_name}", elapsed)
+            info = {"tier": tier_name, "steps": tier.steps, "batch": len(batch), "inference_ms": round(elapsed * 1000, 1)}
+            for r, img in zip(batch, out.images):
+                r.future.set_result((img, info))
+        except Exception as e:
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(e)
+
+    def submit(self, image: Image.Image, mask: Image.Image, prompt: str,
+               tier: str, seed: Optional[int] = None) -> Future:
+        """
+        인페인팅 요청 (논블로킹, 스레드 안전). image/mask 는 이미 목표 크기(8의 배수)여야 한다.
+        Future 결과: (RGB 이미지, {"tier", "steps", "batch", "inference_ms"})
+        """
+        if not self._started:
+            self.start()
+        if tier not in TIERS:
+            raise ValueError(f"알 수 없는 품질 단계: {tier}")
+        fut: Future = Future()
+        req = _Request((tier, image.width, image.height), image.convert("RGB"), mask.convert("L"), prompt, seed, fut)
+        with self._waiting_lock:
+            # qsize() 만 보면 다른 키라 디스패처 pending 에 밀려 있는 요청이 빠진다
+            if self._waiting >= self.queue_max:
+                raise InpaintBusy("인페인팅 대기열이 가득 찼습니다.")
+            self._waiting += 1
+        self._requests.put(req)
+        return fut
+
+    def warmup(self) -> None:
+        """가장 가벼운 단계로 1회 추론 (첫 요청의 커널/메모리 초기화 비용 제거)"""
+        tier = min(TIERS.values(), key=lambda t: (t.size, t.steps))
+        size = min(tier.size, 256)
+        img = Image.new("RGB", (size, size), (200, 200, 200))
+        mask = Image.new("L", (size, size), 255)
+        self.submit(img, mask, "warmup", tier.name, seed=0).result(timeout=600)
+
+
+engine = InpaintEngine(INPAINT_MODEL, INPAINT_BATCH_MAX, INPAINT_BATCH_WAIT_MS, INPAINT_QUEUE_MAX)
+
+
+if __name__ == "__main__":
+    # 로컬 확인: 작은 체크포인트로 로드 → 가장 가벼운 단계로 동시 요청 몇 개 → 배치/시간 출력
+    import sys
+    from concurrent.futures import wait
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    engine.start()
+    tier = min(TIERS.values(), key=lambda t: (t.size, t.steps))
+    src = Image.new("RGB", (tier.size, tier.size), (180, 140, 90))
+    mask = Image.new("L", src.size, 255)
+    t0 = time.perf_counter()
+    futs = [engine.submit(src, mask, f"test background {i}", tier.name, seed=i) for i in range(n)]
+    wait(futs)
+    for f in futs:
+        img, info = f.result()
+        print(img.size, info)
+    print(f"total {time.perf_counter() - t0:.2f}s for {n} requests")
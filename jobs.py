@@ -0,0 +1,192 @@
+# jobs.py
+import asyncio, os, threading, time, uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import metrics
+
+# 동시에 파이프라인을 실행하는 워커 수 / 대기열 최대 길이 / 완료 작업 보관 시간(초)
+OUTPAINT_WORKERS     = int(os.getenv("OUTPAINT_WORKERS", "2"))
+OUTPAINT_MAX_PENDING = int(os.getenv("OUTPAINT_MAX_PENDING", "32"))
+JOB_TTL_SEC          = int(os.getenv("JOB_TTL_SEC", "3600"))
+
+
+class QueueFull(Exception):
+    """대기 중인 작업이 max_pending 을 넘었을 때"""
+
+
+class Job:
+    """
+    단계(stage)별 진행 상태를 기록하는 작업 단위.
+    stages 는 {"translate": {"status": "pending", ...}, ...} 형태로 순서를 유지한다.
+    """
+
+    def __init__(self, kind: str, stages: List[str], meta: Optional[dict] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"          # queued | running | done | failed
+        self.meta = dict(meta or {})
+        self.meta.setdefault("trace_id", metrics.trace_id())
+        self.stages: Dict[str, dict] = {
+            name: {"status": "pending", "elapsed_ms": None} for name in stages
+        }
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        with job.stage("matting") as st: ...
+        - 진입 시 running, 정상 종료 시 done, 예외 시 failed 로 기록
+        - st 에 부가 정보(fallback 여부 등)를 넣으면 상태 조회에 그대로 노출된다
+        - 소요 시간은 app_stage_seconds{pipeline=kind} 에도 기록
+        """
+        with self._lock:
+            st = self.stages.setdefault(name, {"status": "pending", "elapsed_ms": None})
+            st["status"] = "running"
+        t0 = time.perf_counter()
+        try:
+            yield st
+        except BaseException:
+            st["status"] = "failed"
+            raise
+        else:
+            st["status"] = "done"
+        finally:
+            elapsed = time.perf_counter() - t0
+            st["elapsed_ms"] = round(elapsed * 1000, 1)
+            metrics.observe_stage(self.kind, name, elapsed)
+
+    def skip(self, *names: str) -> None:
+        """실행하지 않은 단계를 skipped 로 표시"""
+        with self._lock:
+            for name in names:
+                if self.stages.get(name, {}).get("status") == "pending":
+                    self.stages[name]["status"] = "skipped"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                **self.meta,
+            }
+
+
+@contextmanager
+def job_stage(job: Optional[Job], name: str):
+    """job 이 없을 때(직접 호출)도 같은 코드로 쓸 수 있도록 하는 래퍼"""
+    if job is None:
+        yield {}
+        return
+    with job.stage(name) as st:
+        yield st
+
+
+class JobManager:
+    """
+    동시 실행 슬롯(workers)이 고정된 비동기 작업 풀. 작업 상태는 메모리에 보관한다.
+    - 작업 함수는 코루틴이며 HTTP 는 await, CPU 단계는 스레드로 넘긴다
+      → 이벤트 루프는 submit 후 바로 반환되고 느린 파이프라인이 다른 요청을 막지 않는다
+    - 대기열이 max_pending 을 넘으면 QueueFull
+    - 작업 상태는 프로세스 로컬(uvicorn 워커별)이다
+    """
+
+    def __init__(self, workers: int, max_pending: int, ttl_sec: int, name: str = "job"):
+        self.workers = max(1, workers)
+        self.name = name
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._max_pending = max_pending
+        self._ttl_sec = ttl_sec
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        metrics.JOBS.labels(name, "queued").set_function(self.pending_count)
+        metrics.JOBS.labels(name, "running").set_function(self.running_count)
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = [
+            jid for jid, j in self._jobs.items()
+            if j.finished_at is not None and now - j.finished_at > self._ttl_sec
+        ]
+        for jid in expired:
+            self._jobs.pop(jid, None)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == "queued")
+
+    def running_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == "running")
+
+    def submit(self, job: Job, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Job:
+        """await fn(*args, job=job, **kwargs) 를 빈 슬롯이 생기면 실행 (이벤트 루프에서 호출)"""
+        with self._lock:
+            self._prune()
+            pending = sum(1 for j in self._jobs.values() if j.status == "queued")
+            if pending >= self._max_pending:
+                raise QueueFull(f"대기 작업이 너무 많습니다 ({pending})")
+            self._jobs[job.id] = job
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        job._task = asyncio.get_running_loop().create_task(self._run(job, fn, args, kwargs))
+        # 결과를 아무도 기다리지 않는 작업(/jobs 제출)의 예외는 job.error 로만 남긴다
+        job._task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return job
+
+    def complete(self, job: Job, result: Any) -> Job:
+        """
+        실행 없이 끝난 작업(예: 저장된 결과 재사용)을 등록한다.
+        슬롯/대기열을 거치지 않고, 상태 조회와 wait() 는 일반 작업과 같다.
+        """
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(result)
+        job._task = fut
+        job.result = result
+        job.status = "done"
+        job.finished_at = time.time()
+        return job
+
+    async def _run(self, job: Job, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: dict) -> Any:
+        async with self._slots:
+            job.status = "running"
+            try:
+                job.result = await fn(*args, job=job, **kwargs)
+                job.status = "done"
+                return job.result
+            except Exception as e:
+                job.error = str(e) or repr(e)
+                job.status = "failed"
+                raise
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job: Job) -> Any:
+        """작업 완료까지 대기 (실패 시 예외 전파, 클라이언트가 끊겨도 작업은 계속)"""
+        return await asyncio.shield(job._task)
+
+    async def shutdown(self) -> None:
+        tasks = [j._task for j in self._jobs.values() if j._task is not None and not j._task.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+outpaint_jobs = JobManager(OUTPAINT_WORKERS, OUTPAINT_MAX_PENDING, JOB_TTL_SEC, name="outpaint")
@@ -0,0 +1,138 @@
+# matting.py
+"""
+rembg 배경 제거 엔진.
+
+- 모델(REMBG_MODEL)은 start() 시 한 번만 로드하고, ONNX Runtime 세션을 CPU 코어 수에 맞춰 풀로 유지
+- 동시에 들어온 요청은 MATTING_BATCH_WAIT_MS 동안 모아 한 번에 추론(micro-batch)
+- 결과는 (RGBA 컷아웃, L 마스크) 튜플 → outpaint / ad-image 마스크 경로에서 공용으로 사용
+"""
+import os, queue, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+import metrics
+
+REMBG_MODEL           = os.getenv("REMBG_MODEL", "u2net")
+MATTING_POOL_SIZE     = int(os.getenv("MATTING_POOL_SIZE", "0")) or (os.cpu_count() or 1)
+MATTING_BATCH_MAX     = int(os.getenv("MATTING_BATCH_MAX", "4"))
+MATTING_BATCH_WAIT_MS = float(os.getenv("MATTING_BATCH_WAIT_MS", "10"))
+
+# normalize 파라미터가 같은 u2net 계열 세션만 배치 추론(나머지는 세션별 predict)
+_U2NET_FAMILY = {"U2netSession", "U2netpSession", "U2netHumanSegSession", "U2netCustomSession", "SiluetaSession"}
+_U2NET_MEAN = (0.485, 0.456, 0.406)
+_U2NET_STD  = (0.229, 0.224, 0.225)
+_U2NET_SIZE = (320, 320)
+
+
+def _cutout(img: Image.Image, mask: Image.Image) -> Image.Image:
+    empty = Image.new("RGBA", img.size, 0)
+    return Image.composite(img.convert("RGBA"), empty, mask)
+
+
+def _predict_batch(session, imgs: List[Image.Image]) -> List[Image.Image]:
+    """
+    u2net 계열은 입력 텐서를 쌓아서 한 번에 실행한다.
+    모델 입력의 배치 차원이 고정(1)이라 실패하면 그 세션은 이후 이미지별 predict 만 쓴다.
+    """
+    if len(imgs) > 1 and type(session).__name__ in _U2NET_FAMILY and getattr(session, "_batchable", True):
+        try:
+            import numpy as np
+            name = session.inner_session.get_inputs()[0].name
+            batch = np.concatenate(
+                [session.normalize(im, _U2NET_MEAN, _U2NET_STD, _U2NET_SIZE)[name] for im in imgs], axis=0
+            )
+            preds = session.inner_session.run(None, {name: batch})[0][:, 0, :, :]
+            masks = []
+            for im, pred in zip(imgs, preds):
+                ma, mi = float(np.max(pred)), float(np.min(pred))
+                pred = (pred - mi) / max(ma - mi, 1e-6)
+                mask = Image.fromarray((pred.clip(0, 1) * 255).astype("uint8"), mode="L")
+                masks.append(mask.resize(im.size, Image.Resampling.LANCZOS))
+            return masks
+        except Exception:
+            session._batchable = False
+            metrics.fallback("matting", "unbatched")
+    return [session.predict(im)[0] for im in imgs]
+
+
+class MattingEngine:
+    def __init__(self, model_name: str, pool_size: int, batch_max: int, batch_wait_ms: float):
+        self.model_name = model_name
+        self.pool_size = max(1, pool_size)
+        self.batch_max = max(1, batch_max)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000.0
+        self._sessions: "queue.Queue" = queue.Queue()
+        self._requests: "queue.Queue[Tuple[Image.Image, Future]]" = queue.Queue()
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def ready(self) -> bool:
+        return self._started
+
+    def start(self) -> None:
+        """세션 풀 생성 + 배치 디스패처 시작 (여러 번 호출해도 한 번만 수행)"""
+        with self._lock:
+            if self._started:
+                return
+            import onnxruntime as ort
+            from rembg import new_session
+
+            threads = max(1, (os.cpu_count() or 1) // self.pool_size)
+            for _ in range(self.pool_size):
+                opts = ort.SessionOptions()
+                opts.intra_op_num_threads = threads
+                opts.inter_op_num_threads = 1
+                self._sessions.put(new_session(self.model_name, sess_opts=opts))
+
+            self._runner = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="matting")
+            threading.Thread(target=self._dispatch, name="matting-dispatch", daemon=True).start()
+            self._started = True
+            print(f"✅ rembg 세션 준비 완료: model={self.model_name}, pool={self.pool_size}, threads/session={threads}")
+
+    def _dispatch(self) -> None:
+        while True:
+            first = self._requests.get()
+            batch = [first]
+            try:
+                while len(batch) < self.batch_max:
+                    batch.append(self._requests.get(timeout=self.batch_wait))
+            except queue.Empty:
+                pass
+            session = self._sessions.get()   # 빈 세션이 생길 때까지 대기
+            self._runner.submit(self._run_batch, session, batch)
+
+    def _run_batch(self, session, batch: List[Tuple[Image.Image, Future]]) -> None:
+        try:
+            imgs = [im for im, _ in batch]
+            masks = _predict_batch(session, imgs)
+            for (im, fut), mask in zip(batch, masks):
+                fut.set_result((_cutout(im, mask), mask))
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            self._sessions.put(session)
+
+    def remove(self, img: Image.Image, timeout: Optional[float] = None) -> Tuple[Image.Image, Image.Image]:
+        """
+        배경 제거 (블로킹, 스레드 안전)
+        반환: (RGBA 컷아웃, L 알파 마스크)
+        """
+        if not self._started:
+            self.start()
+        img = img.convert("RGB")
+        fut: Future = Future()
+        self._requests.put((img, fut))
+        return fut.result(timeout=timeout)
+
+
+engine = MattingEngine(REMBG_MODEL, MATTING_POOL_SIZE, MATTING_BATCH_MAX, MATTING_BATCH_WAIT_MS)
+
+
+def remove_background(img: Image.Image) -> Tuple[Image.Image, Image.Image]:
+    return engine.remove(img)
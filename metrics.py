@@ -0,0 +1,162 @@
+# metrics.py
+"""
+Prometheus 지표 + 요청별 trace id.
+
+지표 (GET /metrics)
+    app_stage_seconds{pipeline, stage}               파이프라인 단계별 소요 시간 (outpaint/promo/upload/ad_image/ad_image_compose)
+    app_upstream_errors_total{provider, kind}        업스트림 오류 (gemini/openai/openai_download, 상태코드|timeout|error)
+    app_fallbacks_total{pipeline, reason}            대체 경로 (예: 번역 실패 → 기본 프롬프트)
+    app_matting_pixels                               배경 제거에 넣은 이미지 픽셀 수 (축소 후)
+    app_upstream_retries_total{provider, kind}       업스트림 재시도 (상태코드|예외 이름)
+    app_upstream_rejected_total{provider}            슬롯 대기 시간 초과로 거절
+    app_upstream_coalesced_total{provider}           같은 요청이 진행 중이라 결과를 공유한 호출
+    app_upstream_hedged_total{provider}              지연이 p{N} 를 넘어 보낸 헤지 요청
+    app_upstream_hedge_wins_total{provider}          헤지 요청이 먼저 성공한 횟수
+    app_upstream_wait_seconds{provider, priority}    슬롯/토큰 대기 시간
+    app_upstream_active{provider} / app_upstream_waiting{provider}
+    app_admission_rejected_total{gate, reason}       입장 거절 (queue_full → 429 | timeout → 503 | too_large → 413)
+    app_admission_wait_seconds{gate}                 입장 대기 시간
+    app_admission_active{gate} / app_admission_waiting{gate}
+    app_jobs{manager, state}                         대기/실행 중 작업 수
+    app_http_requests_in_flight                      처리 중 HTTP 요청 수
+    app_http_request_seconds{route, method, status}  HTTP 요청 처리 시간
+    app_http_request_bytes{route} / app_http_response_bytes{route}
+
+trace id
+    요청마다 X-Request-ID(없으면 새로 발급)를 contextvar 에 두고 응답 헤더로 돌려준다.
+    log() 는 "[trace id] 메시지" 로 출력 → 같은 요청의 로그를 묶어 볼 수 있다.
+    asyncio 태스크(작업 큐)와 run_in_threadpool 은 contextvar 를 이어받으므로 백그라운드 단계도 같은 id.
+"""
+import contextvars, re, time, uuid
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+_BYTE_BUCKETS  = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+STAGE_SECONDS = Histogram(
+    "app_stage_seconds", "파이프라인 단계별 소요 시간", ["pipeline", "stage"], buckets=_STAGE_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter("app_upstream_errors_total", "업스트림 호출 오류", ["provider", "kind"])
+FALLBACKS = Counter("app_fallbacks_total", "대체 경로로 처리한 횟수", ["pipeline", "reason"])
+MATTING_PIXELS = Histogram(
+    "app_matting_pixels", "배경 제거 입력 픽셀 수", buckets=(1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6, 1.6e7),
+)
+UPSTREAM_RETRIES = Counter("app_upstream_retries_total", "업스트림 재시도", ["provider", "kind"])
+UPSTREAM_REJECTED = Counter("app_upstream_rejected_total", "업스트림 슬롯 대기 초과로 거절", ["provider"])
+UPSTREAM_COALESCED = Counter("app_upstream_coalesced_total", "진행 중인 같은 요청과 결과를 공유", ["provider"])
+UPSTREAM_HEDGED = Counter("app_upstream_hedged_total", "헤지(중복) 요청을 보낸 횟수", ["provider"])
+UPSTREAM_HEDGE_WINS = Counter("app_upstream_hedge_wins_total", "헤지 요청이 먼저 성공한 횟수", ["provider"])
+UPSTREAM_WAIT_SECONDS = Histogram(
+    "app_upstream_wait_seconds", "업스트림 슬롯/토큰 대기 시간", ["provider", "priority"], buckets=_STAGE_BUCKETS,
+)
+UPSTREAM_ACTIVE = Gauge("app_upstream_active", "실행 중인 업스트림 호출 수", ["provider"])
+UPSTREAM_WAITING = Gauge("app_upstream_waiting", "슬롯을 기다리는 업스트림 호출 수", ["provider"])
+ADMISSION_REJECTED = Counter("app_admission_rejected_total", "입장 제어로 거절한 요청", ["gate", "reason"])
+ADMISSION_WAIT_SECONDS = Histogram(
+    "app_admission_wait_seconds", "입장 대기 시간", ["gate"], buckets=_STAGE_BUCKETS,
+)
+ADMISSION_ACTIVE = Gauge("app_admission_active", "게이트를 통과해 처리 중인 요청 수", ["gate"])
+ADMISSION_WAITING = Gauge("app_admission_waiting", "게이트 앞에서 기다리는 요청 수", ["gate"])
+JOBS = Gauge("app_jobs", "작업 큐 상태별 작업 수", ["manager", "state"])
+HTTP_IN_FLIGHT = Gauge("app_http_requests_in_flight", "처리 중인 HTTP 요청 수")
+HTTP_SECONDS = Histogram(
+    "app_http_request_seconds", "HTTP 요청 처리 시간", ["route", "method", "status"], buckets=_STAGE_BUCKETS,
+)
+HTTP_REQUEST_BYTES = Histogram("app_http_request_bytes", "요청 본문 크기", ["route"], buckets=_BYTE_BUCKETS)
+HTTP_RESPONSE_BYTES = Histogram("app_http_response_bytes", "응답 본문 크기", ["route"], buckets=_BYTE_BUCKETS)
+
+_trace_id: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+_TRACE_PAT = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_IMG_PREFIX = re.compile(r"^img\d+\.")
+
+
+def trace_id() -> str:
+    return _trace_id.get()
+
+
+def log(msg: str) -> None:
+    print(f"[{_trace_id.get()}] {msg}")
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float) -> None:
+    # 배치 단계명(img0.matting …)은 이미지 번호를 떼어 라벨 수가 늘지 않게 한다
+    STAGE_SECONDS.labels(pipeline, _IMG_PREFIX.sub("", stage)).observe(seconds)
+
+
+def upstream_error(provider: str, exc: BaseException) -> None:
+    """예외 → kind(HTTP 상태코드 | timeout | error) 로 분류해 카운트"""
+    name = type(exc).__name__.lower()
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if "timeout" in name:
+        kind = "timeout"
+    elif status is not None:
+        kind = str(status)
+    else:
+        kind = "error"
+    UPSTREAM_ERRORS.labels(provider, kind).inc()
+
+
+def fallback(pipeline: str, reason: str) -> None:
+    FALLBACKS.labels(pipeline, reason).inc()
+
+
+def render() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    순수 ASGI 미들웨어 (스트리밍/SSE 응답을 버퍼링하지 않음).
+    trace id 설정, 처리 중 요청 수, 처리 시간, 요청/응답 바이트를 기록한다.
+    라우트 라벨은 경로 템플릿(/v1/outpaint/jobs/{job_id})이라 라벨 수가 고정된다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(b"x-request-id", b"").decode("latin-1")
+        tid = incoming if _TRACE_PAT.match(incoming) else uuid.uuid4().hex[:16]
+        token = _trace_id.set(tid)
+        try:
+            req_bytes = int(headers.get(b"content-length", b"0") or 0)
+        except ValueError:
+            req_bytes = 0
+
+        state = {"status": 500, "bytes": 0}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", tid.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = _route_label(scope)
+            HTTP_SECONDS.labels(route, scope.get("method", ""), str(state["status"])).observe(time.perf_counter() - t0)
+            HTTP_REQUEST_BYTES.labels(route).observe(req_bytes)
+            HTTP_RESPONSE_BYTES.labels(route).observe(state["bytes"])
+            _trace_id.reset(token)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path: Optional[str] = getattr(route, "path", None)
+    return path or "unmatched"
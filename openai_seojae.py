@@ -1,23 +1,74 @@
 # openai_seojae.py
-import os, re
+import asyncio, base64, os, re
 from io import BytesIO
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
-from PIL import Image
-from rembg import remove
-import requests
+from PIL import Image, ImageFile
 
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Response
-from openai import OpenAI
-import google.generativeai as genai
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+import admission
+import blob_store
+import gemini
+import http_client
+import metrics
+import upstream
+from metrics import log
+from jobs import Job, QueueFull, job_stage, outpaint_jobs
+from matting import remove_background
+import group_index
+from cache import make_key
+from deadline import Deadline
+from pipeline_cache import image_key, matting_cache, normalize_prompt, prompt_cache, prompt_key
+import pipeline_cache
+from renditions import preferred_relpath, write_renditions
+from timing import stages_header
+from upload_decode import UploadTooLarge, decode_image, read_upload
 
 load_dotenv(".env")
 
 try:
-    openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
+    os.environ["GEMINI_API_KEY"]
 except KeyError as e:
     raise SystemExit(f"{e.args[0]}를 .env 파일에서 찾을 수 없습니다. 파일을 확인해주세요.")
 
+TRANSLATE_MODEL = "gemini-1.5-flash-latest"
+DEFAULT_PROMPT_EN = "Minimalist food photo, no other objects, plain background."
+
+# DALL-E 결과 수신 방식: b64_json(응답 본문에 이미지, 추가 요청 없음) | url(CDN 에서 다시 받기)
+OUTPAINT_RESPONSE_FORMAT    = os.getenv("OUTPAINT_RESPONSE_FORMAT", "b64_json")
+OUTPAINT_DOWNLOAD_TIMEOUT   = float(os.getenv("OUTPAINT_DOWNLOAD_TIMEOUT", "30"))
+OUTPAINT_DOWNLOAD_MAX_BYTES = int(os.getenv("OUTPAINT_DOWNLOAD_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# 요청(작업) 하나의 시간 예산. 워커가 작업을 꺼낸 시점부터 잰다 (대기열 대기는 입장 제어가 제한)
+# 번역은 예산의 OUTPAINT_TRANSLATE_SHARE 몫을 넘기면 기다리지 않고 기본 프롬프트로 진행
+OUTPAINT_DEADLINE_SEC    = float(os.getenv("OUTPAINT_DEADLINE_SEC", "120"))
+OUTPAINT_TRANSLATE_SHARE = float(os.getenv("OUTPAINT_TRANSLATE_SHARE", "0.1"))
+
+# 컷아웃은 캔버스 긴 변의 PLACEMENT_SCALE 크기로 놓인다. 배경 제거는 그 크기 × 여유(MARGIN) 로 줄인 뒤 실행
+PLACEMENT_SCALE         = 0.6
+OUTPAINT_MATTING_MARGIN = max(1.0, float(os.getenv("OUTPAINT_MATTING_MARGIN", "1.25")))
+
+_openai_client = None
+
+def _openai():
+    """
+    공유 http_client 커넥션 풀을 쓰는 OpenAI 클라이언트 (OPENAI_BASE_URL 로 스텁 지정 가능).
+    openai SDK 는 import 가 무거워 처음 필요할 때(또는 워밍업에서) 불러온다.
+    """
+    global _openai_client
+    client = http_client.get_client()
+    if _openai_client is None or _openai_client._client is not client:
+        from openai import AsyncOpenAI
+        # 재시도는 upstream 스케줄러가 한다 (SDK 자체 재시도와 겹치지 않게 0)
+        _openai_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY, http_client=client, timeout=http_client.DEFAULT_TIMEOUT, max_retries=0,
+        )
+    return _openai_client
+
 # 루트 저장 경로(마운트): /home/ec2-user/BE/img
 IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
 FOOD_DIR   = os.path.join(IMAGE_ROOT, "food")   # 음식 관련 저장소
@@ -32,86 +83,511 @@ def _clamp_prompt(p: str, maxlen: int = 950) -> str:
 
 def _next_food_index() -> int:
     """
-    FOOD_DIR 안의 파일 중 ^(\d+)_food(_AI)?\.jpg 의 최대 번호 + 1
+    food 최대 번호 + 1 (group_index 카운터로 원자적 할당, 디렉터리 스캔 없음)
+    SQLite 쓰기 트랜잭션이라 이벤트 루프가 아니라 run_in_threadpool 로 호출한다
     """
-    _ensure_dir(FOOD_DIR)
-    pat = re.compile(r"^(\d+)_food(_AI)?\.jpg$", re.IGNORECASE)
-    max_n = 0
-    for name in os.listdir(FOOD_DIR):
-        m = pat.match(name)
-        if m:
-            max_n = max(max_n, int(m.group(1)))
-    return max_n + 1
-
-def outpaint_image(input_path, user_prompt_kr, output_path, target_size=1024, target_ratio=1.0):
-    temp_canvas_path = "temp_canvas_for_api.png"
-    try:
-        img = Image.open(input_path)
-    except Exception as e:
-        print(f"❌ 입력 이미지 오류: {e}")
-        return
+    return group_index.allocate_food_group()
+
+class OutpaintError(Exception):
+    """파이프라인 단계 실패 (stage: translate | matting | generate | download | save | batch)"""
 
-    prompt_instruction = f"""
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"[{stage}] {message}")
+        self.stage = stage
+
+_PROMPT_INSTRUCTION = """
     You are a professional food photographer and a DALL-E prompt expert.
     Translate the Korean request into a vivid English prompt for an image outpainting task.
     VERY IMPORTANT: The user wants a minimalist scene. Your prompt MUST explicitly command to exclude other objects. Use strong negative keywords like "Minimalist, clean, no other objects, no cutlery, no spoons, no forks, no clutter, plain background."
     Crucially, the final English prompt must be under 1000 characters.
     Korean Request: "{user_prompt_kr}"
     """
-    try:
-        gemini_model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        resp = gemini_model.generate_content(prompt_instruction)
-        generated_prompt_en = (resp.text or "").strip() or "Minimalist food photo, no other objects, plain background."
-    except Exception as e:
-        print(f"⚠️ Gemini 오류: {e}")
-        generated_prompt_en = "Minimalist food photo, no other objects, plain background."
-    generated_prompt_en = _clamp_prompt(generated_prompt_en)
+
+async def _translate_prompt(user_prompt_kr: str, job: Optional[Job] = None, stage: str = "translate",
+                            deadline: Optional[Deadline] = None) -> str:
+    """한국어 요청 → DALL-E 영어 프롬프트 (캐시, 실패하거나 예산 몫을 넘기면 기본 프롬프트)"""
+    with job_stage(job, stage) as st:
+        p_key = prompt_key(user_prompt_kr, TRANSLATE_MODEL)
+        generated_prompt_en = await prompt_cache.aget(p_key)
+        st["cache"] = "hit" if generated_prompt_en is not None else "miss"
+        if generated_prompt_en is None:
+            prompt_instruction = _PROMPT_INSTRUCTION.format(user_prompt_kr=user_prompt_kr)
+            call = gemini.generate_content(
+                [{"text": prompt_instruction}], model=TRANSLATE_MODEL, priority=upstream.BATCH,
+            )
+            try:
+                if deadline is not None:
+                    st["timeout_s"] = round(deadline.share(OUTPAINT_TRANSLATE_SHARE), 2)
+                    resp = await deadline.run(call, st["timeout_s"])
+                else:
+                    resp = await call
+                generated_prompt_en = _clamp_prompt(gemini.response_text(resp))
+                if generated_prompt_en:
+                    await prompt_cache.aset(p_key, generated_prompt_en)
+                else:
+                    generated_prompt_en = DEFAULT_PROMPT_EN
+            except asyncio.TimeoutError:
+                log(f"⏱️ 번역이 예산 몫({st.get('timeout_s')}s)을 넘김 → 기본 프롬프트 사용")
+                generated_prompt_en = DEFAULT_PROMPT_EN
+                st["fallback"] = "deadline"
+                metrics.fallback("outpaint", "translate_deadline")
+            except Exception as e:
+                log(f"⚠️ Gemini 오류: {e}")
+                generated_prompt_en = DEFAULT_PROMPT_EN
+                st["fallback"] = True
+                metrics.fallback("outpaint", "default_prompt")
+    return generated_prompt_en
+
+def _matting_edge(target_size: int) -> int:
+    """배경 제거 입력의 긴 변 = 캔버스에 놓일 크기 × 여유"""
+    return max(64, int(target_size * PLACEMENT_SCALE * OUTPAINT_MATTING_MARGIN))
+
+def _fit_edge(img: Image.Image, edge: int) -> Image.Image:
+    """긴 변이 edge 를 넘을 때만 축소한 새 이미지 (원본은 그대로, 확대하지 않음)"""
+    w, h = img.size
+    if max(w, h) <= edge:
+        return img
+    s = edge / max(w, h)
+    return img.resize((max(1, round(w * s)), max(1, round(h * s))), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+def _remove_at(img: Image.Image, edge: int) -> Image.Image:
+    # 마스크는 모델 해상도(u2net 320px)에서 이 축소본 크기로 한 번만 올라가고,
+    # 캔버스 배치는 다시 줄이기만 하므로 원본 해상도로의 업샘플/경계 보정 단계가 필요 없다
+    img_no_bg, _ = remove_background(_fit_edge(img, edge))
+    return img_no_bg
+
+async def _matte(img: Image.Image, img_key: Optional[str], job: Optional[Job] = None, stage: str = "matting",
+                 target_size: int = 1024) -> Image.Image:
+    """
+    배경 제거 (img_key 가 있으면 캐시). 반환 이미지는 호출자 소유의 사본.
+    입력은 배치 크기(+여유)로 먼저 줄인다 → 12MP 사진도 1MP 미만에서 분할/합성.
+    """
+    edge = _matting_edge(target_size)
+    with job_stage(job, stage) as st:
+        st["pixels_in"] = img.width * img.height
+        key = make_key(img_key, edge) if img_key else None
+        cached = await matting_cache.aget(key) if key else None
+        st["cache"] = "hit" if cached is not None else "miss"
+        if cached is not None:
+            st["pixels_matted"] = 0
+            return cached.copy()
+        try:
+            img_no_bg = await run_in_threadpool(_remove_at, img, edge)
+        except Exception as e:
+            log(f"⚠️ 배경 제거 오류: {e}")
+            raise OutpaintError("matting", f"배경 제거 오류: {e}")
+        st["pixels_matted"] = img_no_bg.width * img_no_bg.height
+        metrics.MATTING_PIXELS.observe(st["pixels_matted"])
+        if key:
+            await matting_cache.aset(key, img_no_bg.copy())
+        return img_no_bg
+
+async def _generate(img_no_bg: Image.Image, generated_prompt_en: str, target_size: int,
+                    job: Optional[Job] = None, prefix: str = "", deadline: Optional[Deadline] = None) -> Image.Image:
+    """
+    컷아웃을 정사각 캔버스 중앙에 놓고 DALL-E edit 로 1회 생성.
+    단계는 {prefix}generate(캔버스 + edit 호출) / {prefix}download(결과 이미지 받기 + 디코딩)
+    b64_json 이면 download 는 응답 본문 디코딩만, url 이면 스트리밍 다운로드 + 증분 디코딩.
+    deadline 이 있으면 edit 호출과 다운로드는 남은 예산 안에서만 기다린다.
+    """
+    def _build_canvas() -> bytes:
+        # 임시 파일 없이 메모리에서 PNG 인코딩 → 그대로 API 로 전달
+        scale = PLACEMENT_SCALE
+        img_no_bg.thumbnail((int(target_size*scale), int(target_size*scale)), Image.Resampling.LANCZOS)
+        canvas = Image.new("RGBA", (target_size, target_size), (0,0,0,0))
+        iw, ih = img_no_bg.size
+        canvas.paste(img_no_bg, ((target_size - iw)//2, (target_size - ih)//2), img_no_bg)
+        buf = BytesIO()
+        canvas.save(buf, "PNG")
+        return buf.getvalue()
+
+    with job_stage(job, f"{prefix}generate"):
+        try:
+            canvas_png = await run_in_threadpool(_build_canvas)
+            size = f"{target_size}x{target_size}"
+            call = upstream.call(
+                "openai",
+                lambda: _openai().images.edit(
+                    model="dall-e-2",
+                    image=("canvas.png", canvas_png, "image/png"),
+                    prompt=generated_prompt_en,
+                    size=size,
+                    n=1,
+                    response_format=OUTPAINT_RESPONSE_FORMAT,
+                ),
+                priority=upstream.BATCH,
+                key=make_key("openai_edit", canvas_png, generated_prompt_en, size),
+            )
+            r = await (deadline.run(call) if deadline is not None else call)
+            result = r.data[0]
+        except asyncio.TimeoutError as e:
+            budget = f"{deadline.budget:g}s" if deadline is not None else "-"
+            log(f"⏱️ OpenAI 호출이 시간 예산({budget}) 안에 끝나지 않음")
+            metrics.upstream_error("openai", e)
+            raise OutpaintError("generate", f"시간 예산({budget}) 초과")
+        except Exception as e:
+            log(f"⚠️ OpenAI API 오류: {e}")
+            metrics.upstream_error("openai", e)
+            raise OutpaintError("generate", f"OpenAI API 오류: {e}")
+
+    with job_stage(job, f"{prefix}download") as st:
+        try:
+            if getattr(result, "b64_json", None):
+                st["source"] = "b64_json"
+                gen_img, st["bytes"] = await run_in_threadpool(_decode_b64_image, result.b64_json)
+            elif getattr(result, "url", None):
+                st["source"] = "url"
+                timeout = deadline.timeout(OUTPAINT_DOWNLOAD_TIMEOUT) if deadline is not None else OUTPAINT_DOWNLOAD_TIMEOUT
+                gen_img, st["bytes"] = await _download_image(result.url, timeout)
+            else:
+                raise ValueError("응답에 이미지(b64_json/url)가 없습니다.")
+        except Exception as e:
+            log(f"⚠️ 결과 이미지 다운로드 오류: {e}")
+            metrics.upstream_error("openai_download", e)
+            raise OutpaintError("download", f"결과 이미지 다운로드 오류: {e}")
+    return gen_img
+
+def _decode_b64_image(b64: str) -> Tuple[Image.Image, int]:
+    """응답 본문의 base64 PNG → 이미지 (네트워크 왕복 없음)"""
+    raw = base64.b64decode(b64)
+    img = Image.open(BytesIO(raw))
+    img.load()
+    return img, len(raw)
+
+async def _download_image(url: str, timeout: float = OUTPAINT_DOWNLOAD_TIMEOUT) -> Tuple[Image.Image, int]:
+    """
+    결과 URL 을 스트리밍으로 받으며 조각마다 증분 디코더(ImageFile.Parser)에 넣는다.
+    전체 본문 버퍼를 따로 만들지 않고, 시간(OUTPAINT_DOWNLOAD_TIMEOUT)/크기(OUTPAINT_DOWNLOAD_MAX_BYTES) 상한을 둔다.
+    """
+    async def _fetch() -> Tuple[Image.Image, int]:
+        parser = ImageFile.Parser()
+        total = 0
+        async with http_client.get_client().stream("GET", url) as resp:
+            resp.raise_for_status()
+            declared = int(resp.headers.get("content-length") or 0)
+            if declared > OUTPAINT_DOWNLOAD_MAX_BYTES:
+                raise ValueError(f"결과 이미지가 너무 큽니다: {declared} bytes")
+            async for chunk in resp.aiter_bytes(256 * 1024):
+                total += len(chunk)
+                if total > OUTPAINT_DOWNLOAD_MAX_BYTES:
+                    raise ValueError(f"결과 이미지가 너무 큽니다: > {OUTPAINT_DOWNLOAD_MAX_BYTES} bytes")
+                parser.feed(chunk)
+        return parser.close(), total
+
+    return await asyncio.wait_for(_fetch(), timeout)
+
+def _crop_to_ratio(gen_img: Image.Image, target_size: int, target_ratio: float) -> Image.Image:
+    """정사각 생성 결과에서 중앙 기준으로 target_ratio(w/h) 영역을 잘라낸다"""
+    if abs(target_ratio - 1.0) <= 1e-6:
+        return gen_img
+    if target_ratio > 1:
+        w, h = (target_size, int(target_size/target_ratio))
+    else:
+        w, h = (int(target_size*target_ratio), target_size)
+    left, top = (target_size - w)//2, (target_size - h)//2
+    return gen_img.crop((left, top, left+w, top+h))
+
+def _save_crops(gen_img: Image.Image, target_size: int, outputs: List[Tuple[float, str, Optional[str]]]) -> None:
+    """outputs: (비율, 저장 경로, 결과 인덱스 키 | None)"""
+    for target_ratio, output_path, result_key in outputs:
+        final_img = _crop_to_ratio(gen_img, target_size, target_ratio).convert("RGB")
+        final_img.save(output_path, "JPEG", quality=95)
+        directory, filename = os.path.dirname(output_path), os.path.basename(output_path)
+        # 클라이언트에 내려줄 web/thumb 파생본 (promo 응답 URL 은 web 을 가리킨다)
+        write_renditions(final_img, directory, filename)
+        if result_key:
+            blob_store.remember(result_key, directory, filename)
+
+async def outpaint_image(img: Image.Image, user_prompt_kr, output_path, target_size=1024, target_ratio=1.0,
+                         job: Optional[Job] = None, img_key: Optional[str] = None,
+                         result_key: Optional[str] = None):
+    """
+    디코딩된 입력 이미지 → 배경 제거 → 캔버스(PNG, 메모리) → DALL-E edit → 크롭 → output_path 저장.
+    img_key 는 배경 제거 캐시 키(업로드 원본 바이트 해시). 없으면 캐시를 쓰지 않는다.
+    result_key 가 있으면 저장 결과를 blob 저장소에 편입해 같은 요청이 다시 오면 재사용한다.
+    """
+    deadline = Deadline(OUTPAINT_DEADLINE_SEC)
+    generated_prompt_en = await _translate_prompt(user_prompt_kr, job, deadline=deadline)
+    if _used_default_prompt(job):
+        result_key = None   # 기본 프롬프트로 만든 결과는 이 요청 문구의 결과로 기록하지 않는다
+    img_no_bg = await _matte(img, img_key, job, target_size=target_size)
+    gen_img = await _generate(img_no_bg, generated_prompt_en, target_size, job, deadline=deadline)
+
+    with job_stage(job, "save"):
+        await run_in_threadpool(_save_crops, gen_img, target_size, [(target_ratio, output_path, result_key)])
+    log(f"✅ 최종 저장 → {output_path}")
+    return output_path
+
+async def outpaint_batch(items: List[dict], user_prompt_kr: str, ratios: List[Tuple[str, float]],
+                         target_size: int = 1024, job: Optional[Job] = None) -> List[dict]:
+    """
+    여러 이미지 × 여러 비율.
+    - 프롬프트 번역은 배치당 1회, 배경 제거/생성은 이미지당 1회
+    - 한 번 생성한 정사각 결과에서 요청한 비율을 모두 크롭해 저장
+    - 이미지별로 모든 비율의 결과가 저장소에 있으면 생성 없이 새 이름으로 링크만 (번역도 필요할 때만)
+    items: [{"group": N, "img": Image, "img_key": str, "outputs": [(ratio_label, path, result_key), ...]}, ...]
+    """
+    ratio_of = dict(ratios)
+
+    with job_stage(job, "dedup") as st:
+        reused = await asyncio.gather(*[run_in_threadpool(_link_results, it["outputs"]) for it in items])
+        st["hits"] = sum(1 for r in reused if r)
+
+    generated_prompt_en = None
+    if not all(reused):
+        generated_prompt_en = await _translate_prompt(user_prompt_kr, job, deadline=Deadline(OUTPAINT_DEADLINE_SEC))
+    elif job is not None:
+        job.skip("translate")
+    remember = not _used_default_prompt(job)
+
+    async def _run_one(i: int, item: dict) -> dict:
+        if reused[i]:
+            if job is not None:
+                job.skip(*(f"img{i}.{s}" for s in ("matting", "generate", "download", "save")))
+            return await run_in_threadpool(_record_batch_item, item, deduplicated=True)
+        # 이미지마다 단건과 같은 예산 (동시에 돌지만 openai 슬롯을 기다리는 시간이 이미지마다 다르다)
+        deadline = Deadline(OUTPAINT_DEADLINE_SEC)
+        img_no_bg = await _matte(item["img"], item["img_key"], job, stage=f"img{i}.matting", target_size=target_size)
+        gen_img = await _generate(img_no_bg, generated_prompt_en, target_size, job, prefix=f"img{i}.", deadline=deadline)
+        with job_stage(job, f"img{i}.save"):
+            try:
+                await run_in_threadpool(
+                    _save_crops, gen_img, target_size,
+                    [(ratio_of[label], path, key if remember else None) for label, path, key in item["outputs"]],
+                )
+                return await run_in_threadpool(_record_batch_item, item, deduplicated=False)
+            except Exception as e:
+                raise OutpaintError("save", f"결과 저장 오류: {e}")
+
+    async def _one(i: int, item: dict) -> dict:
+        """이미지 하나의 실패는 그 이미지의 error 로만 남기고 배치는 계속"""
+        try:
+            return await _run_one(i, item)
+        except OutpaintError as e:
+            return {"group": item["group"], "error": str(e), "files": []}
+        except Exception as e:
+            log(f"⚠️ 배치 이미지 {i} 처리 오류: {e!r}")
+            return {"group": item["group"], "error": f"[batch] 처리 오류: {e}", "files": []}
+
+    results = await asyncio.gather(*[_one(i, it) for i, it in enumerate(items)])
+    if all(r["error"] for r in results):
+        raise OutpaintError("batch", "; ".join(r["error"] for r in results))
+    return results
+
+def _link_results(outputs: List[tuple]) -> bool:
+    """(label, path, result_key) 가 모두 저장소에 있으면 전부 링크하고 True (하나라도 없으면 아무것도 안 함)"""
+    blobs = [group_index.get_blobs(key) if blob_store.BLOB_DEDUP else None for _, _, key in outputs]
+    if not all(blobs):
+        return False
+    for (_, path, _), b in zip(outputs, blobs):
+        if blob_store.link_renditions(b, os.path.dirname(path), os.path.basename(path)) is None:
+            return False
+    return True
+
+def _record_batch_item(item: dict, deduplicated: bool) -> dict:
+    files = []
+    for label, path, _ in item["outputs"]:
+        filename = os.path.basename(path)
+        kind = "food_ai" if filename.endswith("_AI.jpg") else "food_ai_variant"
+        group_index.record_file(item["group"], kind, filename)
+        files.append({"ratio": label, "filename": filename, "path": path})
+    log(f"✅ 배치 저장{'(재사용)' if deduplicated else ''} → group {item['group']}: {[f['filename'] for f in files]}")
+    return {"group": item["group"], "error": None, "files": files, "deduplicated": deduplicated}
+
+def _used_default_prompt(job: Optional[Job]) -> bool:
+    return job is not None and bool(job.stages.get("translate", {}).get("fallback"))
+
+def _original_key(digest: str) -> str:
+    """업로드 원본 내용 → N_food.jpg 저장본"""
+    return make_key("food_original", digest, OUTPAINT_INPUT_MAX_EDGE)
+
+def _result_key(digest: str, user_prompt_kr: str, target_ratio: float, target_size: int) -> str:
+    """(입력 내용, 정규화한 요청 문구, 비율, 크기) → N_food_AI*.jpg 결과"""
+    return make_key("outpaint", digest, normalize_prompt(user_prompt_kr), f"{target_ratio:.4f}", target_size)
+
+OUTPAINT_STAGES = ["dedup", "translate", "matting", "generate", "download", "save"]
+
+def _build_public_url(request: Request, subdir: str, filename: str) -> str:
+    scheme = request.headers.get("X-Forwarded-Proto", request.url.scheme)
+    host   = request.headers.get("X-Forwarded-Host", request.headers.get("host", request.url.netloc))
+    return f"{scheme}://{host}/images/{subdir}/{filename}"
+
+# 업로드 입력은 이 해상도(긴 변)로 줄여서 디코딩 (캔버스에는 target_size*0.6 로 들어간다)
+OUTPAINT_INPUT_MAX_EDGE = int(os.getenv("OUTPAINT_INPUT_MAX_EDGE", "2048"))
+
+# 배치 한 번에 받을 수 있는 이미지/비율 수
+OUTPAINT_BATCH_MAX_IMAGES = int(os.getenv("OUTPAINT_BATCH_MAX_IMAGES", "8"))
+OUTPAINT_BATCH_MAX_RATIOS = int(os.getenv("OUTPAINT_BATCH_MAX_RATIOS", "6"))
+
+_RATIO_PAT = re.compile(r"^\s*(\d{1,3})\s*:\s*(\d{1,3})\s*$")
+
+def _parse_ratio(ratio: str) -> float:
+    """"4:5" → 0.8. 잘못된 비율은 업로드를 디코딩하기 전에 400 으로 거절"""
+    m = _RATIO_PAT.match(ratio or "")
+    if not m or int(m.group(1)) == 0 or int(m.group(2)) == 0:
+        raise HTTPException(status_code=400, detail=f"잘못된 비율: {ratio!r} (예: 1:1, 4:5, 16:9)")
+    return int(m.group(1)) / int(m.group(2))
+
+def _parse_ratio_list(values: List[str]) -> List[Tuple[str, float]]:
+    """
+    ["1:1", "4:5,16:9"] → [("1:1", 1.0), ("4:5", 0.8), ("16:9", 1.77..)]
+    배치는 잘못된 비율을 1:1 로 바꾸지 않고 400 으로 거절한다. 중복은 제거(순서 유지).
+    """
+    out: List[Tuple[str, float]] = []
+    for raw in values:
+        for token in raw.split(","):
+            if not token.strip():
+                continue
+            m = _RATIO_PAT.match(token)
+            if not m or int(m.group(1)) == 0 or int(m.group(2)) == 0:
+                raise HTTPException(status_code=400, detail=f"잘못된 비율: {token.strip()!r} (예: 1:1, 4:5, 16:9)")
+            label = f"{int(m.group(1))}:{int(m.group(2))}"
+            if label not in (l for l, _ in out):
+                out.append((label, int(m.group(1)) / int(m.group(2))))
+    if not out:
+        raise HTTPException(status_code=400, detail="비율을 하나 이상 지정해야 합니다.")
+    if len(out) > OUTPAINT_BATCH_MAX_RATIOS:
+        raise HTTPException(status_code=400, detail=f"비율은 최대 {OUTPAINT_BATCH_MAX_RATIOS}개까지 지정할 수 있습니다.")
+    return out
+
+def _batch_output_name(base: str, label: str, first: bool) -> str:
+    """첫 비율은 기존 규칙(N_food_AI.jpg), 나머지는 N_food_AI_{w}x{h}.jpg"""
+    if first:
+        return f"{base}_AI.jpg"
+    w, h = label.split(":")
+    return f"{base}_AI_{w}x{h}.jpg"
+
+async def _read_and_decode(uf: UploadFile) -> Tuple[Image.Image, str, str]:
+    """
+    업로드 → (긴 변 OUTPAINT_INPUT_MAX_EDGE 이하 RGB 이미지, 배경 제거 캐시 키, 내용 해시).
+    바이트/픽셀 상한 초과는 413, 이미지가 아니면 400. 원본 바이트는 키 계산 후 바로 놓는다.
+    sha256 은 디코딩과 같은 스레드풀 작업에서 한 번만 계산하고, 배경 제거 캐시 키도 그 해시에서 만든다.
+    """
+    def _decode_and_digest(data: bytes) -> Tuple[Image.Image, str]:
+        return decode_image(data, OUTPAINT_INPUT_MAX_EDGE), blob_store.digest_bytes(data)
 
     try:
-        img_no_bg = remove(img)
+        data = await read_upload(uf)
+        img, digest = await run_in_threadpool(_decode_and_digest, data)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        print(f"⚠️ 배경 제거 오류: {e}")
+        raise HTTPException(status_code=400, detail=f"업로드 저장 실패({uf.filename}): {e}")
+    del data
+    return img, image_key(digest), digest
+
+_background_tasks: set = set()
+
+def _store_original(img: Image.Image, input_path: str, digest: str) -> None:
+    """같은 원본을 전에 저장했으면 그 blob 을 링크, 아니면 q95 로 저장 후 저장소에 편입"""
+    key = _original_key(digest)
+    directory, filename = os.path.dirname(input_path), os.path.basename(input_path)
+    if blob_store.lookup_and_link(key, directory, filename) is not None:
         return
+    img.save(input_path, "JPEG", quality=95)
+    blob_store.remember(key, directory, filename)
+
+def _persist_original(n: int, img: Image.Image, input_path: str, digest: str) -> None:
+    """
+    업로드 원본을 N_food.jpg 로 저장 (파이프라인과 별개로 백그라운드에서)
+    """
+    async def _save():
+        try:
+            await run_in_threadpool(_store_original, img, input_path, digest)
+            await run_in_threadpool(group_index.record_file, n, "food", os.path.basename(input_path))
+        except Exception as e:
+            log(f"⚠️ 원본 저장 실패: {input_path}: {e}")
+
+    task = asyncio.get_running_loop().create_task(_save())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _submit_outpaint(input_image: UploadFile, user_prompt: str, ratio: str) -> Job:
+    """
+    업로드를 한 번만 디코딩해 메모리 이미지로 파이프라인에 넘긴다.
+    원본 N_food.jpg 저장은 파이프라인과 병행(크리티컬 패스 밖).
+    """
+    target_ratio = _parse_ratio(ratio)
+    _ensure_dir(FOOD_DIR)
+
+    img, img_key, digest = await _read_and_decode(input_image)
+
+    n = await run_in_threadpool(_next_food_index)
+    base = f"{n}_food"
+    input_path  = os.path.join(FOOD_DIR, f"{base}.jpg")
+    output_path = os.path.join(FOOD_DIR, f"{base}_AI.jpg")
+
+    _persist_original(n, img, input_path, digest)
 
-    scale = 0.6
-    img_no_bg.thumbnail((int(target_size*scale), int(target_size*scale)), Image.Resampling.LANCZOS)
-    canvas = Image.new("RGBA", (target_size, target_size), (0,0,0,0))
-    iw, ih = img_no_bg.size
-    canvas.paste(img_no_bg, ((target_size - iw)//2, (target_size - ih)//2), img_no_bg)
+    result_key = _result_key(digest, user_prompt, target_ratio, 1024)
+    job = Job("outpaint", OUTPAINT_STAGES, meta={"group": n, "filename": f"{base}_AI.jpg"})
+
+    # 같은 사진 + 같은 요청 + 같은 비율이면 저장된 결과를 새 이름으로 링크하고 바로 완료
+    with job.stage("dedup") as st:
+        linked = await run_in_threadpool(blob_store.lookup_and_link, result_key, FOOD_DIR, f"{base}_AI.jpg")
+        st["hit"] = linked is not None
+    if linked is not None:
+        await run_in_threadpool(group_index.record_file, n, "food_ai", f"{base}_AI.jpg")
+        job.meta["deduplicated"] = True
+        job.skip(*OUTPAINT_STAGES)
+        log(f"✅ 저장된 결과 재사용 → {output_path}")
+        return outpaint_jobs.complete(job, output_path)
 
     try:
-        canvas.save(temp_canvas_path, "PNG")
-        with open(temp_canvas_path, "rb") as fp:
-            r = openai_client.images.edit(
-                model="dall-e-2",
-                image=fp,
-                prompt=generated_prompt_en,
-                size=f"{target_size}x{target_size}",
-                n=1,
+        return outpaint_jobs.submit(
+            job, _run_outpaint, n, img, user_prompt, output_path,
+            target_size=1024, target_ratio=target_ratio, img_key=img_key, result_key=result_key,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _run_outpaint(n: int, img: Image.Image, user_prompt: str, output_path: str, job: Job, **kwargs) -> str:
+    out = await outpaint_image(img, user_prompt, output_path, job=job, **kwargs)
+    await run_in_threadpool(group_index.record_file, n, "food_ai", os.path.basename(out))
+    return out
+
+async def _submit_outpaint_batch(input_images: List[UploadFile], user_prompt: str,
+                                 ratios: List[Tuple[str, float]]) -> Job:
+    """
+    이미지마다 새 그룹 번호를 받아 N_food.jpg(원본) 를 백그라운드 저장하고,
+    전체를 하나의 배치 작업으로 등록한다.
+    """
+    _ensure_dir(FOOD_DIR)
+
+    decoded = [await _read_and_decode(f) for f in input_images]
+
+    items = []
+    for img, key, digest in decoded:
+        n = await run_in_threadpool(_next_food_index)
+        base = f"{n}_food"
+        _persist_original(n, img, os.path.join(FOOD_DIR, f"{base}.jpg"), digest)
+        outputs = [
+            (
+                label,
+                os.path.join(FOOD_DIR, _batch_output_name(base, label, i == 0)),
+                _result_key(digest, user_prompt, r, 1024),
             )
-        url = r.data[0].url
-        gen_img = Image.open(BytesIO(requests.get(url).content))
-    except Exception as e:
-        print(f"⚠️ OpenAI API 오류: {e}")
-        return
-    finally:
-        if os.path.exists(temp_canvas_path):
-            os.remove(temp_canvas_path)
-
-    final_img = gen_img
-    if abs(target_ratio - 1.0) > 1e-6:
-        if target_ratio > 1:
-            w, h = (target_size, int(target_size/target_ratio))
-        else:
-            w, h = (int(target_size*target_ratio), target_size)
-        left, top = (target_size - w)//2, (target_size - h)//2
-        final_img = gen_img.crop((left, top, left+w, top+h))
-
-    final_img.convert("RGB").save(output_path, "JPEG", quality=95)
-    print(f"✅ 최종 저장 → {output_path}")
+            for i, (label, r) in enumerate(ratios)
+        ]
+        items.append({"group": n, "img": img, "img_key": key, "outputs": outputs})
+
+    stages = ["dedup", "translate"] + [f"img{i}.{s}" for i in range(len(items)) for s in ("matting", "generate", "download", "save")]
+    job = Job("outpaint_batch", stages, meta={
+        "groups": [it["group"] for it in items],
+        "ratios": [label for label, _ in ratios],
+    })
+    try:
+        return outpaint_jobs.submit(job, outpaint_batch, items, user_prompt, ratios, target_size=1024)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 router = APIRouter()
 
+# 동기 /v1/outpaint 는 파이프라인이 끝날 때까지 슬롯을 잡고, 작업 등록형은 업로드/디코딩 동안만 잡는다
+admission.route("/v1/outpaint", "outpaint", max_files=1)
+admission.route("/v1/outpaint/jobs", "outpaint_submit", max_files=1)
+admission.route("/v1/outpaint/batch", "outpaint_submit", max_files=OUTPAINT_BATCH_MAX_IMAGES)
+
 @router.post(
     "/v1/outpaint",
     status_code=204,
@@ -121,27 +597,97 @@ async def outpaint_endpoint(
     user_prompt: str = Form(...),
     ratio: str = Form("1:1"),
 ):
-    _ensure_dir(FOOD_DIR)
+    job = await _submit_outpaint(input_image, user_prompt, ratio)
+    try:
+        await outpaint_jobs.wait(job)
+    except Exception:
+        raise HTTPException(status_code=502, detail=f"결과 파일 생성 실패: {job.error}")
 
-    n = _next_food_index()
-    base = f"{n}_food"
-    input_path  = os.path.join(FOOD_DIR, f"{base}.jpg")
-    output_path = os.path.join(FOOD_DIR, f"{base}_AI.jpg")
+    return Response(status_code=204, headers={"Server-Timing": stages_header(job.stages)})
 
-    try:
-        img = Image.open(input_image.file).convert("RGB")
-        img.save(input_path, "JPEG", quality=95)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"업로드 저장 실패: {e}")
+@router.post("/v1/outpaint/jobs", status_code=202)
+async def outpaint_submit(
+    request: Request,
+    input_image: UploadFile = File(...),
+    user_prompt: str = Form(...),
+    ratio: str = Form("1:1"),
+):
+    """
+    작업만 등록하고 바로 job_id 를 반환한다.
+    진행 상황은 GET /v1/outpaint/jobs/{job_id}, 결과는 .../result 로 조회.
+    """
+    job = await _submit_outpaint(input_image, user_prompt, ratio)
+    base = str(request.url_for("outpaint_status", job_id=job.id))
+    return JSONResponse(status_code=202, content={
+        **job.to_dict(),
+        "status_url": base,
+        "result_url": f"{base}/result",
+    })
 
-    try:
-        w, h = map(int, ratio.split(":"))
-        target_ratio = w/h
-    except Exception:
-        target_ratio = 1.0
+@router.post("/v1/outpaint/batch", status_code=202)
+async def outpaint_batch_submit(
+    request: Request,
+    input_images: List[UploadFile] = File(...),
+    user_prompt: str = Form(...),
+    ratios: List[str] = Form(["1:1"]),
+):
+    """
+    여러 이미지 × 여러 비율을 한 작업으로 처리한다.
+    - ratios 는 폼 필드 반복 또는 콤마 구분 ("1:1,4:5,16:9")
+    - 번역 1회, 이미지당 배경 제거/생성 1회, 비율별 결과는 같은 생성 이미지에서 크롭
+    - 이미지마다 새 그룹: N_food.jpg, N_food_AI.jpg(첫 비율), N_food_AI_{w}x{h}.jpg(나머지)
+    """
+    if not input_images:
+        raise HTTPException(status_code=400, detail="이미지를 하나 이상 업로드해야 합니다.")
+    if len(input_images) > OUTPAINT_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"이미지는 최대 {OUTPAINT_BATCH_MAX_IMAGES}장까지 업로드할 수 있습니다.")
+    parsed = _parse_ratio_list(ratios)
+
+    job = await _submit_outpaint_batch(input_images, user_prompt, parsed)
+    base = str(request.url_for("outpaint_status", job_id=job.id))
+    return JSONResponse(status_code=202, content={
+        **job.to_dict(),
+        "status_url": base,
+        "result_url": f"{base}/result",
+    })
+
+@router.get("/v1/outpaint/cache")
+async def outpaint_cache_stats():
+    """단계별 캐시(번역 프롬프트 / 배경 제거) 적중 통계"""
+    return JSONResponse(pipeline_cache.stats())
+
+@router.get("/v1/outpaint/jobs/{job_id}", name="outpaint_status")
+async def outpaint_status(job_id: str):
+    job = outpaint_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return JSONResponse(job.to_dict())
+
+@router.get("/v1/outpaint/jobs/{job_id}/result")
+async def outpaint_result(request: Request, job_id: str):
+    job = outpaint_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    if job.status == "failed":
+        raise HTTPException(status_code=502, detail=f"결과 파일 생성 실패: {job.error}")
+    if job.status != "done":
+        return JSONResponse(status_code=202, content=job.to_dict())
 
-    outpaint_image(input_path, user_prompt, output_path, target_size=1024, target_ratio=target_ratio)
-    if not os.path.exists(output_path):
-        raise HTTPException(status_code=502, detail="결과 파일 생성 실패")
+    if job.kind == "outpaint_batch":
+        return JSONResponse({"items": [
+            {
+                **item,
+                "files": [
+                    {**f, "url": _build_public_url(request, "food", preferred_relpath(FOOD_DIR, f["filename"]))} for f in item["files"]
+                ],
+            }
+            for item in job.result
+        ]})
 
-    return Response(status_code=204)
+    filename = os.path.basename(job.result)
+    return JSONResponse({
+        "group": job.meta.get("group"),
+        "filename": filename,
+        "path": job.result,
+        "url": _build_public_url(request, "food", preferred_relpath(FOOD_DIR, filename)),
+    })
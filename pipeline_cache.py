@@ -0,0 +1,67 @@
+# pipeline_cache.py
+"""
+outpaint 파이프라인 단계별 캐시.
+
+- prompt_cache : 정규화한 한국어 요청 → 번역/클램프된 generated_prompt_en
+- matting_cache: 입력 이미지 내용 해시 → RGBA 컷아웃(PNG)
+OUTPAINT_CACHE_DISK=1 이면 IMAGE_DIR/cache/ 아래 디스크 2차 캐시도 사용.
+"""
+import os, re, unicodedata
+from io import BytesIO
+
+from PIL import Image
+
+from cache import TTLCache, make_key
+
+IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
+CACHE_DIR  = os.path.join(IMAGE_ROOT, "cache")
+
+OUTPAINT_CACHE_DISK       = os.getenv("OUTPAINT_CACHE_DISK", "0") == "1"
+PROMPT_CACHE_MAX_ITEMS    = int(os.getenv("PROMPT_CACHE_MAX_ITEMS", "2048"))
+PROMPT_CACHE_TTL_SEC      = float(os.getenv("PROMPT_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+MATTING_CACHE_MAX_ITEMS   = int(os.getenv("MATTING_CACHE_MAX_ITEMS", "64"))
+MATTING_CACHE_TTL_SEC     = float(os.getenv("MATTING_CACHE_TTL_SEC", str(24 * 3600)))
+
+
+def normalize_prompt(text: str) -> str:
+    """NFC + 공백 정리 + 소문자 (같은 문구의 띄어쓰기/대소문자 차이는 같은 키)"""
+    s = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+
+def prompt_key(user_prompt_kr: str, model: str) -> str:
+    return make_key("prompt", model, normalize_prompt(user_prompt_kr))
+
+
+def image_key(digest: str, *extra) -> str:
+    """입력 원본의 sha256(hex) → 배경 제거 캐시 키 (원본 바이트를 다시 해시하지 않는다)"""
+    return make_key("matting", digest, *extra)
+
+
+def _png_dumps(img: Image.Image) -> bytes:
+    buf = BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _png_loads(data: bytes) -> Image.Image:
+    img = Image.open(BytesIO(data))
+    img.load()
+    return img
+
+
+prompt_cache = TTLCache(
+    "prompt", PROMPT_CACHE_MAX_ITEMS, PROMPT_CACHE_TTL_SEC,
+    disk_dir=os.path.join(CACHE_DIR, "prompt") if OUTPAINT_CACHE_DISK else None,
+    dumps=lambda s: s.encode("utf-8"), loads=lambda b: b.decode("utf-8"),
+)
+
+matting_cache = TTLCache(
+    "matting", MATTING_CACHE_MAX_ITEMS, MATTING_CACHE_TTL_SEC,
+    disk_dir=os.path.join(CACHE_DIR, "matting") if OUTPAINT_CACHE_DISK else None,
+    dumps=_png_dumps, loads=_png_loads,
+)
+
+
+def stats() -> dict:
+    return {"prompt": prompt_cache.stats(), "matting": matting_cache.stats()}
@@ -0,0 +1,196 @@
+# renditions.py
+"""
+업로드 이미지 → 파생본(rendition) 생성.
+
+    store/N_store_1.jpg          full  (원본 해상도, 바로 선 JPEG 업로드는 메타데이터만 떼고 재인코딩 없이)
+    store/web/N_store_1.jpg      web   (긴 변 RENDITION_WEB_EDGE, 클라이언트 표시용)
+    store/web/N_store_1.webp     webp  (RENDITION_WEBP=1 일 때)
+    store/thumb/N_store_1.jpg    thumb (긴 변 RENDITION_THUMB_EDGE, 목록용)
+
+디코딩/인코딩은 CPU 작업이라 프로세스 풀(INGEST_WORKERS)에서 파일별로 병렬 실행한다.
+INGEST_WORKERS=0 이면 스레드풀에서 실행(개발/테스트용).
+워커 함수는 pickle 가능해야 하므로 이 모듈의 최상위 함수로만 둔다.
+"""
+import asyncio, os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from typing import Dict, Optional
+
+from PIL import Image
+
+from upload_decode import decode_image, open_bounded
+
+INGEST_WORKERS        = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDITION_THUMB_EDGE  = int(os.getenv("RENDITION_THUMB_EDGE", "320"))
+RENDITION_WEB_EDGE    = int(os.getenv("RENDITION_WEB_EDGE", "1280"))
+RENDITION_WEB_QUALITY = int(os.getenv("RENDITION_WEB_QUALITY", "82"))
+RENDITION_WEBP        = os.getenv("RENDITION_WEBP", "1") == "1"
+FULL_QUALITY          = 95
+
+# full 에서 떼어 낼 JPEG 세그먼트: APP1(EXIF/XMP, GPS·기기 정보), APP3~APP13(IPTC 등), APP15, COM
+# APP0(JFIF)/APP2(ICC 색 프로파일)/APP14(Adobe 색 변환)는 디코딩 결과에 영향을 주므로 남긴다
+_JPEG_KEEP_APP = {0xE0, 0xE2, 0xEE}
+
+def _stem(filename: str) -> str:
+    return os.path.splitext(filename)[0]
+
+
+def rendition_relpath(size: str, filename: str) -> str:
+    """디렉터리 기준 상대 경로 ("web/N_store_1.jpg" 등). full 은 파일명 그대로"""
+    if size == "full":
+        return filename
+    if size == "webp":
+        return os.path.join("web", f"{_stem(filename)}.webp")
+    return os.path.join(size, f"{_stem(filename)}.jpg")
+
+
+def preferred_relpath(directory: str, filename: str, size: str = "web") -> str:
+    """size 파생본이 있으면 그 상대 경로, 없으면(이전 업로드 등) 원본 파일명"""
+    rel = rendition_relpath(size, filename)
+    if rel != filename and os.path.exists(os.path.join(directory, rel)):
+        return rel
+    return filename
+
+
+def _save(img: Image.Image, path: str, fmt: str, **params) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    img.save(path, fmt, **params)
+    return os.path.getsize(path)
+
+
+def write_renditions(img: Image.Image, directory: str, filename: str) -> Dict[str, dict]:
+    """
+    이미 디코딩된 RGB 이미지로 web/webp/thumb 파생본을 쓴다 (full 은 호출자가 저장).
+    복사 없이 img 를 제자리에서 줄이므로 호출자는 저장이 끝난 이미지를 넘긴다.
+    web 을 먼저 줄이고 thumb 은 web 에서 다시 줄여 큰 원본을 두 번 리샘플링하지 않는다.
+    """
+    out: Dict[str, dict] = {}
+    web = img
+    web.thumbnail((RENDITION_WEB_EDGE, RENDITION_WEB_EDGE), Image.Resampling.LANCZOS)
+    rel = rendition_relpath("web", filename)
+    out["web"] = {"relpath": rel, "size": web.size, "bytes": _save(
+        web, os.path.join(directory, rel), "JPEG",
+        quality=RENDITION_WEB_QUALITY, optimize=True, progressive=True,
+    )}
+    if RENDITION_WEBP:
+        rel = rendition_relpath("webp", filename)
+        out["webp"] = {"relpath": rel, "size": web.size, "bytes": _save(
+            web, os.path.join(directory, rel), "WEBP", quality=RENDITION_WEB_QUALITY, method=4,
+        )}
+    web.thumbnail((RENDITION_THUMB_EDGE, RENDITION_THUMB_EDGE), Image.Resampling.LANCZOS)
+    rel = rendition_relpath("thumb", filename)
+    out["thumb"] = {"relpath": rel, "size": web.size, "bytes": _save(
+        web, os.path.join(directory, rel), "JPEG", quality=80, optimize=True,
+    )}
+    return out
+
+
+def _strip_jpeg_metadata(data: bytes) -> Optional[bytes]:
+    """
+    JPEG 바이트에서 메타데이터 세그먼트만 제거 (엔트로피 데이터는 그대로, 무손실).
+    구조를 해석하지 못하면 None → 호출자가 재인코딩한다.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    out = [data[:2]]
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                      # 채움 바이트
+            i += 1
+            continue
+        if marker == 0xDA:                      # SOS 부터는 끝까지 그대로
+            out.append(data[i:])
+            return b"".join(out)
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        end = i + 2 + length
+        if length < 2 or end > n:
+            return None
+        if not (0xE0 <= marker <= 0xEF or marker == 0xFE) or marker in _JPEG_KEEP_APP:
+            out.append(data[i:end])
+        i = end
+    return None
+
+
+def ingest_image(data: bytes, directory: str, filename: str) -> Dict[str, dict]:
+    """
+    (워커 프로세스에서 실행) 업로드 바이트 → full + 파생본 저장, 파생본별 정보 반환.
+    - 회전 태그가 없는 RGB/L JPEG: EXIF 등 메타데이터만 무손실로 떼어 full 로 쓰고(재인코딩 X),
+      파생본은 draft 로 web 크기 근처에서만 디코딩 → 원본 해상도 버퍼를 만들지 않는다
+    - 그 외(회전 필요 포함): 원본 해상도로 디코딩(UPLOAD_MAX_PIXELS 상한, 회전 적용)해
+      q95 JPEG 로 저장 후 제자리 축소. PIL 은 exif 를 넘기지 않으면 메타데이터를 쓰지 않는다
+    공개 디렉터리에 위치/기기 정보가 나가지 않고, full 과 파생본의 방향/크기가 같다.
+    """
+    head = open_bounded(data)
+    fmt, mode, full_size = head.format, head.mode, head.size
+    stripped = None
+    if fmt == "JPEG" and mode in ("RGB", "L") and head.getexif().get(0x0112, 1) == 1:
+        stripped = _strip_jpeg_metadata(data)
+    head.close()
+
+    path = os.path.join(directory, filename)
+    os.makedirs(directory, exist_ok=True)
+    if stripped is not None:
+        with open(path, "wb") as f:
+            f.write(stripped)
+        full_bytes = len(stripped)
+        img = decode_image(data, max_edge=RENDITION_WEB_EDGE)
+    else:
+        img = decode_image(data)
+        full_size = img.size
+        full_bytes = _save(img, path, "JPEG", quality=FULL_QUALITY)
+    out = {"full": {"relpath": filename, "size": full_size, "bytes": full_bytes}}
+    try:
+        out.update(write_renditions(img, directory, filename))
+    finally:
+        img.close()
+    return out
+
+
+def _noop() -> None:
+    return None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if INGEST_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn: 부모의 스레드(rembg 러너, sqlite 연결 등)를 fork 로 복제하지 않는다
+        _pool = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def run(fn, *args):
+    """fn(*args) 를 프로세스 풀에서 실행 (풀이 깨졌으면 다음 호출 때 새로 만든다)"""
+    global _pool
+    pool = _get_pool()
+    try:
+        # pool 이 None 이면 기본 스레드 executor
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        _pool = None
+        raise
+
+
+async def startup() -> None:
+    """워커 프로세스를 미리 띄워 첫 업로드가 spawn 비용을 내지 않게 한다"""
+    pool = _get_pool()
+    if pool is not None:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(pool, _noop) for _ in range(INGEST_WORKERS)])
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,165 +1,196 @@
-# from fastapi import APIRouter, File, Form, UploadFile, Query, HTTPException
-# from fastapi.responses import JSONResponse, StreamingResponse
-# from typing import List, Optional
-# import io, json
-# import torch
-# from PIL import ImageDraw, ImageOps
-# from diffusers import StableDiffusionInpaintPipeline
-# from rembg import remove
-# import google.generativeai as genai
-# from config import GEMINI_API_KEY, MODEL_ID
-# from utils import read_image_from_upload, resize_image, parse_ratio_and_size, get_position_coords, draw_text_with_background
-#
-# router = APIRouter()
-#
-# DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-# DTYPE = torch.float16 if DEVICE == "cuda" else torch.float32
-# INPAINT_PIPE = None
-#
-# genai.configure(api_key=GEMINI_API_KEY)
-#
-# @router.post("/v1/ad-image")
-# def ad_image(
-#     input_image: UploadFile = File(..., description="기준 이미지(PNG/JPG)"),
-#     user_prompt: str = Form(..., description="배경 컨셉 설명(자연어, 한국어 OK)"),
-#     resize_mode: str = Form("pad", description="pad|crop"),
-#     ratio: Optional[str] = Form("1:1", description="예: 1:1, 4:5, 16:9"),
-#     base_size: Optional[int] = Form(512, description="짧은 변 기준 크기"),
-#     elements_json: Optional[str] = Form(None, description="텍스트/로고 요소 배열 JSON"),
-#     logos: Optional[List[UploadFile]] = File(None, description="로고 이미지들(선택)"),
-#     return_mode: str = Query("image", alias="return", description="image|json"),
-# ):
-#     global INPAINT_PIPE
-#     if INPAINT_PIPE is None:
-#         try:
-#             INPAINT_PIPE = StableDiffusionInpaintPipeline.from_pretrained(
-#                 "runwayml/stable-diffusion-inpainting", torch_dtype=DTYPE, safety_checker=None
-#             ).to(DEVICE)
-#         except Exception as e:
-#             raise HTTPException(status_code=500, detail=f"Inpaint 파이프라인 로딩 실패: {e}")
-#
-#     try:
-#         ref_image = read_image_from_upload(input_image)
-#     except Exception as e:
-#         raise HTTPException(status_code=400, detail=f"입력 이미지 오류: {e}")
-#
-#     target_w, target_h = parse_ratio_and_size(ratio, base_size)
-#     ref_resized = resize_image(ref_image, target_w, target_h, resize_mode)
-#
-#     try:
-#         foreground_mask = remove(ref_resized, only_mask=True)
-#         background_mask = ImageOps.invert(foreground_mask)
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=f"마스크 생성 실패: {e}")
-#
-#     try:
-#         model = genai.GenerativeModel("gemini-1.5-flash-latest")
-#         final_prompt = (
-#             "You are an expert prompt engineer for Stable Diffusion Inpainting.\n"
-#             "Return ONLY a single concise English prompt that vividly describes a NEW BACKGROUND matching the user's concept.\n"
-#             "Do NOT mention text, logos, watermarks, or people. Focus on atmosphere, lighting, environment, and style.\n"
-#             f"User concept (Korean allowed): {user_prompt}\n"
-#         )
-#         buf = io.BytesIO()
-#         ref_resized.save(buf, format="PNG")
-#         buf.seek(0)
-#         gem_resp = model.generate_content([
-#             final_prompt,
-#             {"mime_type": "image/png", "data": buf.getvalue()},
-#         ])
-#         generated_prompt = (gem_resp.text or "").strip()
-#         if not generated_prompt:
-#             raise ValueError("빈 프롬프트")
-#     except Exception as e:
-#         generated_prompt = (
-#             "cinematic wide background, moody atmosphere, soft volumetric lighting, "+
-#             "depth of field, photorealistic, rich textures, high detail"
-#         )
-#         print(f"[경고] Gemini 보조 프롬프트 실패 → 기본 프롬프트 사용: {e}")
-#
-#     try:
-#         with torch.no_grad():
-#             result = INPAINT_PIPE(
-#                 prompt=generated_prompt,
-#                 image=ref_resized,
-#                 mask_image=background_mask,
-#                 width=target_w,
-#                 height=target_h,
-#                 guidance_scale=7.5,
-#                 num_inference_steps=50,
-#                 negative_prompt=(
-#                     "text, logo, watermark, blurry, low quality, distorted, bad quality, "
-#                     "clutter, extra objects, repeated patterns, overexposed, artifacts"
-#                 ),
-#             )
-#         gen_img = result.images[0]
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=f"Inpainting 실패: {e}")
-#
-#     draw = ImageDraw.Draw(gen_img)
-#     W, H = gen_img.size
-#     loaded_logos: List[Image.Image] = []
-#     if logos:
-#         for lf in logos:
-#             try:
-#                 loaded_logos.append(Image.open(io.BytesIO(lf.file.read())).convert("RGBA"))
-#             except Exception:
-#                 loaded_logos.append(None)
-#
-#     elements: List[dict] = []
-#     if elements_json:
-#         try:
-#             elements = json.loads(elements_json)
-#             if not isinstance(elements, list):
-#                 raise ValueError("elements_json은 배열이어야 합니다.")
-#         except Exception as e:
-#             raise HTTPException(status_code=400, detail=f"elements_json 파싱 오류: {e}")
-#
-#     def load_font(path: str, size: int):
-#         if path:
-#             try:
-#                 return ImageFont.truetype(path, size)
-#             except Exception:
-#                 pass
-#         return ImageFont.load_default()
-#
-#     for el in elements:
-#         try:
-#             etype = el.get("type")
-#             if etype in ("text", "bg_text"):
-#                 font = load_font(el.get("font") or "", int(el.get("size", 48)))
-#                 if etype == "text":
-#                     x, y = get_position_coords(el.get("position", "center-center"), W, H)
-#                     draw.text((x, y), el.get("text", ""), font=font, fill=el.get("color", "white"), anchor="mm")
-#                 else:
-#                     draw_text_with_background(draw, el, font, W, H)
-#             elif etype == "logo":
-#                 idx = int(el.get("logo_index", 0))
-#                 scale = float(el.get("scale", 0.2))
-#                 if 0 <= idx < len(loaded_logos) and loaded_logos[idx] is not None:
-#                     logo_img = loaded_logos[idx]
-#                     logo_w = max(1, int(W * max(0.05, min(0.8, scale))))
-#                     logo_h = max(1, int(logo_w / logo_img.width * logo_img.height))
-#                     logo_resized = logo_img.resize((logo_w, logo_h), Image.Resampling.LANCZOS)
-#                     x, y = get_position_coords(el.get("position", "bottom-right"), W, H)
-#                     lx, ly = int(x - logo_w / 2), int(y - logo_h / 2)
-#                     gen_img.paste(logo_resized, (lx, ly), logo_resized)
-#         except Exception as e:
-#             print(f"[요소 경고] 요소 적용 실패: {e}")
-#
-#     if return_mode == "json":
-#         out_buf = io.BytesIO()
-#         gen_img.save(out_buf, format="JPEG", quality=95)
-#         b64 = base64.b64encode(out_buf.getvalue()).decode("utf-8")
-#         return JSONResponse({
-#             "width": W,
-#             "height": H,
-#             "prompt": generated_prompt,
-#             "image_base64": b64,
-#         })
-#     else:
-#         out_buf = io.BytesIO()
-#         gen_img.save(out_buf, format="JPEG", quality=95)
-#         out_buf.seek(0)
-#         headers = {"Content-Disposition": "inline; filename=ad_image.jpg"}
-#         return StreamingResponse(out_buf, media_type="image/jpeg", headers=headers)
+from fastapi import APIRouter, File, Form, UploadFile, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional
+import asyncio, base64, io, json
+from PIL import Image, ImageOps
+
+import admission
+import gemini
+from compositor import compose
+import metrics
+from metrics import log
+from inpaint import InpaintBusy, INPAINT_BATCH_MAX, INPAINT_DEFAULT_TIER, TIERS, engine
+from matting import remove_background
+from timing import StageTimer
+from upload_decode import UploadTooLarge, decode_image, read_upload
+from utils import resize_image, parse_ratio_and_size
+
+router = APIRouter()
+
+# 로고 여러 장이 함께 올 수 있어 크기 상한은 업로드 함수(read_upload)에 맡긴다
+admission.route("/v1/ad-image", "ad_image")
+admission.route("/v1/ad-image/compose", "ad_image_compose")
+if (admission.concurrency("ad_image") or INPAINT_BATCH_MAX) < INPAINT_BATCH_MAX:
+    print(f"⚠️ ad_image 동시처리({admission.concurrency('ad_image')}) < INPAINT_BATCH_MAX({INPAINT_BATCH_MAX}): 인페인팅 배치가 다 차지 않습니다.")
+
+PROMPT_MODEL = "gemini-1.5-flash-latest"
+DEFAULT_BG_PROMPT = (
+    "cinematic wide background, moody atmosphere, soft volumetric lighting, "
+    "depth of field, photorealistic, rich textures, high detail"
+)
+_PROMPT_INSTRUCTION = (
+    "You are an expert prompt engineer for Stable Diffusion Inpainting.\n"
+    "Return ONLY a single concise English prompt that vividly describes a NEW BACKGROUND matching the user's concept.\n"
+    "Do NOT mention text, logos, watermarks, or people. Focus on atmosphere, lighting, environment, and style.\n"
+    "User concept (Korean allowed): {user_prompt}\n"
+)
+
+async def _background_prompt(user_prompt: str, ref: Image.Image) -> str:
+    """사용자 컨셉 + 참고 이미지 → SD 배경 프롬프트 (실패 시 기본 프롬프트)"""
+    buf = io.BytesIO()
+    ref.save(buf, format="JPEG", quality=85)
+    parts = [
+        {"text": _PROMPT_INSTRUCTION.format(user_prompt=user_prompt)},
+        {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(buf.getvalue()).decode("ascii")}},
+    ]
+    try:
+        prompt = gemini.response_text(await gemini.generate_content(parts, model=PROMPT_MODEL))
+        if not prompt:
+            raise ValueError("빈 프롬프트")
+        return prompt
+    except Exception as e:
+        log(f"[경고] Gemini 보조 프롬프트 실패 → 기본 프롬프트 사용: {e}")
+        metrics.fallback("ad_image", "default_prompt")
+        return DEFAULT_BG_PROMPT
+
+def _background_mask(img: Image.Image) -> Image.Image:
+    _, foreground_mask = remove_background(img)
+    return ImageOps.invert(foreground_mask)
+
+def _parse_elements(elements_json: Optional[str]) -> List[dict]:
+    if not elements_json:
+        return []
+    try:
+        elements = json.loads(elements_json)
+        if not isinstance(elements, list):
+            raise ValueError("elements_json은 배열이어야 합니다.")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"elements_json 파싱 오류: {e}")
+    return elements
+
+async def _read_logos(logos: Optional[List[UploadFile]]) -> List[Optional[bytes]]:
+    out: List[Optional[bytes]] = []
+    for lf in logos or []:
+        try:
+            out.append(await read_upload(lf))
+        except Exception:
+            out.append(None)
+    return out
+
+def _encode_jpeg(img: Image.Image) -> bytes:
+    out_buf = io.BytesIO()
+    img.save(out_buf, format="JPEG", quality=95)
+    return out_buf.getvalue()
+
+@router.post("/v1/ad-image")
+async def ad_image(
+    input_image: UploadFile = File(..., description="기준 이미지(PNG/JPG)"),
+    user_prompt: str = Form(..., description="배경 컨셉 설명(자연어, 한국어 OK)"),
+    resize_mode: str = Form("pad", description="pad|crop"),
+    ratio: Optional[str] = Form("1:1", description="예: 1:1, 4:5, 16:9"),
+    base_size: Optional[int] = Form(None, description="짧은 변 기준 크기 (품질 단계의 크기를 넘지 않음)"),
+    quality: str = Form(INPAINT_DEFAULT_TIER, description="품질 단계: " + "|".join(TIERS)),
+    seed: Optional[int] = Form(None, description="고정 시드(선택)"),
+    elements_json: Optional[str] = Form(None, description="텍스트/로고 요소 배열 JSON"),
+    logos: Optional[List[UploadFile]] = File(None, description="로고 이미지들(선택)"),
+    return_mode: str = Query("image", alias="return", description="image|json"),
+):
+    t = StageTimer("ad_image")
+    tier = TIERS.get(quality)
+    if tier is None:
+        raise HTTPException(status_code=400, detail=f"quality 는 {', '.join(TIERS)} 중 하나여야 합니다.")
+
+    elements = _parse_elements(elements_json)
+
+    target_w, target_h = parse_ratio_and_size(ratio, min(base_size or tier.size, tier.size))
+
+    with t.stage("decode"):
+        try:
+            data = await read_upload(input_image)
+            # 목표 크기의 2배까지만 디코딩 (draft + thumbnail)
+            ref_image = await run_in_threadpool(decode_image, data, 2 * max(target_w, target_h))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"입력 이미지 오류: {e}")
+        ref_resized = await run_in_threadpool(resize_image, ref_image, target_w, target_h, resize_mode)
+
+    # 프롬프트 생성(Gemini)과 마스크(rembg)는 서로 독립이라 동시에
+    async def _prompt():
+        with t.stage("prompt"):
+            return await _background_prompt(user_prompt, ref_resized)
+
+    async def _mask():
+        with t.stage("mask"):
+            return await run_in_threadpool(_background_mask, ref_resized)
+
+    try:
+        generated_prompt, background_mask = await asyncio.gather(_prompt(), _mask())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"마스크 생성 실패: {e}")
+
+    with t.stage("inpaint"):
+        try:
+            fut = await run_in_threadpool(engine.submit, ref_resized, background_mask, generated_prompt, tier.name, seed)
+            gen_img, info = await asyncio.wrap_future(fut)
+        except InpaintBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        except ImportError as e:
+            raise HTTPException(status_code=503, detail=f"Inpaint 엔진을 사용할 수 없습니다: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Inpainting 실패: {e}")
+
+    if elements:
+        with t.stage("overlay"):
+            gen_img = await run_in_threadpool(compose, gen_img, elements, await _read_logos(logos))
+
+    with t.stage("encode"):
+        jpeg = await run_in_threadpool(_encode_jpeg, gen_img)
+
+    W, H = gen_img.size
+    headers = {"Server-Timing": t.header()}
+    if return_mode == "json":
+        return JSONResponse({
+            "width": W,
+            "height": H,
+            "prompt": generated_prompt,
+            "quality": info["tier"],
+            "steps": info["steps"],
+            "batch": info["batch"],
+            "image_base64": base64.b64encode(jpeg).decode("utf-8"),
+        }, headers=headers)
+    headers["Content-Disposition"] = "inline; filename=ad_image.jpg"
+    return Response(jpeg, media_type="image/jpeg", headers=headers)
+
+@router.post("/v1/ad-image/compose")
+async def ad_image_compose(
+    input_image: UploadFile = File(..., description="이미 생성된 이미지(PNG/JPG)"),
+    elements_json: str = Form(..., description="텍스트/로고 요소 배열 JSON"),
+    logos: Optional[List[UploadFile]] = File(None, description="로고 이미지들(선택)"),
+    return_mode: str = Query("image", alias="return", description="image|json"),
+):
+    """인페인팅 없이 오버레이만 다시 적용 (폰트/텍스트 레이어/로고 리사이즈 캐시 사용)"""
+    t = StageTimer("ad_image_compose")
+    elements = _parse_elements(elements_json)
+    with t.stage("decode"):
+        try:
+            img = await run_in_threadpool(decode_image, await read_upload(input_image))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"입력 이미지 오류: {e}")
+    with t.stage("overlay"):
+        out = await run_in_threadpool(compose, img, elements, await _read_logos(logos))
+    with t.stage("encode"):
+        jpeg = await run_in_threadpool(_encode_jpeg, out)
+
+    headers = {"Server-Timing": t.header()}
+    if return_mode == "json":
+        return JSONResponse({
+            "width": out.width,
+            "height": out.height,
+            "image_base64": base64.b64encode(jpeg).decode("utf-8"),
+        }, headers=headers)
+    headers["Content-Disposition"] = "inline; filename=ad_image.jpg"
+    return Response(jpeg, media_type="image/jpeg", headers=headers)
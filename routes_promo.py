@@ -1,41 +1,148 @@
 # routes_promo.py
 from fastapi import APIRouter, Form, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
-from typing import List, Optional
-import os, re, json, glob, requests
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional, Tuple
+import asyncio, os, re, json, time
+import httpx
 
-from config import GEMINI_API_KEY, GEMINI_ENDPOINT, MODEL_ID
-from utils import build_promo_prompt, filepaths_to_inline_parts, format_body_with_newlines_and_images
+import admission
+import gemini
+import http_client
+import metrics
+import upstream
+from cache import SingleFlight, TTLCache, make_key
+from config import MODEL_ID
+from deadline import Deadline
+from utils import (
+    VariantStreamParser, build_promo_prompt, file_digest, filepaths_to_inline_parts,
+    format_body_with_newlines_and_images,
+)
+from group_catalog import catalog
+from metrics import log
+from timing import StageTimer
+from renditions import preferred_relpath
 
 router = APIRouter()
 
+# 본문이 작은 폼이라 크기 검사 없이 동시 처리만 제한 (스트림은 응답이 끝날 때까지 슬롯을 잡는다)
+admission.route("/v1/generate-promo", "promo")
+admission.route("/v1/generate-promo/stream", "promo")
+admission.route("/v1/generate-promo/batch", "promo_batch")
+
 IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
 FOOD_DIR   = os.path.join(IMAGE_ROOT, "food")
 STORE_DIR  = os.path.join(IMAGE_ROOT, "store")
 
+PROMO_CACHE_MAX_ITEMS = int(os.getenv("PROMO_CACHE_MAX_ITEMS", "256"))
+PROMO_CACHE_TTL_SEC   = float(os.getenv("PROMO_CACHE_TTL_SEC", "300"))
+# 요청 전체(그룹 조회 ~ Gemini 응답)의 시간 예산. 느린 Gemini 호출은 헤지되고, 예산을 넘기면 504
+PROMO_DEADLINE_SEC    = float(os.getenv("PROMO_DEADLINE_SEC", "60"))
+# /v1/generate-promo/batch: 한 요청의 매장 수 상한 / 동시에 생성하는 매장 수
+PROMO_BATCH_MAX_ITEMS   = int(os.getenv("PROMO_BATCH_MAX_ITEMS", "500"))
+PROMO_BATCH_CONCURRENCY = int(os.getenv("PROMO_BATCH_CONCURRENCY", "8"))
+
+# (모델 원문(raw) 텍스트, 모델 입력 크기 통계)만 캐시 → 이미지 URL 은 요청마다 host 기준으로 다시 붙인다
+promo_cache = TTLCache("promo", PROMO_CACHE_MAX_ITEMS, PROMO_CACHE_TTL_SEC)
+promo_flight = SingleFlight()
+
+def _norm(v: Optional[str]) -> Optional[str]:
+    if v is None:
+        return None
+    return re.sub(r"\s+", " ", v).strip()
+
+def _cache_directive(param: str, cache_control: Optional[str]) -> str:
+    """
+    ?cache=no-cache|no-store 또는 Cache-Control 헤더 → "default" | "no-cache" | "no-store"
+    """
+    tokens = {t.strip().lower() for t in f"{param or ''},{cache_control or ''}".split(",")}
+    if "no-store" in tokens:
+        return "no-store"
+    if "no-cache" in tokens:
+        return "no-cache"
+    return "default"
+
 def _latest_group_with_food_ai() -> Optional[int]:
     """
-    FOOD_DIR에서 N_food_AI.jpg 중 가장 큰 N을 반환
+    N_food_AI.jpg 가 있는 가장 큰 N (메모리 카탈로그 조회, 디렉터리 스캔 없음)
     """
-    if not os.path.isdir(FOOD_DIR):
-        return None
-    pat = re.compile(r"^(\d+)_food_AI\.jpg$", re.IGNORECASE)
-    max_n = None
-    for name in os.listdir(FOOD_DIR):
-        m = pat.match(name)
-        if m:
-            n = int(m.group(1))
-            if (max_n is None) or (n > max_n):
-                max_n = n
-    return max_n
+    return catalog.latest_group_with_food_ai()
 
 def _build_public_url(request: Request, subdir: str, filename: str) -> str:
     scheme = request.headers.get("X-Forwarded-Proto", request.url.scheme)
     host   = request.headers.get("X-Forwarded-Host", request.headers.get("host", request.url.netloc))
     return f"{scheme}://{host}/images/{subdir}/{filename}"
 
+def _resolve_group_images(request: Request, n: Optional[int]):
+    """
+    그룹 N 의 (가공 음식 경로, 가게 이미지 경로들, 공개 URL 들)
+    - food: N_food_AI.jpg / store: N_store_*.jpg
+    - 모델에는 원본 경로를, 클라이언트 URL 은 web 파생본(없으면 원본)을 쓴다
+    """
+    food_ai_path = None
+    store_img_paths: List[str] = []
+    image_urls: List[str] = []
+    if n is None:
+        return food_ai_path, store_img_paths, image_urls
+
+    food_ai_candidate = os.path.join(FOOD_DIR, f"{n}_food_AI.jpg")
+    if os.path.exists(food_ai_candidate):
+        food_ai_path = food_ai_candidate
+        image_urls.append(_build_public_url(request, "food", preferred_relpath(FOOD_DIR, f"{n}_food_AI.jpg")))
+
+    store_files = [os.path.join(STORE_DIR, f) for f in catalog.files(n, "store")]
+    for p in store_files:
+        if not os.path.exists(p):
+            continue
+        store_img_paths.append(p)
+        image_urls.append(_build_public_url(request, "store", preferred_relpath(STORE_DIR, os.path.basename(p))))
+    return food_ai_path, store_img_paths, image_urls
+
+def _images_block(n, food_ai_path, store_img_paths, image_urls, payload_stats) -> dict:
+    return {
+        "group": n,
+        "food_ai": os.path.basename(food_ai_path) if food_ai_path else None,
+        "stores": [os.path.basename(p) for p in store_img_paths],
+        "urls": image_urls,
+        "roots": {"food": FOOD_DIR, "store": STORE_DIR},
+        "payload": payload_stats or None,
+    }
+
+async def _promo_cache_key(prompt: str, img_for_model: List[str], *fields) -> str:
+    """정규화 입력 + 프롬프트 + 첨부 이미지 내용 해시"""
+    digests = await run_in_threadpool(lambda: [file_digest(p) for p in img_for_model])
+    return make_key("promo", MODEL_ID, prompt, *fields, *digests)
+
+def _llm_http_exception(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, upstream.UpstreamBusy):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": f"{e.retry_after:.0f}"})
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail=f"LLM 응답이 시간 예산({PROMO_DEADLINE_SEC:g}s) 안에 오지 않았습니다.")
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail=f"LLM 호출 타임아웃({http_client.HTTP_READ_TIMEOUT:g}s)")
+    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+        # 재시도 후에도 제한 중 → 클라이언트에도 나중에 다시 시도하라고 알린다
+        retry_after = upstream.retry_after_of(e)
+        return HTTPException(
+            status_code=503, detail="LLM 호출 한도 초과, 잠시 후 다시 시도해 주세요.",
+            headers={"Retry-After": f"{retry_after or upstream.UPSTREAM_BACKOFF_MAX:.0f}"},
+        )
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(status_code=502, detail=f"LLM HTTP 오류: {e.response.status_code} {e.response.text[:300]}")
+    return HTTPException(status_code=500, detail=f"LLM 호출 실패: {repr(e)}")
+
+async def _model_parts(prompt: str, img_for_model: List[str], payload_stats: dict) -> List[dict]:
+    """모델 입력 parts (텍스트 + 이미지, 축소/캐시된 인코딩)"""
+    parts: List[dict] = [{"text": prompt}]
+    parts += await run_in_threadpool(filepaths_to_inline_parts, img_for_model, payload_stats)
+    payload_stats["prompt_bytes"] = len(prompt.encode("utf-8"))
+    payload_stats["request_bytes"] = payload_stats["prompt_bytes"] + payload_stats["base64_bytes"]
+    return parts
+
 @router.post("/v1/generate-promo")
-def generate_promo(
+async def generate_promo(
     request: Request,
     debug: int = Query(0),
     store_name: str = Form(...),
@@ -46,6 +153,7 @@ def generate_promo(
     longitude: Optional[float] = Form(None),
     variants: int = Form(3),
     language: str = Form("ko"),
+    cache: str = Query("default", description="default | no-cache(새로 생성 후 저장) | no-store(캐시 미사용)"),
 ):
     """
     - 본문 이미지: '가공 음식(food/N_food_AI.jpg)' + '가게 이미지(store/N_store_*.jpg)' 만 사용
@@ -64,72 +172,84 @@ def generate_promo(
             }]
         })
 
-    # 1) 최신 그룹 N 탐색(가공 음식 기준)
-    n = _latest_group_with_food_ai()
-    food_ai_path = None
-    store_img_paths: List[str] = []
-    image_urls: List[str] = []
+    store_name, mood, language = _norm(store_name), _norm(mood), _norm(language)
+    store_description, location_text = _norm(store_description), _norm(location_text)
 
-    if n is not None:
-        # food: N_food_AI.jpg
-        food_ai_candidate = os.path.join(FOOD_DIR, f"{n}_food_AI.jpg")
-        if os.path.exists(food_ai_candidate):
-            food_ai_path = food_ai_candidate
-            image_urls.append(_build_public_url(request, "food", f"{n}_food_AI.jpg"))
+    timer = StageTimer("promo")
+    deadline = Deadline(PROMO_DEADLINE_SEC)
 
-        # store: N_store_*.jpg
-        store_files = sorted(glob.glob(os.path.join(STORE_DIR, f"{n}_store_*.jpg")))
-        for p in store_files:
-            store_img_paths.append(p)
-            image_urls.append(_build_public_url(request, "store", os.path.basename(p)))
+    # 1) 최신 그룹 N 탐색(가공 음식 기준) — 그룹 이미지 조회는 _promo_for_group 의 resolve 단계
+    with timer.stage("latest_group"):
+        n = _latest_group_with_food_ai()
 
-    # 2) 프롬프트
-    prompt = build_promo_prompt(
-        language=language, mood=mood, store_name=store_name,
-        store_description=store_description, location_text=location_text,
-        latitude=latitude, longitude=longitude, variants=variants,
+    fields = dict(
+        language=language, mood=mood, store_name=store_name, store_description=store_description,
+        location_text=location_text, latitude=latitude, longitude=longitude, variants=variants,
     )
+    directive = _cache_directive(cache, request.headers.get("cache-control"))
+    content, cache_status = await _promo_for_group(request, n, fields, directive, timer, deadline)
+    return JSONResponse(content, headers={"X-Cache": cache_status, "Server-Timing": timer.header()})
+
+# 캐시 키에 들어가는 입력 필드 순서 (build_promo_prompt 인자 이름과 같다)
+_PROMO_FIELDS = (
+    "language", "mood", "store_name", "store_description", "location_text", "latitude", "longitude", "variants",
+)
+
+async def _promo_for_group(request: Request, n: Optional[int], fields: dict, directive: str,
+                           timer: StageTimer, deadline: Deadline,
+                           priority: int = upstream.INTERACTIVE) -> Tuple[dict, str]:
+    """
+    그룹 N 의 이미지 + 정규화된 입력(fields) → (응답 본문, X-Cache 값).
+    단건(/v1/generate-promo)과 일괄(/v1/generate-promo/batch)이 같이 쓴다. 실패는 HTTPException.
+    """
+    with timer.stage("resolve"):
+        food_ai_path, store_img_paths, image_urls = _resolve_group_images(request, n)
+
+    # 2) 프롬프트
+    prompt = build_promo_prompt(**fields)
 
-    # 3) 모델 입력 parts (텍스트 + 이미지)
-    parts: List[dict] = [{"text": prompt}]
     img_for_model: List[str] = []
     img_for_model.extend(store_img_paths)
     if food_ai_path:
         img_for_model.append(food_ai_path)
-    parts += filepaths_to_inline_parts(img_for_model)
 
-    # 4) Gemini 호출
-    url = f"{GEMINI_ENDPOINT}?key={GEMINI_API_KEY}"
-    payload = {"contents": [{"parts": parts}]}
-    try:
-        r = requests.post(url, headers={"Content-Type": "application/json"}, json=payload, timeout=90)
-        r.raise_for_status()
-        resp_json = r.json()
-    except requests.exceptions.Timeout:
-        raise HTTPException(status_code=504, detail="LLM 호출 타임아웃(90s)")
-    except requests.HTTPError as e:
-        raise HTTPException(status_code=502, detail=f"LLM HTTP 오류: {e.response.status_code} {e.response.text[:300]}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM 호출 실패: {repr(e)}")
+    # 3) 캐시 키: 정규화 입력 + 프롬프트 + 첨부 이미지 내용 해시
+    with timer.stage("cache_key"):
+        cache_key = await _promo_cache_key(prompt, img_for_model, *(fields[k] for k in _PROMO_FIELDS))
 
-    # 5) 응답 파싱
-    raw = ""
-    try:
-        cands = resp_json.get("candidates", [])
-        if cands:
-            parts_out = cands[0].get("content", {}).get("parts", [])
-            raw = "".join(p.get("text", "") for p in parts_out).strip()
-    except Exception:
-        pass
-    if not raw:
-        raise HTTPException(status_code=502, detail="모델 응답이 비어 있습니다.")
+    async def _generate() -> Tuple[str, dict]:
+        # Gemini 호출 (공유 커넥션 풀). 입력 크기 통계도 같이 돌려줘 공유/캐시 응답에도 붙인다
+        payload_stats: dict = {}
+        with timer.stage("encode"):
+            parts = await _model_parts(prompt, img_for_model, payload_stats)
+        try:
+            with timer.stage("gemini"):
+                resp_json = await deadline.run(gemini.generate_content(parts, priority=priority, key=cache_key))
+        except Exception as e:
+            raise _llm_http_exception(e)
+        text = gemini.response_text(resp_json)
+        if not text:
+            raise HTTPException(status_code=502, detail="모델 응답이 비어 있습니다.")
+        return text, payload_stats
+
+    # 4) 캐시 조회 → 없으면 동일 요청끼리 한 번만 호출(single-flight)
+    entry = promo_cache.get(cache_key) if directive == "default" else None
+    cache_status = "HIT"
+    to_cache = None   # 새로 받은 원문 — variant 를 하나 이상 읽었을 때만 캐시 (깨진 응답을 TTL 동안 재생하지 않게)
+    if entry is None:
+        entry, shared = await promo_flight.do(cache_key, _generate)
+        cache_status = "SHARED" if shared else "MISS"
+        if directive != "no-store" and not shared:
+            to_cache = entry
+    raw, payload_stats = entry
 
     if raw.startswith("```"):
         raw = raw.strip("`")
         if raw.lower().startswith("json"):
             raw = raw[4:].strip()
 
-    # 6) JSON 파싱 + 본문 포맷(문장, \n, 이미지 URL을 모두 공백으로 구분)
+    # 5) JSON 파싱 + 본문 포맷(문장, \n, 이미지 URL을 모두 공백으로 구분)
+    images = _images_block(n, food_ai_path, store_img_paths, image_urls, payload_stats)
     try:
         parsed = json.loads(raw)
         if not isinstance(parsed, dict) or "variants" not in parsed:
@@ -142,22 +262,213 @@ def generate_promo(
                         v.get("body", ""), image_urls
                     )
 
-        parsed["_images"] = {
-            "group": n,
-            "food_ai": os.path.basename(food_ai_path) if food_ai_path else None,
-            "stores": [os.path.basename(p) for p in store_img_paths],
-            "urls": image_urls,
-            "roots": {"food": FOOD_DIR, "store": STORE_DIR},
-        }
-        return JSONResponse(parsed)
+        if to_cache is not None and parsed.get("variants"):
+            promo_cache.set(cache_key, to_cache)
+        parsed["_images"] = images
+        return parsed, cache_status
     except Exception:
-        return JSONResponse({
+        metrics.fallback("promo", "raw_text")
+        return {
             "raw": raw,
-            "_images": {
-                "group": n,
-                "food_ai": os.path.basename(food_ai_path) if food_ai_path else None,
-                "stores": [os.path.basename(p) for p in store_img_paths],
-                "urls": image_urls,
-                "roots": {"food": FOOD_DIR, "store": STORE_DIR},
-            }
-        })
\ No newline at end of file
+            "_images": images,
+        }, cache_status
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/v1/generate-promo/stream")
+async def generate_promo_stream(
+    request: Request,
+    store_name: str = Form(...),
+    mood: str = Form(...),
+    store_description: Optional[str] = Form(None),
+    location_text: Optional[str] = Form(None),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None),
+    variants: int = Form(3),
+    language: str = Form("ko"),
+    cache: str = Query("default", description="default | no-cache | no-store"),
+):
+    """
+    /v1/generate-promo 의 SSE 버전 (Gemini streamGenerateContent).
+    이벤트 순서:
+      meta    {"_images": {...}}
+      variant {"index": i, "variant": {...}}   ← variant 가 닫히는 즉시, 본문 포맷 적용 후
+      done    {"count": k, "raw": (variant 를 하나도 못 읽었을 때만 원문)}
+      error   {"status": 502, "detail": "..."}  ← 실패 시 (done 대신), PROMO_DEADLINE_SEC 초과는 504
+    """
+    store_name, mood, language = _norm(store_name), _norm(mood), _norm(language)
+    store_description, location_text = _norm(store_description), _norm(location_text)
+    deadline = Deadline(PROMO_DEADLINE_SEC)
+
+    n = _latest_group_with_food_ai()
+    food_ai_path, store_img_paths, image_urls = _resolve_group_images(request, n)
+    prompt = build_promo_prompt(
+        language=language, mood=mood, store_name=store_name,
+        store_description=store_description, location_text=location_text,
+        latitude=latitude, longitude=longitude, variants=variants,
+    )
+    img_for_model: List[str] = list(store_img_paths)
+    if food_ai_path:
+        img_for_model.append(food_ai_path)
+
+    cache_key = await _promo_cache_key(
+        prompt, img_for_model, language, mood, store_name, store_description,
+        location_text, latitude, longitude, variants,
+    )
+    directive = _cache_directive(cache, request.headers.get("cache-control"))
+    cached = promo_cache.get(cache_key) if directive == "default" else None   # (원문, 입력 크기 통계)
+
+    def _variant_event(index: int, v: dict) -> str:
+        if "body" in v:
+            v["body"] = format_body_with_newlines_and_images(v.get("body", ""), image_urls)
+        return _sse("variant", {"index": index, "variant": v})
+
+    async def _events():
+        payload_stats: dict = {}
+        parser = VariantStreamParser()
+        yield _sse("meta", {"_images": _images_block(n, food_ai_path, store_img_paths, image_urls, None)})
+
+        if cached is not None:
+            raw, payload_stats = cached
+            for index, v in parser.feed(raw):
+                yield _variant_event(index, v)
+        else:
+            chunks: List[str] = []
+            t0 = time.perf_counter()
+            try:
+                # 인코딩 + 스트림 전체가 요청 예산 안에서 (넘기면 error 504)
+                parts = await deadline.run(_model_parts(prompt, img_for_model, payload_stats))
+                async for text in deadline.iterate(gemini.stream_generate_content(parts)):
+                    chunks.append(text)
+                    for index, v in parser.feed(text):
+                        if index == 0:
+                            metrics.observe_stage("promo_stream", "first_variant", time.perf_counter() - t0)
+                        yield _variant_event(index, v)
+                metrics.observe_stage("promo_stream", "gemini", time.perf_counter() - t0)
+            except Exception as e:
+                err = _llm_http_exception(e)
+                yield _sse("error", {"status": err.status_code, "detail": err.detail})
+                return
+            raw = "".join(chunks).strip()
+            if raw and parser.count > 0 and directive != "no-store":   # 읽은 variant 가 없으면 캐시하지 않음
+                promo_cache.set(cache_key, (raw, payload_stats))
+            if not parser.count:
+                metrics.fallback("promo_stream", "raw_text")
+
+        yield _sse("done", {
+            "count": parser.count,
+            "cache": "HIT" if cached is not None else "MISS",
+            "payload": payload_stats or None,
+            "raw": None if parser.count else raw,
+        })
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _ndjson(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+def _batch_spec(raw) -> Tuple[int, dict]:
+    """일괄 요청의 매장 항목 → (그룹, build_promo_prompt 입력). 잘못된 항목은 ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("매장 항목은 객체여야 합니다.")
+    group = raw.get("group")
+    if isinstance(group, bool) or not isinstance(group, int):
+        raise ValueError("group(정수)이 필요합니다.")
+    store_name, mood = _norm(raw.get("store_name")), _norm(raw.get("mood"))
+    if not store_name or not mood:
+        raise ValueError("store_name, mood 가 필요합니다.")
+    lat, lng = raw.get("latitude"), raw.get("longitude")
+    return group, dict(
+        language=_norm(raw.get("language")) or "ko",
+        mood=mood,
+        store_name=store_name,
+        store_description=_norm(raw.get("store_description")),
+        location_text=_norm(raw.get("location_text")),
+        latitude=float(lat) if lat is not None else None,
+        longitude=float(lng) if lng is not None else None,
+        variants=int(raw.get("variants", 3)),
+    )
+
+@router.post("/v1/generate-promo/batch")
+async def generate_promo_batch(
+    request: Request,
+    cache: str = Query("default", description="default | no-cache | no-store"),
+):
+    """
+    여러 매장의 홍보문구를 한 번에 생성 (주간 캠페인용).
+    JSON 본문:
+      {"stores": [{"group": 12, "store_name": "...", "mood": "...", "store_description": ...,
+                   "location_text": ..., "latitude": ..., "longitude": ..., "variants": 3, "language": "ko"}, ...],
+       "concurrency": 8}
+    - 매장마다 지정한 그룹 N 의 이미지(food/N_food_AI.jpg, store/N_store_*.jpg)를 쓴다 (최신 그룹 X)
+    - 최대 concurrency(≤ PROMO_BATCH_CONCURRENCY)개씩 동시에 생성, Gemini 호출은 BATCH 우선순위
+    - 응답은 NDJSON, 끝나는 순서대로 한 줄씩:
+        {"index": i, "group": N, "status": 200, "cache": "MISS", "result": {...단건 응답과 같은 모양}}
+        {"index": i, "group": N, "status": 4xx/5xx, "detail": "..."}   ← 항목 실패 (배치는 계속)
+      마지막 줄 {"done": true, "count": k, "ok": a, "failed": b, "elapsed_ms": ...}
+    """
+    try:
+        body = await request.json()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"JSON 본문 파싱 오류: {e}")
+    stores = body.get("stores") if isinstance(body, dict) else body
+    if not isinstance(stores, list) or not stores:
+        raise HTTPException(status_code=400, detail="stores 배열에 매장을 하나 이상 지정해야 합니다.")
+    if len(stores) > PROMO_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"매장은 최대 {PROMO_BATCH_MAX_ITEMS}개까지 지정할 수 있습니다.")
+    try:
+        requested = int(body.get("concurrency") or PROMO_BATCH_CONCURRENCY) if isinstance(body, dict) else PROMO_BATCH_CONCURRENCY
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="concurrency 는 정수여야 합니다.")
+    limit = asyncio.Semaphore(max(1, min(requested, PROMO_BATCH_CONCURRENCY)))
+    directive = _cache_directive(cache, request.headers.get("cache-control"))
+
+    async def _one(i: int, raw) -> dict:
+        try:
+            n, fields = _batch_spec(raw)
+        except (TypeError, ValueError) as e:
+            return {"index": i, "group": raw.get("group") if isinstance(raw, dict) else None, "status": 400, "detail": str(e)}
+        async with limit:
+            timer = StageTimer("promo_batch")
+            deadline = Deadline(PROMO_DEADLINE_SEC)   # 차례가 온 뒤부터 잰다
+            try:
+                if not catalog.files(n, "food_ai") and not catalog.files(n, "store"):
+                    raise HTTPException(status_code=404, detail=f"그룹 {n} 에 이미지가 없습니다.")
+                content, cache_status = await _promo_for_group(
+                    request, n, fields, directive, timer, deadline, priority=upstream.BATCH,
+                )
+            except Exception as e:
+                err = _llm_http_exception(e)
+                return {"index": i, "group": n, "status": err.status_code, "detail": err.detail}
+        return {"index": i, "group": n, "status": 200, "cache": cache_status,
+                "timing_ms": round(timer.total_ms(), 1), "result": content}
+
+    async def _lines():
+        t0 = time.perf_counter()
+        tasks = [asyncio.ensure_future(_one(i, raw)) for i, raw in enumerate(stores)]
+        ok = 0
+        try:
+            for fut in asyncio.as_completed(tasks):
+                item = await fut
+                ok += item["status"] == 200
+                yield _ndjson(item)
+        finally:
+            for t in tasks:   # 클라이언트가 끊으면 남은 매장은 취소
+                if not t.done():
+                    t.cancel()
+        log(f"✅ 일괄 홍보문구: {ok}/{len(tasks)} 성공")
+        yield _ndjson({
+            "done": True, "count": len(tasks), "ok": ok, "failed": len(tasks) - ok,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+
+    return StreamingResponse(
+        _lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,21 @@
 # routes_upload_store.py
 from fastapi import APIRouter, File, UploadFile, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from typing import List
-import os, re
-from PIL import Image
+import asyncio, os
+
+import admission
+import blob_store
+import group_index
+import renditions
+from timing import StageTimer
+from upload_decode import DecodeError, UploadTooLarge, read_upload
 
 router = APIRouter()
 
+admission.route("/v1/upload-store-images", "upload")
+
 IMAGE_ROOT = os.getenv("IMAGE_DIR", "/home/ec2-user/BE/img")
 FOOD_DIR   = os.path.join(IMAGE_ROOT, "food")
 STORE_DIR  = os.path.join(IMAGE_ROOT, "store")
@@ -14,31 +23,11 @@ STORE_DIR  = os.path.join(IMAGE_ROOT, "store")
 def _ensure_dir(p: str) -> None:
     os.makedirs(p, exist_ok=True)
 
-def _scan_max_prefix(dir_path: str, pattern: str) -> int:
-    """
-    dir_path 내 파일명에서 정규식 pattern(그룹1=숫자)을 매칭해 최대 앞자리 숫자를 찾는다.
-    """
-    _ensure_dir(dir_path)
-    pat = re.compile(pattern, re.IGNORECASE)
-    max_n = 0
-    for name in os.listdir(dir_path):
-        m = pat.match(name)
-        if m:
-            try:
-                max_n = max(max_n, int(m.group(1)))
-            except ValueError:
-                pass
-    return max_n
-
 def _next_group_index_across() -> int:
     """
-    food/store 두 폴더 모두 검사해서 가장 큰 그룹번호 + 1
-    - food 폴더는 ^(\d+)_food(_AI)?\.jpg
-    - store 폴더는 ^(\d+)_store_\d+\.jpg
+    food/store 전체에서 가장 큰 그룹번호 + 1 (group_index 카운터로 원자적 할당)
     """
-    max_food  = _scan_max_prefix(FOOD_DIR,  r"^(\d+)_food(_AI)?\.jpg$")
-    max_store = _scan_max_prefix(STORE_DIR, r"^(\d+)_store_\d+\.jpg$")
-    return max(max_food, max_store) + 1
+    return group_index.allocate_group()
 
 def _build_public_url(request: Request, subdir: str, filename: str) -> str:
     scheme = request.headers.get("X-Forwarded-Proto", request.url.scheme)
@@ -46,6 +35,15 @@ def _build_public_url(request: Request, subdir: str, filename: str) -> str:
     # nginx: /images/ → /home/ec2-user/BE/img (subdir 포함)
     return f"{scheme}://{host}/images/{subdir}/{filename}"
 
+def _discard(written) -> None:
+    """실패한 업로드에서 이미 써 둔 파일(+파생본) 삭제. blob 은 남아 다음 같은 업로드에서 재사용된다"""
+    for filename, res in written:
+        for info in res.values():
+            try:
+                os.remove(os.path.join(STORE_DIR, info["relpath"]))
+            except OSError:
+                pass
+
 @router.post("/v1/upload-store-images")
 async def upload_store_images(
     request: Request,
@@ -55,26 +53,79 @@ async def upload_store_images(
         raise HTTPException(status_code=400, detail="이미지가 없습니다.")
 
     _ensure_dir(STORE_DIR)
-    n = _next_group_index_across()
+    timer = StageTimer("upload")
 
-    saved = []
-    for i, uf in enumerate(images, start=1):
-        try:
-            img = Image.open(uf.file).convert("RGB")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"이미지 열기 실패: {e}")
-
-        filename = f"{n}_store_{i}.jpg"
-        path = os.path.join(STORE_DIR, filename)
-        try:
-            img.save(path, "JPEG", quality=95)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"이미지 저장 실패: {e}")
+    datas = []
+    with timer.stage("read"):
+        for uf in images:
+            try:
+                datas.append(await read_upload(uf))
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"이미지 읽기 실패: {e}")
+
+    n = await run_in_threadpool(_next_group_index_across)
+    filenames = [f"{n}_store_{i}.jpg" for i in range(1, len(datas) + 1)]
+
+    def _dedup(data: bytes, filename: str):
+        key = blob_store.ingest_key(blob_store.digest_bytes(data))
+        return key, blob_store.lookup_and_link(key, STORE_DIR, filename)
+
+    # 예전에 올린 것과 같은 바이트면 저장된 blob 을 새 이름으로 링크만 (디코딩/인코딩 생략)
+    # 내용 해시도 같은 스레드풀 작업에서 (최대 25MB × 파일 수를 이벤트 루프에서 해시하지 않음)
+    with timer.stage("dedup"):
+        deduped = await asyncio.gather(*[run_in_threadpool(_dedup, d, fn) for d, fn in zip(datas, filenames)])
+    keys = [key for key, _ in deduped]
+    linked = [hit for _, hit in deduped]
+
+    async def _ingest(data: bytes, key: str, filename: str) -> dict:
+        res = await renditions.run(renditions.ingest_image, data, STORE_DIR, filename)
+        await run_in_threadpool(blob_store.remember, key, STORE_DIR, filename)
+        return res
 
+    async def _linked(res: dict) -> dict:
+        return res
+
+    # 나머지는 파일별 디코딩 + full/web/webp/thumb 인코딩을 프로세스 풀에서 병렬로
+    with timer.stage("ingest"):
+        results = await asyncio.gather(
+            *[
+                _ingest(data, key, fn) if hit is None else _linked(hit)
+                for data, key, fn, hit in zip(datas, keys, filenames, linked)
+            ],
+            return_exceptions=True,
+        )
+    del datas
+
+    # 하나라도 실패하면 그룹에 아무것도 기록하지 않는다 (반쯤 채워진 그룹을 promo 가 고르지 않게)
+    errors = [res for res in results if isinstance(res, BaseException)]
+    if errors:
+        written = [(fn, res) for fn, res in zip(filenames, results) if not isinstance(res, BaseException)]
+        await run_in_threadpool(_discard, written)
+        e = errors[0]
+        if isinstance(e, DecodeError):
+            raise HTTPException(status_code=400, detail=str(e))
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"이미지 저장 실패: {e}")
+
+    await run_in_threadpool(lambda: [group_index.record_file(n, "store", fn) for fn in filenames])
+
+    saved = []
+    for filename, res, hit in zip(filenames, results, linked):
+        urls = {
+            size: _build_public_url(request, "store", info["relpath"])
+            for size, info in res.items()
+        }
         saved.append({
             "filename": filename,
-            "path": path,
-            "url": _build_public_url(request, "store", filename),
+            "path": os.path.join(STORE_DIR, filename),
+            # 클라이언트 표시용 기본 URL 은 web 파생본 (원본은 renditions.full)
+            "url": urls.get("web", urls["full"]),
+            "renditions": urls,
+            "bytes": {size: info["bytes"] for size, info in res.items()},
+            "deduplicated": hit is not None,
         })
 
     return JSONResponse({
@@ -82,4 +133,4 @@ async def upload_store_images(
         "count": len(saved),
         "files": saved,
         "note": "음식 가공본은 /v1/outpaint 호출 시 food/ 폴더에 N_food_AI.jpg 로 저장됩니다.",
-    })
+    }, headers={"Server-Timing": timer.header()})
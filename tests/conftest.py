@@ -0,0 +1,16 @@
+# tests/conftest.py
+"""
+모듈들이 import 시점에 환경변수를 읽으므로(IMAGE_DIR, API 키) 테스트 모듈보다 먼저 설정한다.
+이미지/인덱스는 세션 임시 디렉터리에만 쓴다.
+"""
+import os, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="daily-test-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ["IMAGE_DIR"] = _TMP
+os.environ["GROUP_INDEX_PATH"] = os.path.join(_TMP, "group_index.sqlite3")
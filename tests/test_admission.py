@@ -0,0 +1,107 @@
+# tests/test_admission.py
+import asyncio, json
+
+import pytest
+
+import admission
+from admission import Gate, GateFull
+
+
+def test_gate_full_when_queue_is_full():
+    async def main():
+        g = Gate("test_full", 1, 1)
+        assert g.try_enter() is None
+        fut = g.try_enter()
+        assert fut is not None and g.waiting == 1
+        with pytest.raises(GateFull):
+            g.try_enter()
+        g.leave(0.1)
+        assert fut.done() and g.waiting == 0
+    asyncio.run(main())
+
+
+def test_gate_wait_timeout_frees_queue_slot():
+    async def main():
+        g = Gate("test_timeout", 1, 1)
+        assert g.try_enter() is None
+        fut = g.try_enter()
+        with pytest.raises(asyncio.TimeoutError):
+            await g.wait(fut, 0.01)
+        assert g.waiting == 0
+        assert g.try_enter() is not None    # 빠진 자리에 다시 줄 설 수 있다
+    asyncio.run(main())
+
+
+def test_retry_after_is_bounded():
+    async def main():
+        g = Gate("test_retry", 2, 4)
+        assert 1 <= g.retry_after() <= 60
+        g.try_enter()
+        g.leave(1000.0)
+        assert g.retry_after() == 60
+    asyncio.run(main())
+
+
+async def _call(app, path, headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(msg):
+        sent.append(msg)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": list(headers)}
+    await app(scope, receive, send)
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return start["status"], dict(start["headers"]), body
+
+
+def test_middleware_429_503_413(monkeypatch):
+    release = None
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+        monkeypatch.setattr(admission, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+        monkeypatch.setitem(admission._gates, "test_mw", Gate("test_mw", 1, 1))
+        monkeypatch.setitem(admission._routes, ("POST", "/test"), ("test_mw", 1))
+        app = admission.AdmissionMiddleware(slow_app)
+
+        first = asyncio.create_task(_call(app, "/test"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_call(app, "/test"))
+        await asyncio.sleep(0)
+
+        status, headers, body = await _call(app, "/test")
+        assert status == 429 and b"retry-after" in headers
+        assert "detail" in json.loads(body)
+
+        status, headers, _ = await queued             # 대기열에서 타임아웃
+        assert status == 503 and b"retry-after" in headers
+
+        too_big = str(admission.UPLOAD_MAX_BYTES + admission.ADMISSION_FORM_SLACK + 1).encode()
+        status, _, _ = await _call(app, "/test", [(b"content-length", too_big)])
+        assert status == 413
+
+        release.set()
+        status, _, body = await first
+        assert status == 200 and body == b"ok"
+        assert admission._gates["test_mw"].stats()["active"] == 0
+    asyncio.run(main())
+
+
+def test_unregistered_path_passes_through():
+    async def ok_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    status, _, _ = asyncio.run(_call(admission.AdmissionMiddleware(ok_app), "/health"))
+    assert status == 204
@@ -0,0 +1,67 @@
+# tests/test_cache.py
+import asyncio, pickle, threading
+
+import cache
+from cache import TTLCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = TTLCache("test_ttl", max_items=4, ttl_sec=10)
+    c.set("a", 1)
+    clock.now += 9
+    assert c.get("a") == 1
+    clock.now += 2
+    assert c.get("a") is None
+    assert c.stats()["size"] == 0
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_lru_eviction_keeps_recently_read():
+    c = TTLCache("test_lru", max_items=2, ttl_sec=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1          # a 가 최근 사용 → b 가 밀려난다
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.evictions == 1
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    c = TTLCache("test_disk", max_items=1, ttl_sec=60, disk_dir=str(tmp_path),
+                 dumps=pickle.dumps, loads=pickle.loads)
+    c.set("ab01", {"x": 1})
+    c.set("cd02", {"x": 2})
+    assert c.get("ab01") == {"x": 1}
+    assert c.disk_hits == 1
+
+
+def test_async_disk_tier_runs_off_the_loop_thread(tmp_path, monkeypatch):
+    c = TTLCache("test_adisk", max_items=1, ttl_sec=60, disk_dir=str(tmp_path),
+                 dumps=pickle.dumps, loads=pickle.loads)
+    seen = []
+    for name in ("_disk_get", "_disk_set"):
+        fn = getattr(c, name)
+        monkeypatch.setattr(c, name, lambda *a, _fn=fn: seen.append(threading.get_ident()) or _fn(*a))
+
+    async def main():
+        await c.aset("ab01", 1)
+        await c.aset("cd02", 2)
+        assert await c.aget("cd02") == 2        # 메모리 히트: 디스크를 건드리지 않음
+        assert await c.aget("ab01") == 1        # 메모리에서 밀려남 → 디스크
+        assert await c.aget("ef03") is None
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert len(seen) == 4 and loop_thread not in seen
+    assert (c.hits, c.disk_hits, c.misses) == (2, 1, 1)
@@ -0,0 +1,79 @@
+# tests/test_deadline.py
+import asyncio
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+
+
+def test_share_and_timeout_never_exceed_remaining():
+    dl = Deadline(10)
+    assert 0.9 < dl.share(0.1) <= 1.0
+    assert dl.timeout(2) == 2
+    assert dl.timeout() <= 10
+    assert not dl.expired
+
+
+def test_expired_budget():
+    dl = Deadline(0)
+    assert dl.expired and dl.remaining() == 0
+    assert dl.share(0.5) == 0
+    assert dl.to_dict() == {"budget_sec": 0.0, "remaining_sec": 0.0}
+
+
+def test_run_returns_result():
+    async def main():
+        return await Deadline(1).run(asyncio.sleep(0, result="ok"))
+    assert asyncio.run(main()) == "ok"
+
+
+def test_run_times_out_on_share():
+    async def main():
+        dl = Deadline(10)
+        with pytest.raises(asyncio.TimeoutError):
+            await dl.run(asyncio.sleep(1), 0.01)
+        assert not dl.expired
+    asyncio.run(main())
+
+
+def test_run_after_expiry_raises_without_awaiting():
+    async def main():
+        coro = asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await Deadline(0).run(coro)
+        assert coro.cr_frame is None     # 닫혀서 "never awaited" 경고가 없다
+    asyncio.run(main())
+
+
+def test_iterate_bounds_the_whole_stream():
+    closed = []
+
+    async def stream():
+        try:
+            for i in range(100):
+                await asyncio.sleep(0.01)
+                yield i
+        finally:
+            closed.append(True)
+
+    async def main():
+        got = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for i in Deadline(0.05).iterate(stream()):
+                got.append(i)
+        return got
+
+    got = asyncio.run(main())
+    assert 0 < len(got) < 100
+    assert closed == [True]
+
+
+def test_iterate_passes_through_a_short_stream():
+    async def stream():
+        for i in range(3):
+            yield i
+
+    async def main():
+        return [i async for i in Deadline(1).iterate(stream())]
+
+    assert asyncio.run(main()) == [0, 1, 2]
@@ -0,0 +1,46 @@
+# tests/test_gemini_key.py
+import asyncio, threading
+
+import gemini
+
+
+def _capture(monkeypatch):
+    keys = []
+
+    async def call(provider, fn, priority=None, key=None, hedge=None, **kw):
+        keys.append(key)
+        return {}
+
+    monkeypatch.setattr(gemini.upstream, "call", call)
+    return keys
+
+
+def test_caller_key_replaces_body_hash(monkeypatch):
+    keys = _capture(monkeypatch)
+    monkeypatch.setattr(gemini, "_body_key", lambda *a: (_ for _ in ()).throw(AssertionError("hashed body")))
+    image = {"inline_data": {"mime_type": "image/jpeg", "data": "A" * 1000}}
+
+    async def main():
+        await gemini.generate_content([{"text": "p"}, image], key="promo-key")
+        await gemini.generate_content([{"text": "q"}, image], key="promo-key")
+        await gemini.generate_content([{"text": "p"}, image], key="other", coalesce=False)
+
+    asyncio.run(main())
+    assert keys[0] == keys[1] and keys[0] != "promo-key"
+    assert keys[2] is None
+
+
+def test_image_body_is_hashed_off_the_loop(monkeypatch):
+    keys = _capture(monkeypatch)
+    seen = []
+    body_key = gemini._body_key
+    monkeypatch.setattr(gemini, "_body_key", lambda *a: seen.append(threading.get_ident()) or body_key(*a))
+
+    async def main():
+        await gemini.generate_content([{"text": "p"}])
+        await gemini.generate_content([{"text": "p"}, {"inline_data": {"mime_type": "image/png", "data": "AA"}}])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert seen[0] == loop_thread and seen[1] != loop_thread
+    assert all(keys) and keys[0] != keys[1]
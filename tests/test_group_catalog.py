@@ -0,0 +1,50 @@
+# tests/test_group_catalog.py
+import os
+
+from PIL import Image
+
+import group_index
+from group_catalog import GroupCatalog
+
+
+def _save(directory: str, group: int, kind: str, filename: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    Image.new("RGB", (8, 8)).save(path)
+    group_index.record_file(group, kind, filename)
+    return path
+
+
+def test_rescan_drops_files_deleted_from_disk():
+    a, b = group_index.allocate_group(), group_index.allocate_group()
+    store_1 = _save(group_index.STORE_DIR, a, "store", f"{a}_store_1.jpg")
+    _save(group_index.STORE_DIR, a, "store", f"{a}_store_2.jpg")
+    _save(group_index.FOOD_DIR, a, "food_ai", f"{a}_food_AI.jpg")
+    food_ai_b = _save(group_index.FOOD_DIR, b, "food_ai", f"{b}_food_AI.jpg")
+
+    cat = GroupCatalog(sync_sec=3600, rescan_sec=3600)
+    cat.load()
+    assert cat.files(a, "store") == [f"{a}_store_1.jpg", f"{a}_store_2.jpg"]
+    assert cat.latest_group_with_food_ai() == b
+
+    os.remove(store_1)
+    os.remove(food_ai_b)
+    cat.sync(force=True)
+    assert cat.files(a, "store") == [f"{a}_store_2.jpg"]
+    assert cat.files(b, "food_ai") == []
+    assert cat.latest_group_with_food_ai() == a
+
+
+def test_hook_adds_survive_a_concurrent_rescan(monkeypatch):
+    n = group_index.allocate_group()
+    cat = GroupCatalog(sync_sec=3600, rescan_sec=3600)
+    rows_since = group_index.rows_since
+
+    def rows_then_hook(last_id):
+        rows = rows_since(last_id)
+        cat.add(n, "store", f"{n}_store_9.jpg")     # 인덱스를 읽은 뒤, 교체 전에 들어온 쓰기
+        return rows
+
+    monkeypatch.setattr(group_index, "rows_since", rows_then_hook)
+    cat.load()
+    assert cat.files(n, "store") == [f"{n}_store_9.jpg"]
@@ -0,0 +1,25 @@
+# tests/test_group_index.py
+from concurrent.futures import ThreadPoolExecutor
+
+import group_index
+
+
+def test_allocate_food_group_is_unique_under_threads():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        got = list(pool.map(lambda _: group_index.allocate_food_group(), range(64)))
+    assert len(set(got)) == len(got)
+    assert sorted(got) == list(range(min(got), min(got) + len(got)))
+
+
+def test_allocate_group_is_unique_under_threads():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        got = list(pool.map(lambda _: group_index.allocate_group(), range(64)))
+    assert len(set(got)) == len(got)
+
+
+def test_food_group_advances_store_counter():
+    n = group_index.allocate_group()
+    # food 번호가 store 번호를 앞지르면 다음 store 그룹은 그 뒤에서 시작한다
+    f = [group_index.allocate_food_group() for _ in range(n + 2)][-1]
+    assert f > n
+    assert group_index.allocate_group() == f + 1
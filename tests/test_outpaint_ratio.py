@@ -0,0 +1,30 @@
+# tests/test_outpaint_ratio.py
+import pytest
+from fastapi import HTTPException
+
+from openai_seojae import OUTPAINT_BATCH_MAX_RATIOS, _parse_ratio, _parse_ratio_list
+
+
+def test_parse_ratio():
+    assert _parse_ratio("1:1") == 1.0
+    assert _parse_ratio(" 4 : 5 ") == 0.8
+
+
+@pytest.mark.parametrize("ratio", ["", "abc", "4-5", "0:1", "1:0", "1000:1"])
+def test_parse_ratio_rejects_with_400(ratio):
+    with pytest.raises(HTTPException) as e:
+        _parse_ratio(ratio)
+    assert e.value.status_code == 400
+
+
+def test_parse_ratio_list_dedups_in_order():
+    out = _parse_ratio_list(["1:1", "4:5,16:9", "04:05"])
+    assert [label for label, _ in out] == ["1:1", "4:5", "16:9"]
+
+
+@pytest.mark.parametrize("values", [[], [" , "], ["1:1,2:0"],
+                                    [",".join(f"{i}:1" for i in range(1, OUTPAINT_BATCH_MAX_RATIOS + 2))]])
+def test_parse_ratio_list_rejects_with_400(values):
+    with pytest.raises(HTTPException) as e:
+        _parse_ratio_list(values)
+    assert e.value.status_code == 400
@@ -0,0 +1,48 @@
+# tests/test_renditions.py
+from io import BytesIO
+
+from PIL import Image
+
+from renditions import _strip_jpeg_metadata, ingest_image
+
+
+def _jpeg(size, orientation=None, comment=None) -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"             # Make
+    exif[0x8825] = {1: "N"}                 # GPS IFD
+    if orientation:
+        exif[0x0112] = orientation
+    buf = BytesIO()
+    params = {"comment": comment} if comment else {}
+    Image.new("RGB", size, (200, 80, 40)).save(buf, format="JPEG", exif=exif, **params)
+    return buf.getvalue()
+
+
+def _open(path):
+    with Image.open(path) as img:
+        return img.size, dict(img.getexif()), img.info.get("comment"), img.tobytes()
+
+
+def test_strip_keeps_pixels_and_drops_metadata():
+    data = _jpeg((64, 48), comment=b"secret")
+    stripped = _strip_jpeg_metadata(data)
+    with Image.open(BytesIO(data)) as a, Image.open(BytesIO(stripped)) as b:
+        assert a.tobytes() == b.tobytes()
+        assert not b.getexif() and "comment" not in b.info
+    assert _strip_jpeg_metadata(b"not a jpeg") is None
+
+
+def test_ingest_upright_jpeg_publishes_without_exif(tmp_path):
+    out = ingest_image(_jpeg((640, 480)), str(tmp_path), "1_store_1.jpg")
+    size, exif, _, _ = _open(tmp_path / "1_store_1.jpg")
+    assert size == (640, 480) == tuple(out["full"]["size"])
+    assert exif == {}
+
+
+def test_ingest_rotated_jpeg_applies_orientation(tmp_path):
+    out = ingest_image(_jpeg((640, 480), orientation=6), str(tmp_path), "1_store_1.jpg")
+    size, exif, _, _ = _open(tmp_path / "1_store_1.jpg")
+    assert size == (480, 640) == tuple(out["full"]["size"])
+    assert exif == {}
+    web = out["web"]["size"]
+    assert web[1] > web[0]                  # full 과 파생본의 방향이 같다
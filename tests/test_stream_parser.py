@@ -0,0 +1,36 @@
+# tests/test_stream_parser.py
+from utils import VariantStreamParser
+
+
+def _v(i: int) -> str:
+    return '{"title": "t%d", "body": "b%d"}' % (i, i)
+
+
+def test_index_counts_every_variant_in_one_chunk():
+    p = VariantStreamParser()
+    out = p.feed('{"variants": [%s, %s, %s]}' % (_v(0), _v(1), _v(2)))
+    assert [i for i, _ in out] == [0, 1, 2]
+    assert [v["title"] for _, v in out] == ["t0", "t1", "t2"]
+    assert p.finished and p.count == 3
+
+
+def test_index_continues_across_chunks():
+    text = '```json\n{"variants": [%s, %s, %s]}\n```' % (_v(0), _v(1), _v(2))
+    p = VariantStreamParser()
+    got = []
+    for k in range(0, len(text), 7):
+        got.extend(p.feed(text[k:k + 7]))
+    assert [i for i, _ in got] == [0, 1, 2]
+    assert [v["body"] for _, v in got] == ["b0", "b1", "b2"]
+
+
+def test_braces_and_quotes_inside_strings():
+    p = VariantStreamParser()
+    out = p.feed('{"variants": [{"title": "a } \\" {", "body": "x"}]}')
+    assert out == [(0, {"title": 'a } " {', "body": "x"})]
+
+
+def test_no_variants_key_yields_nothing():
+    p = VariantStreamParser()
+    assert p.feed('{"error": "nope"}') == []
+    assert p.count == 0 and not p.started
@@ -0,0 +1,44 @@
+# tests/test_upload_decode.py
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from upload_decode import DecodeError, UploadTooLarge, decode_image, open_bounded
+
+
+def _jpeg(w: int, h: int, mode: str = "RGB", fmt: str = "JPEG") -> bytes:
+    buf = BytesIO()
+    Image.new(mode, (w, h), 128).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_pixel_limit_is_checked_from_header():
+    with pytest.raises(UploadTooLarge):
+        open_bounded(_jpeg(200, 100), max_pixels=199 * 100)
+    open_bounded(_jpeg(200, 100), max_pixels=200 * 100).close()
+
+
+def test_decode_image_bounds_long_edge():
+    img = decode_image(_jpeg(1600, 400), max_edge=256)
+    assert max(img.size) <= 256 and img.mode == "RGB"
+    assert img.size[0] > img.size[1]
+
+
+def test_decode_image_keeps_size_without_max_edge():
+    img = decode_image(_jpeg(300, 200, mode="RGBA", fmt="PNG"))
+    assert img.size == (300, 200) and img.mode == "RGB"
+
+
+def test_decode_image_applies_exif_orientation():
+    buf = BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6                     # 90° 회전
+    Image.new("RGB", (400, 200)).save(buf, format="JPEG", exif=exif)
+    img = decode_image(buf.getvalue(), max_edge=100)
+    assert img.size[1] > img.size[0]
+
+
+def test_decode_image_rejects_garbage():
+    with pytest.raises(DecodeError):
+        decode_image(b"not an image")
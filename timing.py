@@ -0,0 +1,51 @@
+# timing.py
+"""
+요청 단위 단계별 소요 시간 → Server-Timing 응답 헤더.
+
+    t = StageTimer()
+    with t.stage("gemini"):
+        ...
+    return JSONResponse(..., headers={"Server-Timing": t.header()})
+
+벤치마크(bench.py)와 브라우저 개발자 도구가 이 헤더로 단계별 시간을 읽는다.
+pipeline 을 주면 같은 값이 app_stage_seconds{pipeline, stage} 지표에도 기록된다.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import metrics
+
+
+class StageTimer:
+    def __init__(self, pipeline: Optional[str] = None):
+        self.pipeline = pipeline
+        self.stages: Dict[str, float] = {}   # name -> ms (같은 이름은 누적)
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed * 1000
+            if self.pipeline:
+                metrics.observe_stage(self.pipeline, name, elapsed)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def header(self) -> str:
+        items = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        items.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(items)
+
+
+def stages_header(stages: Dict[str, dict]) -> str:
+    """Job.stages({"name": {"elapsed_ms": ..}}) → Server-Timing 값"""
+    return ", ".join(
+        f"{name};dur={st['elapsed_ms']:.1f}"
+        for name, st in stages.items() if st.get("elapsed_ms") is not None
+    )
@@ -0,0 +1,94 @@
+# upload_decode.py
+"""
+업로드 이미지 디코딩 (메모리 상한).
+
+- read_upload      : 청크 단위로 읽으며 UPLOAD_MAX_BYTES 초과 시 즉시 중단 (→ 413)
+- open_bounded     : 헤더만 읽어 가로×세로가 UPLOAD_MAX_PIXELS 를 넘으면 거절 (픽셀 디코딩 전, → 413)
+- decode_image     : JPEG 는 draft(DCT 축소) 로 목표 해상도 근처에서 바로 디코딩
+                     → thumbnail → EXIF 회전 보정 → RGB. 중간 버퍼는 즉시 닫는다
+최대 메모리는 입력 크기가 아니라 max_edge(출력 크기)에 비례한다.
+"""
+import os
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+UPLOAD_MAX_BYTES  = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(64_000_000)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 헤더 검사는 open_bounded 가 하므로 PIL 자체 폭탄 검사는 그보다 느슨하게 둔다
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, UPLOAD_MAX_PIXELS)
+
+
+class DecodeError(ValueError):
+    """업로드가 이미지로 열리지 않을 때 (→ 400)"""
+
+
+class UploadTooLarge(ValueError):
+    """바이트/픽셀 상한 초과 (→ 413)"""
+
+
+async def read_upload(uf, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """UploadFile 을 청크로 읽어 bytes 로. 상한을 넘는 순간 나머지는 읽지 않는다"""
+    size = getattr(uf, "size", None)
+    if size is not None and size > max_bytes:
+        raise UploadTooLarge(f"파일이 너무 큽니다: {uf.filename} ({size} > {max_bytes} bytes)")
+    buf = bytearray()
+    while True:
+        chunk = await uf.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise UploadTooLarge(f"파일이 너무 큽니다: {uf.filename} (> {max_bytes} bytes)")
+    await uf.close()   # 디스크로 스풀된 임시 파일도 바로 반납
+    return bytes(buf)
+
+
+def open_bounded(data: bytes, max_pixels: int = UPLOAD_MAX_PIXELS) -> Image.Image:
+    """지연(lazy) 오픈 + 픽셀 수 검사. 반환 이미지는 아직 디코딩되지 않은 상태"""
+    try:
+        img = Image.open(BytesIO(data))
+    except Exception as e:
+        raise DecodeError(f"이미지 열기 실패: {e}")
+    w, h = img.size
+    if w * h > max_pixels:
+        img.close()
+        raise UploadTooLarge(f"이미지 해상도가 너무 큽니다: {w}x{h} (> {max_pixels} px)")
+    return img
+
+
+def decode_image(data: bytes, max_edge: Optional[int] = None,
+                 max_pixels: int = UPLOAD_MAX_PIXELS) -> Image.Image:
+    """
+    bytes → RGB 이미지 (긴 변 ≤ max_edge, EXIF 방향 적용).
+    max_edge 가 None 이면 원본 해상도 그대로(픽셀 상한만 적용).
+    """
+    src = open_bounded(data, max_pixels)
+    try:
+        if max_edge:
+            # 정사각 박스로 요청 → 회전 전/후 어느 쪽이든 긴 변 기준으로 충분한 배율을 고른다
+            src.draft("RGB", (max_edge, max_edge))
+        orientation = src.getexif().get(0x0112)
+        src.load()
+    except UploadTooLarge:
+        raise
+    except Exception as e:
+        src.close()
+        raise DecodeError(f"이미지 디코딩 실패: {e}")
+
+    img = src
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    if orientation and orientation != 1:
+        # 축소 후에 회전 → 큰 원본을 한 번 더 복사하지 않는다
+        img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        rgb = img.convert("RGB")
+        img.close()
+        img = rgb
+    if img is not src:
+        src.close()
+    return img
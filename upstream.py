@@ -0,0 +1,375 @@
+# upstream.py
+"""
+외부 LLM/이미지 API 호출 스케줄러 (Gemini / OpenAI).
+
+    resp = await upstream.call("gemini", lambda: client.post(...), priority=upstream.INTERACTIVE, key=...)
+
+- 제공자별 동시 실행 상한 + 토큰 버킷(초당 요청 수, 버스트) — UPSTREAM_LIMITS
+- 우선순위: INTERACTIVE(promo, ad-image 프롬프트) 가 BATCH(outpaint 번역/생성) 보다 먼저 슬롯을 받는다
+- 재시도: 429/5xx/타임아웃/연결 오류만, 지터를 준 지수 백오프(full jitter). Retry-After 가 있으면 그만큼 기다린다
+- key 를 주면 같은 key 로 동시에 들어온 호출은 한 번만 보낸다(single-flight, 바이트가 같은 요청에만 사용)
+- hedge 를 주면(멱등 호출 전용) 첫 호출이 그 종류의 최근 지연 p{UPSTREAM_HEDGE_PERCENTILE} 를 넘길 때
+  슬롯/토큰이 바로 있으면 같은 요청을 하나 더 보내고 먼저 성공한 쪽을 쓴다 (나머지는 취소)
+
+UPSTREAM_LIMITS = "제공자:동시실행:초당요청:버스트,..."  (초당요청 0 이면 속도 제한 없음)
+    기본 "gemini:8:5:10,openai:4:0.8:4"
+대기 시간이 UPSTREAM_QUEUE_TIMEOUT 을 넘으면 UpstreamBusy (라우트에서 503 + Retry-After)
+UPSTREAM_HEDGE_PERCENTILE=0 이면 헤지하지 않는다. 표본이 UPSTREAM_HEDGE_MIN_SAMPLES 개 모이기 전에도 하지 않는다.
+"""
+import asyncio, heapq, itertools, math, os, random, time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from cache import SingleFlight
+
+UPSTREAM_LIMITS          = os.getenv("UPSTREAM_LIMITS", "gemini:8:5:10,openai:4:0.8:4")
+UPSTREAM_MAX_RETRIES     = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE    = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX     = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+UPSTREAM_RETRY_AFTER_MAX = float(os.getenv("UPSTREAM_RETRY_AFTER_MAX", "30"))
+UPSTREAM_QUEUE_TIMEOUT   = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "60"))
+UPSTREAM_HEDGE_PERCENTILE  = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_HEDGE_WINDOW      = int(os.getenv("UPSTREAM_HEDGE_WINDOW", "200"))
+UPSTREAM_HEDGE_MIN_DELAY   = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.2"))
+
+INTERACTIVE = 0
+BATCH = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class UpstreamBusy(Exception):
+    """슬롯/토큰을 UPSTREAM_QUEUE_TIMEOUT 안에 받지 못함"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} 호출 대기열이 가득 찼습니다. 잠시 후 다시 시도해 주세요.")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class _Limiter:
+    """동시 실행 슬롯 + 토큰 버킷. 대기자는 (우선순위, 도착 순) 으로 깨운다 (이벤트 루프 전용)"""
+
+    def __init__(self, name: str, concurrency: int, rate: float, burst: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.rate = max(0.0, rate)
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        metrics.UPSTREAM_ACTIVE.labels(name).set_function(lambda: self._active)
+        metrics.UPSTREAM_WAITING.labels(name).set_function(
+            lambda: sum(1 for w in self._waiters if not w[2].done())
+        )
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _token_wait(self) -> float:
+        """토큰 1개를 쓸 수 있을 때까지 남은 초 (0 이면 지금 가능)"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def _take(self) -> None:
+        if self.rate:
+            self._tokens -= 1
+        self._active += 1
+
+    def _wake(self) -> None:
+        self._timer = None
+        while self._waiters and self._active < self.concurrency:
+            if self._waiters[0][2].done():          # 취소/타임아웃된 대기자
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._token_wait()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._wake)
+                return
+            _, _, fut = heapq.heappop(self._waiters)
+            self._take()
+            fut.set_result(None)
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        if self._active < self.concurrency and not self._waiters and self._token_wait() == 0:
+            self._take()
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.release()                      # 슬롯을 받은 직후 취소됨
+            else:
+                fut.cancel()
+            raise
+
+    def try_acquire(self) -> bool:
+        """기다리지 않고 슬롯+토큰을 받을 수 있으면 받고 True (헤지 요청용, 대기자가 있으면 양보)"""
+        if self._active < self.concurrency and not any(not w[2].done() for w in self._waiters) \
+                and self._token_wait() == 0:
+            self._take()
+            return True
+        return False
+
+    def release(self) -> None:
+        self._active -= 1
+        self._wake()
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "concurrency": self.concurrency, "rate": self.rate, "burst": self.burst,
+            "active": self._active, "waiting": sum(1 for w in self._waiters if not w[2].done()),
+            "tokens": round(self._tokens, 2),
+        }
+
+
+def _parse_limits(spec: str) -> Dict[str, _Limiter]:
+    out: Dict[str, _Limiter] = {}
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) < 2 or not parts[0]:
+            continue
+        try:
+            rate = float(parts[2]) if len(parts) > 2 else 0.0
+            burst = float(parts[3]) if len(parts) > 3 else max(1.0, rate)
+            out[parts[0]] = _Limiter(parts[0], int(parts[1]), rate, burst)
+        except ValueError:
+            print(f"⚠️ UPSTREAM_LIMITS 항목 무시: {item!r}")
+    return out
+
+
+_limiters = _parse_limits(UPSTREAM_LIMITS)
+_flights: Dict[str, SingleFlight] = {}
+
+
+class _Latency:
+    """최근 성공 호출 지연(초) 표본 → 헤지 시작 시점"""
+
+    def __init__(self, window: int):
+        self._samples: deque = deque(maxlen=max(1, window))
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < UPSTREAM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+_latencies: Dict[str, _Latency] = {}
+
+
+def hedge_delay(name: str) -> Optional[float]:
+    """name 종류 호출의 헤지 시작 시점(초). 꺼져 있거나 표본이 부족하면 None"""
+    if UPSTREAM_HEDGE_PERCENTILE <= 0 or name not in _latencies:
+        return None
+    p = _latencies[name].percentile(UPSTREAM_HEDGE_PERCENTILE)
+    return None if p is None else max(UPSTREAM_HEDGE_MIN_DELAY, p)
+
+
+def _record_latency(name: Optional[str], seconds: float) -> None:
+    if name:
+        lat = _latencies.get(name)
+        if lat is None:
+            lat = _latencies[name] = _Latency(UPSTREAM_HEDGE_WINDOW)
+        lat.add(seconds)
+
+
+def _limiter(provider: str) -> _Limiter:
+    lim = _limiters.get(provider)
+    if lim is None:
+        lim = _limiters[provider] = _Limiter(provider, 16, 0.0, 1.0)
+    return lim
+
+
+def status_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """응답의 Retry-After(초 또는 HTTP 날짜) → 초"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(exc).__name__.lower()
+    # httpx.TimeoutException/TransportError, openai.APITimeoutError/APIConnectionError
+    return any(s in name for s in ("timeout", "connect", "transport", "network", "protocol"))
+
+
+def _backoff_delay(attempt: int, exc: BaseException) -> Optional[float]:
+    """다음 시도까지 기다릴 초. Retry-After 가 UPSTREAM_RETRY_AFTER_MAX 를 넘으면 None(재시도 안 함)"""
+    ra = retry_after_of(exc)
+    if ra is not None:
+        if ra > UPSTREAM_RETRY_AFTER_MAX:
+            return None
+        return ra + random.uniform(0, UPSTREAM_BACKOFF_BASE)
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def retry_delay(provider: str, attempt: int, exc: BaseException, retries: Optional[int] = None) -> Optional[float]:
+    """
+    attempt 번째(0부터) 실패 후 재시도할지 결정 → 기다릴 초, 재시도하지 않으면 None.
+    재시도하면 app_upstream_retries_total 에 기록한다.
+    """
+    retries = UPSTREAM_MAX_RETRIES if retries is None else retries
+    if attempt >= retries or isinstance(exc, UpstreamBusy) or not is_retryable(exc):
+        return None
+    delay = _backoff_delay(attempt, exc)
+    if delay is None:
+        return None
+    kind = str(status_of(exc) or type(exc).__name__.lower())
+    metrics.UPSTREAM_RETRIES.labels(provider, kind).inc()
+    metrics.log(f"↻ {provider} 재시도 {attempt + 1}/{retries} ({kind}, {delay:.2f}s 후)")
+    return delay
+
+
+class slot:
+    """
+    async with upstream.slot("gemini", priority): ...
+    스트리밍처럼 호출 전체 동안 슬롯을 잡아야 할 때 (재시도는 호출자가 처리)
+    """
+
+    def __init__(self, provider: str, priority: int = INTERACTIVE):
+        self.provider = provider
+        self.priority = priority
+        self._lim = _limiter(provider)
+
+    async def __aenter__(self):
+        t0 = time.perf_counter()
+        try:
+            await self._lim.acquire(self.priority, UPSTREAM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.UPSTREAM_REJECTED.labels(self.provider).inc()
+            raise UpstreamBusy(self.provider, max(1.0, UPSTREAM_BACKOFF_MAX))
+        finally:
+            metrics.UPSTREAM_WAIT_SECONDS.labels(
+                self.provider, _PRIORITY_NAMES.get(self.priority, str(self.priority)),
+            ).observe(time.perf_counter() - t0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._lim.release()
+
+
+async def _call_with_retry(provider: str, fn: Callable[[], Awaitable[Any]], priority: int, retries: int,
+                           hedge: Optional[str] = None) -> Any:
+    attempt = 0
+    while True:
+        try:
+            async with slot(provider, priority):
+                t0 = time.perf_counter()
+                value = await fn()
+                _record_latency(hedge, time.perf_counter() - t0)
+                return value
+        except Exception as e:
+            delay = retry_delay(provider, attempt, e, retries)
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def _hedge_attempt(lim: _Limiter, fn: Callable[[], Awaitable[Any]], hedge: str) -> Any:
+    """try_acquire 로 이미 받은 슬롯으로 1회 호출 (재시도 없음)"""
+    try:
+        t0 = time.perf_counter()
+        value = await fn()
+        _record_latency(hedge, time.perf_counter() - t0)
+        return value
+    finally:
+        lim.release()
+
+
+async def _call_hedged(provider: str, fn: Callable[[], Awaitable[Any]], priority: int, retries: int,
+                       hedge: str) -> Any:
+    primary = asyncio.ensure_future(_call_with_retry(provider, fn, priority, retries, hedge))
+    delay = hedge_delay(hedge)
+    tasks = [primary]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            lim = _limiter(provider)
+            if not done and lim.try_acquire():
+                metrics.UPSTREAM_HEDGED.labels(provider).inc()
+                tasks.append(asyncio.ensure_future(_hedge_attempt(lim, fn, hedge)))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is not primary:
+                        metrics.UPSTREAM_HEDGE_WINS.labels(provider).inc()
+                    return t.result()
+                if t is primary or error is None:
+                    error = t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+
+async def call(provider: str, fn: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE,
+               key: Optional[str] = None, retries: Optional[int] = None, hedge: Optional[str] = None) -> Any:
+    """
+    fn() 을 제공자 슬롯/토큰을 받은 뒤 실행하고, 재시도 가능한 오류면 백오프 후 다시 실행.
+    key 가 있으면 같은 key 의 진행 중 호출 결과를 공유한다 (앞선 호출의 우선순위로 실행).
+    hedge 는 지연 표본을 모을 호출 종류 이름 (예: "gemini:모델") — 멱등 호출에만 준다.
+    """
+    retries = UPSTREAM_MAX_RETRIES if retries is None else retries
+
+    def _run() -> Awaitable[Any]:
+        if hedge is None:
+            return _call_with_retry(provider, fn, priority, retries)
+        return _call_hedged(provider, fn, priority, retries, hedge)
+
+    if key is None:
+        return await _run()
+    flight = _flights.setdefault(provider, SingleFlight())
+    value, shared = await flight.do(key, _run)
+    if shared:
+        metrics.UPSTREAM_COALESCED.labels(provider).inc()
+    return value
+
+
+def stats() -> dict:
+    return {name: {**lim.stats(), "inflight_keys": _flights[name].inflight() if name in _flights else 0}
+            for name, lim in _limiters.items()}
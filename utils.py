@@ -1,12 +1,17 @@
 import base64
+import hashlib
 import io
 import json
+import threading
 from typing import List, Optional, Tuple
 from fastapi import UploadFile
 from PIL import Image, ImageOps, ImageStat, ImageDraw, ImageFont
 import re
 import os
 
+from cache import TTLCache, make_key
+from upload_decode import UPLOAD_MAX_BYTES, UploadTooLarge, decode_image
+
 def files_to_inline_parts(files: Optional[List[UploadFile]]) -> List[dict]:
     parts: List[dict] = []
     if not files:
@@ -27,26 +32,102 @@ def files_to_inline_parts(files: Optional[List[UploadFile]]) -> List[dict]:
         })
     return parts
 
-def filepaths_to_inline_parts(paths: Optional[List[str]]) -> List[dict]:
+# Gemini 에 보낼 이미지: 긴 변 GEMINI_IMAGE_MAX_EDGE 이하로 줄이고 JPEG GEMINI_IMAGE_QUALITY 로 재인코딩
+GEMINI_IMAGE_MAX_EDGE = int(os.getenv("GEMINI_IMAGE_MAX_EDGE", "1024"))
+GEMINI_IMAGE_QUALITY  = int(os.getenv("GEMINI_IMAGE_QUALITY", "85"))
+
+# (path, mtime, size, max_edge, quality) → (base64 문자열, 원본 바이트 수, 인코딩 바이트 수)
+_inline_cache = TTLCache("inline_image", int(os.getenv("INLINE_IMAGE_CACHE_MAX_ITEMS", "512")),
+                         float(os.getenv("INLINE_IMAGE_CACHE_TTL_SEC", "86400")))
+
+def _encode_for_model(path: str, src_size: int) -> Tuple[str, int]:
+    with Image.open(path) as img:
+        src_format = img.format
+        img.draft("RGB", (GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_MAX_EDGE))  # JPEG 는 DCT 축소 디코딩
+        img = img.convert("RGB")
+        resized = max(img.size) > GEMINI_IMAGE_MAX_EDGE
+        if resized:
+            img.thumbnail((GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_MAX_EDGE), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=GEMINI_IMAGE_QUALITY, optimize=True)
+    data = buf.getvalue()
+    if not resized and src_format == "JPEG" and src_size <= len(data):
+        # 이미 작은 JPEG 이면 원본이 더 작을 수 있음
+        with open(path, "rb") as f:
+            data = f.read()
+    return base64.b64encode(data).decode("utf-8"), len(data)
+
+def filepaths_to_inline_parts(paths: Optional[List[str]], stats: Optional[dict] = None) -> List[dict]:
+    """
+    파일 → Gemini inlineData parts.
+    - 긴 변 GEMINI_IMAGE_MAX_EDGE 로 축소 + JPEG 재인코딩
+    - 인코딩 결과는 (path, mtime, size) 기준으로 캐시 → 같은 그룹 반복 요청은 준비 비용 없음
+    - stats 를 넘기면 files / source_bytes / encoded_bytes / base64_bytes / cache_hits 를 채운다
+    """
     parts: List[dict] = []
+    if stats is not None:
+        stats.update(files=0, source_bytes=0, encoded_bytes=0, base64_bytes=0, cache_hits=0)
     if not paths:
         return parts
     for p in paths:
-        if not p or not os.path.exists(p):
+        if not p:
             continue
         try:
-            with open(p, "rb") as f:
-                data = f.read()
-        except Exception:
+            st = os.stat(p)
+        except OSError:
             continue
+        key = make_key(p, st.st_mtime_ns, st.st_size, GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_QUALITY)
+        hit = _inline_cache.get(key)
+        if hit is None:
+            try:
+                b64, enc_size = _encode_for_model(p, st.st_size)
+            except Exception:
+                continue
+            _inline_cache.set(key, (b64, enc_size))
+        else:
+            b64, enc_size = hit
+        if stats is not None:
+            stats["files"] += 1
+            stats["source_bytes"] += st.st_size
+            stats["encoded_bytes"] += enc_size
+            stats["base64_bytes"] += len(b64)
+            stats["cache_hits"] += 1 if hit is not None else 0
         parts.append({
             "inlineData": {
-                "data": base64.b64encode(data).decode("utf-8"),
+                "data": b64,
                 "mimeType": "image/jpeg",
             }
         })
     return parts
 
+_digest_memo: dict = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path: str) -> Optional[str]:
+    """
+    파일 내용 sha256. (path, mtime, size) 가 같으면 다시 읽지 않는다.
+    파일이 없으면 None.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    sig = (st.st_mtime_ns, st.st_size)
+    with _digest_lock:
+        hit = _digest_memo.get(path)
+    if hit and hit[0] == sig:
+        return hit[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digest_lock:
+        if len(_digest_memo) > 4096:
+            _digest_memo.clear()
+        _digest_memo[path] = (sig, digest)
+    return digest
+
 def build_promo_prompt(language: str, mood: str, store_name: str,
                        store_description: Optional[str], location_text: Optional[str],
                        latitude: Optional[float], longitude: Optional[float],
@@ -82,12 +163,13 @@ def build_promo_prompt(language: str, mood: str, store_name: str,
 }}
 """.strip()
 
-def read_image_from_upload(file: UploadFile) -> Image.Image:
-    data = file.file.read()
+def read_image_from_upload(file: UploadFile, max_edge: Optional[int] = None) -> Image.Image:
+    data = file.file.read(UPLOAD_MAX_BYTES + 1)
     if not data:
         raise ValueError("빈 파일")
-    img = Image.open(io.BytesIO(data)).convert("RGB")
-    return img
+    if len(data) > UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"파일이 너무 큽니다: {file.filename} (> {UPLOAD_MAX_BYTES} bytes)")
+    return decode_image(data, max_edge)
 
 def resize_image(img: Image.Image, target_width: int, target_height: int, mode: str) -> Image.Image:
     if mode == "crop":
@@ -186,4 +268,68 @@ def format_body_with_newlines_and_images(text: str, image_urls: Optional[List[st
                 parts.append("\\n") # 개행 기호(문자)
 
     # 각 토큰을 한 칸으로 구분
-    return " ".join(parts).strip()
\ No newline at end of file
+    return " ".join(parts).strip()
+
+class VariantStreamParser:
+    """
+    스트리밍으로 들어오는 '{"variants": [ {...}, {...} ]}' 텍스트에서
+    닫힌 variant 객체를 도착 순서대로 꺼낸다. (코드펜스가 앞에 붙어도 무시)
+
+        parser = VariantStreamParser()
+        for chunk in stream:
+            for index, v in parser.feed(chunk): ...   # index: 0 부터 도착 순서
+    """
+
+    _START = re.compile(r'"variants"\s*:\s*\[')
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.finished = False
+        self.count = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._obj_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Tuple[int, dict]]:
+        self.buf += text
+        out: List[Tuple[int, dict]] = []
+        if not self.started:
+            m = self._START.search(self.buf)
+            if not m:
+                return out
+            self.started = True
+            self.pos = m.end()
+        buf = self.buf
+        while self.pos < len(buf) and not self.finished:
+            ch = buf[self.pos]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = self.pos
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    try:
+                        obj = json.loads(buf[self._obj_start:self.pos + 1])
+                        if isinstance(obj, dict):
+                            out.append((self.count, obj))
+                            self.count += 1
+                    except ValueError:
+                        pass
+                    self._obj_start = None
+            elif ch == "]" and self._depth == 0:
+                self.finished = True
+            self.pos += 1
+        return out
@@ -0,0 +1,141 @@
+# warmup.py
+"""
+기동 후 워밍업 + 준비(readiness) 상태.
+
+- /health : 프로세스가 살아 있으면 항상 200 (가벼운 liveness, 무거운 import 없음)
+- /ready  : WARMUP 에 지정한 구성요소가 모두 준비되면 200, 아니면 503 + 구성요소별 상태
+
+WARMUP (쉼표 구분, 기본 "http,openai,matting,ingest,inpaint")
+    http    : 공유 HTTP 클라이언트 생성 (+ WARMUP_PRECONNECT=1 이면 Gemini 호스트에 미리 연결)
+    openai  : openai SDK import + 클라이언트 생성
+    matting : rembg 세션 풀 로드 + 작은 이미지로 1회 추론 (첫 요청의 초기화 비용 제거)
+    ingest  : 업로드 인코딩 프로세스 풀 기동
+    inpaint : SD Inpainting 파이프라인 로드 + 가장 가벼운 품질 단계로 1회 추론 (/v1/ad-image)
+MATTING_PRELOAD=0 / INPAINT_PRELOAD=0 이면 해당 구성요소는 제외.
+워밍업은 백그라운드 태스크로 돌아서 기동(lifespan)을 막지 않는다. WARMUP_BLOCKING=1 이면 끝날 때까지 기다린다.
+"""
+import asyncio, os, time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+WARMUP            = os.getenv("WARMUP", "http,openai,matting,ingest,inpaint")
+WARMUP_BLOCKING   = os.getenv("WARMUP_BLOCKING", "0") == "1"
+WARMUP_PRECONNECT = os.getenv("WARMUP_PRECONNECT", "1") == "1"
+MATTING_PRELOAD   = os.getenv("MATTING_PRELOAD", "1") == "1"
+INPAINT_PRELOAD   = os.getenv("INPAINT_PRELOAD", "1") == "1"
+
+_started_at = time.time()
+_state: Dict[str, dict] = {}
+_task: Optional[asyncio.Task] = None
+
+
+def components() -> List[str]:
+    names = [c.strip() for c in WARMUP.split(",") if c.strip()]
+    if not MATTING_PRELOAD and "matting" in names:
+        names.remove("matting")
+    if not INPAINT_PRELOAD and "inpaint" in names:
+        names.remove("inpaint")
+    return [n for n in names if n in _STEPS]
+
+
+async def _http() -> None:
+    import http_client
+    await http_client.startup()
+    if WARMUP_PRECONNECT:
+        from config import GEMINI_API_BASE
+        try:
+            # 응답 코드와 무관하게 TCP/TLS(+HTTP/2) 연결이 풀에 남는다
+            await http_client.get_client().get(GEMINI_API_BASE, timeout=5)
+        except Exception as e:
+            print(f"⚠️ Gemini 사전 연결 실패(무시): {e}")
+
+
+async def _openai() -> None:
+    import openai_seojae
+    # SDK import 가 수백 ms 걸리므로 이벤트 루프 밖에서
+    await run_in_threadpool(openai_seojae._openai)
+
+
+def _matting_sync() -> None:
+    from PIL import Image
+    from matting import engine
+    engine.start()
+    engine.remove(Image.new("RGB", (64, 64), (200, 200, 200)), timeout=120)
+
+
+async def _matting() -> None:
+    await run_in_threadpool(_matting_sync)
+
+
+def _inpaint_sync() -> None:
+    from inpaint import engine
+    engine.start()
+    engine.warmup()
+
+
+async def _inpaint() -> None:
+    await run_in_threadpool(_inpaint_sync)
+
+
+async def _ingest() -> None:
+    import renditions
+    await renditions.startup()
+
+
+_STEPS: Dict[str, Callable[[], Awaitable[None]]] = {
+    "http": _http,
+    "openai": _openai,
+    "matting": _matting,
+    "ingest": _ingest,
+    "inpaint": _inpaint,
+}
+
+
+async def _run_all(names: List[str]) -> None:
+    async def _one(name: str) -> None:
+        st = _state[name]
+        st["status"] = "running"
+        t0 = time.perf_counter()
+        try:
+            await _STEPS[name]()
+            st["status"] = "ready"
+        except Exception as e:
+            st["status"] = "failed"
+            st["error"] = str(e) or repr(e)
+            print(f"⚠️ 워밍업 실패({name}, 첫 요청 시 재시도): {e}")
+        finally:
+            st["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    await asyncio.gather(*[_one(n) for n in names])
+    print("✅ 워밍업 완료: " + ", ".join(f"{n}={_state[n]['status']}" for n in names))
+
+
+async def start() -> None:
+    """lifespan 에서 호출"""
+    global _task
+    names = components()
+    for n in names:
+        _state[n] = {"status": "pending", "elapsed_ms": None, "error": None}
+    _task = asyncio.get_running_loop().create_task(_run_all(names))
+    if WARMUP_BLOCKING:
+        await _task
+
+
+async def stop() -> None:
+    if _task is not None and not _task.done():
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+
+
+def is_ready() -> bool:
+    """실패한 구성요소는 첫 요청에서 다시 시도하므로 준비 완료로 본다 (상태에는 failed 로 남음)"""
+    return all(st["status"] in ("ready", "failed") for st in _state.values())
+
+
+def status() -> dict:
+    return {
+        "ready": is_ready(),
+        "uptime_sec": round(time.time() - _started_at, 1),
+        "components": {k: dict(v) for k, v in _state.items()},
+    }